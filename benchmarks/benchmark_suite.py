@@ -3,7 +3,12 @@ import time
 import torch
 import json
 import os
+import sys
 import platform
+import statistics
+
+# Model code lives in scripts/ (train_tiny_transformer.py, train_utils.py)
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
 
 
 def get_system_info():
@@ -25,7 +30,72 @@ def get_system_info():
         
     return info
 
-def benchmark_matmul(device, size=8192, dtype=torch.float32):
+
+# -----------------------------------------------------------------------------
+# Timing Harness
+# -----------------------------------------------------------------------------
+def summarize_samples(samples_ns):
+    """
+    Robust statistics over per-iteration times (ns in, seconds out).
+
+    median / p10 / p90 use every sample; mean, stddev and the confidence
+    interval drop Tukey outliers (outside 1.5 IQR), e.g. a stray page fault.
+    """
+    samples = sorted(x / 1e9 for x in samples_ns)
+    n = len(samples)
+    if n >= 4:
+        q1, _, q3 = statistics.quantiles(samples, n=4, method="inclusive")
+        lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        kept = [x for x in samples if lo <= x <= hi]
+        deciles = statistics.quantiles(samples, n=10, method="inclusive")
+        p10, p90 = deciles[0], deciles[-1]
+    else:
+        kept, p10, p90 = samples, samples[0], samples[-1]
+    mean = statistics.fmean(kept)
+    stddev = statistics.stdev(kept) if len(kept) > 1 else 0.0
+    return {
+        "iterations": n,
+        "outliers": n - len(kept),
+        "median_seconds": statistics.median(samples),
+        "p10_seconds": p10,
+        "p90_seconds": p90,
+        "mean_seconds": mean,
+        "stddev_seconds": stddev,
+        # Half-width of the 95% CI of the mean, relative to the mean
+        "ci95_rel": 1.96 * stddev / (len(kept) ** 0.5) / mean if mean > 0 else 0.0,
+    }
+
+def measure(fn, device, warmup=3, min_iters=5, max_iters=1000, max_time=10.0, target_ci=0.02):
+    """
+    Times fn() one synchronized iteration at a time with perf_counter_ns and
+    keeps going until the 95% CI is within target_ci of the mean, or
+    max_iters / max_time (seconds, checked after min_iters) is hit.
+    """
+    for _ in range(warmup):
+        fn()
+    _synchronize(device)
+
+    samples = []
+    start = time.perf_counter_ns()
+    while len(samples) < max_iters:
+        t0 = time.perf_counter_ns()
+        fn()
+        _synchronize(device)
+        samples.append(time.perf_counter_ns() - t0)
+        if len(samples) < min_iters:
+            continue
+        if summarize_samples(samples)["ci95_rel"] <= target_ci:
+            break
+        if (time.perf_counter_ns() - start) / 1e9 >= max_time:
+            break
+    return summarize_samples(samples)
+
+def _format_timing(stats):
+    return (f"median {stats['median_seconds'] * 1000:.3f} ms | p10 {stats['p10_seconds'] * 1000:.3f} | "
+            f"p90 {stats['p90_seconds'] * 1000:.3f} | stddev {stats['stddev_seconds'] * 1000:.3f} | "
+            f"n={stats['iterations']} (ci95 {stats['ci95_rel'] * 100:.1f}%)")
+
+def benchmark_matmul(device, size=8192, dtype=torch.float32, timing=None):
     print(f"--- Benchmarking Matrix Multiplication ({size}x{size}) on {device} ---")
     
     try:
@@ -46,41 +116,27 @@ def benchmark_matmul(device, size=8192, dtype=torch.float32):
         a = torch.randn(size, size, dtype=dtype, device=t_device)
         b = torch.randn(size, size, dtype=dtype, device=t_device)
 
-        # Warmup
-        print("Warming up...")
-        for _ in range(2):
-            c = torch.matmul(a, b)
-        
-        if device == "cuda": torch.cuda.synchronize()
-        if device == "mps": torch.mps.synchronize()
-
-        # Benchmark
-        print("Running benchmark (5 iterations)...")
-        start_time = time.time()
-        for _ in range(5):
-            c = torch.matmul(a, b)
-            if device == "cuda": torch.cuda.synchronize()
-            if device == "mps": torch.mps.synchronize()
-        end_time = time.time()
-
-        avg_time = (end_time - start_time) / 5
-        # TFLOPS: 2 * N^3 operations
+        print("Running benchmark (adaptive iterations)...")
+        stats = measure(lambda: torch.matmul(a, b), device, **(timing or {}))
+
+        # TFLOPS: 2 * N^3 operations, at the median time
         ops = 2 * (size ** 3)
-        tflops = (ops / avg_time) / 1e12
+        tflops = (ops / stats["median_seconds"]) / 1e12
 
-        print(f"Average Time: {avg_time:.4f} s")
+        print(_format_timing(stats))
         print(f"Performance: {tflops:.4f} TFLOPS")
         
         return {
             "size": size,
-            "avg_time_seconds": avg_time,
-            "tflops": tflops
+            "avg_time_seconds": stats["mean_seconds"],
+            "tflops": tflops,
+            "timing": stats,
         }
     except Exception as e:
         print(f"Error during matmul: {e}")
         return None
 
-def benchmark_bandwidth(device, size_elem=100_000_000, dtype=torch.float32):
+def benchmark_bandwidth(device, size_elem=100_000_000, dtype=torch.float32, timing=None):
     print(f"\n--- Benchmarking Memory Bandwidth (Vector Add, {size_elem} elems) on {device} ---")
     
     try:
@@ -100,42 +156,643 @@ def benchmark_bandwidth(device, size_elem=100_000_000, dtype=torch.float32):
         a = torch.randn(size_elem, dtype=dtype, device=t_device)
         b = torch.randn(size_elem, dtype=dtype, device=t_device)
 
-        # Warmup
-        c = a + b
-        if device == "cuda": torch.cuda.synchronize()
-        if device == "mps": torch.mps.synchronize()
-
-        # Benchmark
-        print("Running benchmark (10 iterations)...")
-        start_time = time.time()
-        for _ in range(10):
-            c = a + b
-            if device == "cuda": torch.cuda.synchronize()
-            if device == "mps": torch.mps.synchronize()
-        end_time = time.time()
-
-        avg_time = (end_time - start_time) / 10
+        print("Running benchmark (adaptive iterations)...")
+        stats = measure(lambda: a + b, device, **(timing or {}))
         
         # Read A, Read B, Write C = 3 * size bytes
         total_bytes = 3 * size_elem * 4 
-        gb_per_sec = (total_bytes / avg_time) / 1e9
+        gb_per_sec = (total_bytes / stats["median_seconds"]) / 1e9
 
-        print(f"Average Time: {avg_time:.6f} s")
+        print(_format_timing(stats))
         print(f"Bandwidth: {gb_per_sec:.2f} GB/s")
 
         return {
             "size_elements": size_elem,
-            "avg_time_seconds": avg_time,
-            "bandwidth_gb_s": gb_per_sec
+            "avg_time_seconds": stats["mean_seconds"],
+            "bandwidth_gb_s": gb_per_sec,
+            "timing": stats,
         }
     except Exception as e:
         print(f"Error during bandwidth: {e}")
         return None
 
+def _synchronize(device):
+    if device == "cuda": torch.cuda.synchronize()
+    if device == "mps": torch.mps.synchronize()
+
+def _reset_peak_memory(device):
+    if device == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+
+def _memory_stats(device):
+    """
+    Memory fields for a result row. Only CUDA has a resettable allocator peak,
+    reported as peak_memory_mb (gated by compare). MPS driver memory and CPU
+    process RSS are current, cumulative values that depend on what ran before
+    in the process, so they get their own keys and are informational only.
+    """
+    if device == "cuda":
+        return {"peak_memory_mb": torch.cuda.max_memory_allocated() / 1e6}
+    if device == "mps":
+        return {"driver_allocated_mb": torch.mps.driver_allocated_memory() / 1e6}
+    try:
+        import psutil
+        return {"process_rss_mb": psutil.Process().memory_info().rss / 1e6}
+    except ImportError:
+        return {}
+
+def benchmark_precision(device, config_path, batch_size=8, seq_len=64, timing=None):
+    """
+    Times full TinyTransformer training steps (forward + backward + AdamW)
+    under each autocast precision with the adaptive measure() harness and
+    reports step time and memory.
+
+    activation_mb counts the bytes autograd saves for backward, which is
+    what low precision actually shrinks, and is comparable across devices.
+    """
+    print(f"\n--- Benchmarking Training-Step Precision (B={batch_size}, T={seq_len}) on {device} ---")
+    sys.path.insert(0, SCRIPTS_DIR)
+    from train_tiny_transformer import TinyTransformer
+    from train_utils import PRECISIONS, autocast_context, make_grad_scaler
+
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    config["max_position_embeddings"] = max(config["max_position_embeddings"], seq_len)
+    t_device = torch.device(device)
+
+    results = {}
+    for precision in PRECISIONS:
+        try:
+            torch.manual_seed(0)
+            model = TinyTransformer(config).to(t_device)
+            optimizer = torch.optim.AdamW(model.parameters(), lr=1e-3)
+            scaler = make_grad_scaler(t_device, precision)
+            input_ids = torch.randint(0, config["vocab_size"], (batch_size, seq_len), device=t_device)
+
+            saved_bytes = [0]
+            def pack(t):
+                saved_bytes[0] += t.numel() * t.element_size()
+                return t
+
+            def step(measure_activations=False):
+                with autocast_context(t_device, precision):
+                    if measure_activations:
+                        with torch.autograd.graph.saved_tensors_hooks(pack, lambda t: t):
+                            _, loss = model(input_ids, labels=input_ids)
+                    else:
+                        _, loss = model(input_ids, labels=input_ids)
+                scaler.scale(loss).backward()
+                scaler.step(optimizer)
+                scaler.update()
+                optimizer.zero_grad()
+
+            step(measure_activations=True)
+            _synchronize(device)
+            _reset_peak_memory(device)
+            stats = measure(step, device, **(timing or {}))
+
+            results[precision] = {
+                "avg_step_time_seconds": stats["mean_seconds"],
+                "median_seconds": stats["median_seconds"],
+                "tokens_per_sec": batch_size * seq_len / stats["median_seconds"],
+                "activation_mb": saved_bytes[0] / 1e6,
+                **_memory_stats(device),
+                "timing": stats,
+            }
+            print(f"{precision}: {_format_timing(stats)} | activations {saved_bytes[0] / 1e6:.2f} MB")
+        except Exception as e:
+            print(f"Error during {precision} step: {e}")
+            results[precision] = None
+
+    return results
+
+def benchmark_train_step(device, config_path, batch_sizes=(8,), seq_lens=(64,), precision="fp32", timing=None,
+                         optimizer_impls=("for-loop", "foreach", "fused")):
+    """
+    End-to-end TinyTransformer training step (forward + backward + AdamW) from
+    any config JSON, over a batch size x sequence length grid, once per AdamW
+    implementation. Each step is synchronized, so the percentiles are
+    per-step latencies. optimizer_step_seconds times optimizer.step() alone
+    (grads kept), and the summary reports each implementation's step-time
+    speedup over the first one.
+    """
+    print(f"\n--- Benchmarking Training Step ({os.path.basename(config_path)}, {precision}) on {device} ---")
+    sys.path.insert(0, SCRIPTS_DIR)
+    from train_tiny_transformer import TinyTransformer
+    from train_utils import autocast_context, make_grad_scaler, make_optimizer, resolve_optimizer_impl
+
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    config["max_position_embeddings"] = max(config["max_position_embeddings"], max(seq_lens))
+    t_device = torch.device(device)
+
+    rows, optimizer_step = [], {}
+    num_params = num_tensors = None
+    for impl in optimizer_impls:
+        # "auto" is recorded as what it resolved to
+        impl = resolve_optimizer_impl(t_device, impl)
+        torch.manual_seed(0)
+        model = TinyTransformer(config).to(t_device)
+        try:
+            optimizer = make_optimizer(model, 1e-3, impl=impl)
+        except (RuntimeError, TypeError, ValueError) as e:
+            print(f"AdamW {impl}: not supported here ({e})")
+            optimizer_step[impl] = {"error": str(e)}
+            continue
+        scaler = make_grad_scaler(t_device, precision)
+        num_params = sum(p.numel() for p in model.parameters())
+        num_tensors = len(list(model.parameters()))
+
+        for batch_size in batch_sizes:
+            for seq_len in seq_lens:
+                input_ids = torch.randint(0, config["vocab_size"], (batch_size, seq_len), device=t_device)
+
+                def step():
+                    with autocast_context(t_device, precision):
+                        _, loss = model(input_ids, labels=input_ids)
+                    scaler.scale(loss).backward()
+                    scaler.step(optimizer)
+                    scaler.update()
+                    optimizer.zero_grad(set_to_none=True)
+
+                try:
+                    _reset_peak_memory(device)
+                    stats = measure(step, device, **(timing or {}))
+                except RuntimeError as e:
+                    # Typically out of memory at the large end of the grid
+                    print(f"{impl:>8} B={batch_size} T={seq_len}: failed ({e})")
+                    rows.append({"optimizer": impl, "batch_size": batch_size, "seq_len": seq_len, "error": str(e)})
+                    continue
+                tokens_per_sec = batch_size * seq_len / stats["median_seconds"]
+                rows.append({
+                    "optimizer": impl,
+                    "batch_size": batch_size,
+                    "seq_len": seq_len,
+                    "tokens_per_sec": tokens_per_sec,
+                    "median_seconds": stats["median_seconds"],
+                    "p10_seconds": stats["p10_seconds"],
+                    "p90_seconds": stats["p90_seconds"],
+                    "stddev_seconds": stats["stddev_seconds"],
+                    "iterations": stats["iterations"],
+                    **_memory_stats(device),
+                })
+                print(f"{impl:>8} B={batch_size:>4} T={seq_len:>5} | {tokens_per_sec:12.0f} tok/s | "
+                      f"{_format_timing(stats)}")
+
+        # The update alone, independent of batch and sequence length
+        for param in model.parameters():
+            param.grad = torch.randn_like(param) * 1e-3
+        stats = measure(optimizer.step, device, **(timing or {}))
+        optimizer_step[impl] = {"optimizer_step_seconds": stats["median_seconds"]}
+        print(f"{impl:>8} optimizer.step() alone: {stats['median_seconds'] * 1000:.3f} ms")
+
+    # Step-time speedup of each implementation over the baseline (first one measured)
+    speedup = {}
+    ok = [r for r in rows if "error" not in r]
+    if ok:
+        baseline = ok[0]["optimizer"]
+        base = {(r["batch_size"], r["seq_len"]): r["median_seconds"] for r in ok if r["optimizer"] == baseline}
+        for impl in {r["optimizer"] for r in ok} - {baseline}:
+            ratios = [base[(r["batch_size"], r["seq_len"])] / r["median_seconds"]
+                      for r in ok if r["optimizer"] == impl and (r["batch_size"], r["seq_len"]) in base]
+            if ratios:
+                speedup[impl] = {"vs": baseline, "median_step_speedup": statistics.median(ratios)}
+                print(f"{impl} vs {baseline}: {statistics.median(ratios):.2f}x step time (median over grid)")
+
+    return {
+        "config": config_path, "precision": precision, "num_params": num_params, "num_tensors": num_tensors,
+        "rows": rows, "optimizer_step": optimizer_step, "optimizer_speedup": speedup,
+    }
+
+# -----------------------------------------------------------------------------
+# Sweep (dtype x GEMM shape x thread count, roofline-style)
+# -----------------------------------------------------------------------------
+SWEEP_DTYPES = ["fp32", "tf32", "bf16", "fp16"]
+
+def model_gemm_shapes(config, batch_size, seq_len):
+    """
+    (name, batch, M, K, N) for the GEMMs of one TinyBlock forward plus the LM
+    head, as train_tiny_transformer.py runs them at (batch_size, seq_len).
+    """
+    tokens = batch_size * seq_len
+    hidden, inter = config["hidden_size"], config["intermediate_size"]
+    heads = config["num_attention_heads"]
+    head_dim = hidden // heads
+    return [
+        ("attn.qkv", 1, tokens, hidden, 3 * hidden),
+        ("attn.scores", batch_size * heads, seq_len, head_dim, seq_len),
+        ("attn.values", batch_size * heads, seq_len, seq_len, head_dim),
+        ("attn.proj", 1, tokens, hidden, hidden),
+        ("mlp.fc1", 1, tokens, hidden, inter),
+        ("mlp.fc2", 1, tokens, inter, hidden),
+        ("lm_head", 1, tokens, hidden, config["vocab_size"]),
+    ]
+
+def _sweep_dtype(name, device):
+    """torch dtype for a sweep entry, or None if the device can't run it."""
+    if name == "tf32":
+        # TF32 is an fp32 matmul mode of Ampere+ tensor cores
+        if device != "cuda" or torch.cuda.get_device_capability()[0] < 8:
+            return None
+        return torch.float32
+    dtype = {"fp32": torch.float32, "bf16": torch.bfloat16, "fp16": torch.float16}[name]
+    try:
+        x = torch.ones(8, 8, dtype=dtype, device=device)
+        torch.matmul(x, x)
+    except (RuntimeError, TypeError):
+        return None
+    return dtype
+
+def _measure_bandwidth(device, timing, size_elem=25_000_000):
+    a = torch.randn(size_elem, device=device)
+    b = torch.randn(size_elem, device=device)
+    stats = measure(lambda: a + b, device, **timing)
+    return 3 * size_elem * 4 / stats["median_seconds"] / 1e9
+
+def benchmark_sweep(device, config_path, batch_size=8, seq_len=64, square_size=2048,
+                    thread_counts=None, timing=None):
+    """
+    Times matmul for every (dtype, thread count, shape) with roofline fields:
+    arithmetic intensity (FLOP/byte), achieved TFLOPS and GB/s. Each thread
+    count's ridge point is best TFLOPS / vector-add bandwidth, so a row is
+    'memory' bound when its intensity falls below it.
+    """
+    print(f"\n--- Benchmarking Matmul Sweep (B={batch_size}, T={seq_len}) on {device} ---")
+    timing = timing or {}
+    with open(config_path, "r") as f:
+        config = json.load(f)
+    shapes = [(f"square_{square_size}", 1, square_size, square_size, square_size)]
+    shapes += model_gemm_shapes(config, batch_size, seq_len)
+    if device != "cpu" or not thread_counts:
+        thread_counts = [torch.get_num_threads()]
+    dtypes = [(name, _sweep_dtype(name, device)) for name in SWEEP_DTYPES]
+    dtypes = [(name, dtype) for name, dtype in dtypes if dtype is not None]
+
+    default_threads = torch.get_num_threads()
+    default_tf32 = torch.backends.cuda.matmul.allow_tf32
+    rows, ridges = [], {}
+    try:
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            bandwidth = _measure_bandwidth(device, timing)
+            for dtype_name, dtype in dtypes:
+                torch.backends.cuda.matmul.allow_tf32 = dtype_name == "tf32"
+                for name, batch, m, k, n in shapes:
+                    a = torch.randn(batch, m, k, device=device).to(dtype)
+                    b = torch.randn(batch, k, n, device=device).to(dtype)
+                    stats = measure(lambda: torch.bmm(a, b), device, **timing)
+                    flops = 2 * batch * m * k * n
+                    bytes_moved = a.element_size() * batch * (m * k + k * n + m * n)
+                    rows.append({
+                        "dtype": dtype_name, "threads": threads, "shape": name,
+                        "batch": batch, "m": m, "k": k, "n": n,
+                        "median_seconds": stats["median_seconds"],
+                        "p90_seconds": stats["p90_seconds"],
+                        "arithmetic_intensity": flops / bytes_moved,
+                        "tflops": flops / stats["median_seconds"] / 1e12,
+                        "gb_s": bytes_moved / stats["median_seconds"] / 1e9,
+                    })
+                peak = max(r["tflops"] for r in rows if r["threads"] == threads and r["dtype"] == dtype_name)
+                ridges[f"{dtype_name}@{threads}"] = {
+                    "peak_tflops": peak, "bandwidth_gb_s": bandwidth, "ridge_intensity": peak * 1e3 / bandwidth,
+                }
+    finally:
+        torch.set_num_threads(default_threads)
+        torch.backends.cuda.matmul.allow_tf32 = default_tf32
+
+    for r in rows:
+        ridge = ridges[f"{r['dtype']}@{r['threads']}"]["ridge_intensity"]
+        r["bound"] = "memory" if r["arithmetic_intensity"] < ridge else "compute"
+
+    # Per (dtype, threads): time for one block's GEMMs + LM head, the figure to size ranks by
+    summary = []
+    for key in ridges:
+        dtype_name, threads = key.split("@")
+        model_rows = [r for r in rows if r["dtype"] == dtype_name and r["threads"] == int(threads)
+                      and not r["shape"].startswith("square")]
+        seconds = sum(r["median_seconds"] for r in model_rows)
+        flops = sum(2 * r["batch"] * r["m"] * r["k"] * r["n"] for r in model_rows)
+        summary.append({"dtype": dtype_name, "threads": int(threads),
+                        "model_gemm_seconds": seconds, "model_gemm_tflops": flops / seconds / 1e12})
+
+    print(f"{'dtype':>5} {'thr':>4} {'shape':>14} {'BxMxKxN':>22} {'FLOP/B':>8} "
+          f"{'median ms':>10} {'TFLOPS':>8} {'GB/s':>8}  bound")
+    for r in rows:
+        dims = f"{r['batch']}x{r['m']}x{r['k']}x{r['n']}"
+        print(f"{r['dtype']:>5} {r['threads']:>4} {r['shape']:>14} {dims:>22} {r['arithmetic_intensity']:8.1f} "
+              f"{r['median_seconds'] * 1000:10.4f} {r['tflops']:8.3f} {r['gb_s']:8.1f}  {r['bound']}")
+    print("\nModel GEMMs per step (one block + LM head):")
+    for sm in sorted(summary, key=lambda x: x["model_gemm_seconds"]):
+        print(f"  {sm['dtype']:>5} @ {sm['threads']:>3} threads: {sm['model_gemm_seconds'] * 1000:.4f} ms "
+              f"({sm['model_gemm_tflops']:.3f} TFLOPS)")
+
+    return {"config": config_path, "batch_size": batch_size, "seq_len": seq_len,
+            "rows": rows, "ridges": ridges, "summary": summary}
+
+# -----------------------------------------------------------------------------
+# Collectives (all_reduce, reduce_scatter, all_gather, broadcast, barrier)
+# -----------------------------------------------------------------------------
+COLLECTIVES = ["all_reduce", "reduce_scatter", "all_gather", "broadcast"]
+
+# nccl-tests convention: bus bandwidth = algorithm bandwidth * factor, so the
+# figure is comparable to link bandwidth regardless of world size
+def _busbw_factor(op, world_size):
+    if op == "all_reduce":
+        return 2 * (world_size - 1) / world_size
+    if op in ("reduce_scatter", "all_gather"):
+        return (world_size - 1) / world_size
+    return 1.0
+
+def _parse_bytes(text):
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = str(text).strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def _message_sizes(min_bytes, max_bytes, factor):
+    sizes = []
+    size = min_bytes
+    while size <= max_bytes:
+        sizes.append(size)
+        size *= factor
+    return sizes
+
+def _collective_op(op, dist, size_bytes, world_size, t_device):
+    """Returns a zero-arg callable running one `op` on a `size_bytes` buffer.
+
+    For reduce_scatter / all_gather `size_bytes` is the full (pre-scatter /
+    gathered) buffer, each rank contributing size_bytes / world_size.
+    """
+    numel = size_bytes // 4
+    if op == "all_reduce":
+        t = torch.ones(numel, device=t_device)
+        return lambda: dist.all_reduce(t)
+    if op == "broadcast":
+        t = torch.ones(numel, device=t_device)
+        return lambda: dist.broadcast(t, src=0)
+    chunk = numel // world_size
+    if op == "all_gather":
+        t = torch.ones(chunk, device=t_device)
+        outputs = [torch.empty(chunk, device=t_device) for _ in range(world_size)]
+        return lambda: dist.all_gather(outputs, t)
+    inputs = [torch.ones(chunk, device=t_device) for _ in range(world_size)]
+    out = torch.empty(chunk, device=t_device)
+    return lambda: dist.reduce_scatter(out, inputs)
+
+def _time_collective(fn, dist, device, iters, warmup):
+    """
+    Mean seconds per call of the collective `fn`, the max over ranks.
+
+    A fixed iteration count rather than measure(): measure() stops once this
+    rank's own CI converges, so ranks would stop after different counts and
+    the ones still looping would hang in a collective nobody else joins. Every
+    rank runs the same `iters` and the slowest rank's mean is reported.
+    """
+    for _ in range(warmup):
+        fn()
+    _synchronize(device)
+    dist.barrier()
+    start_time = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    _synchronize(device)
+    elapsed = torch.tensor([(time.perf_counter() - start_time) / iters], dtype=torch.float64)
+    # A collective is only done when the slowest rank is: report the max over ranks
+    if device == "cuda":
+        elapsed = elapsed.cuda()
+    dist.all_reduce(elapsed, op=dist.ReduceOp.MAX)
+    return elapsed.item()
+
+def benchmark_collectives(device, sizes, iters=20, warmup=5):
+    """
+    Sweeps message sizes over each collective on the current process group.
+    Must be called on every rank; returns the results on all of them.
+    """
+    import torch.distributed as dist
+
+    rank = dist.get_rank()
+    world_size = dist.get_world_size()
+    backend = dist.get_backend()
+    if device == "cuda":
+        local_rank = int(os.environ.get("LOCAL_RANK", rank % torch.cuda.device_count()))
+        torch.cuda.set_device(local_rank)
+        t_device = torch.device("cuda", local_rank)
+    else:
+        t_device = torch.device("cpu")
+    if rank == 0:
+        print(f"\n--- Benchmarking Collectives ({backend}, {world_size} ranks) on {device} ---")
+
+    results = {"backend": backend, "world_size": world_size, "dtype": "float32"}
+    for op in COLLECTIVES:
+        rows = []
+        for size_bytes in sizes:
+            if size_bytes // 4 < world_size:
+                continue
+            # Large messages: fewer iterations, still enough to amortize launch cost
+            n_iters = max(3, min(iters, (256 * 1024 ** 2) // size_bytes))
+            try:
+                fn = _collective_op(op, dist, size_bytes, world_size, t_device)
+                avg_time = _time_collective(fn, dist, device, n_iters, min(warmup, n_iters))
+            except RuntimeError as e:
+                # e.g. reduce_scatter is not implemented by every gloo build
+                if rank == 0:
+                    print(f"{op}: not supported by {backend} ({e})")
+                rows = None
+                break
+            del fn
+            algbw = size_bytes / avg_time / 1e9
+            rows.append({
+                "size_bytes": size_bytes,
+                "avg_time_seconds": avg_time,
+                "algbw_gb_s": algbw,
+                "busbw_gb_s": algbw * _busbw_factor(op, world_size),
+            })
+            if rank == 0:
+                print(f"{op:>14} {size_bytes:>12} B | {avg_time * 1e6:10.1f} us | "
+                      f"algbw {algbw:8.3f} GB/s | busbw {rows[-1]['busbw_gb_s']:8.3f} GB/s")
+        results[op] = rows
+
+    avg_time = _time_collective(dist.barrier, dist, device, iters * 5, warmup)
+    results["barrier"] = {"avg_time_seconds": avg_time, "latency_us": avg_time * 1e6}
+    if rank == 0:
+        print(f"{'barrier':>14} {'':>12}   | {avg_time * 1e6:10.1f} us")
+    return results
+
+def _collectives_worker(rank, world_size, master_port, device, sizes, iters, warmup, queue):
+    # Entry point for locally spawned ranks (no torchrun / launcher env)
+    import torch.distributed as dist
+
+    os.environ.update({
+        "RANK": str(rank), "LOCAL_RANK": str(rank), "WORLD_SIZE": str(world_size),
+        "MASTER_ADDR": "127.0.0.1", "MASTER_PORT": str(master_port),
+    })
+    dist.init_process_group(backend="nccl" if device == "cuda" else "gloo")
+    try:
+        results = benchmark_collectives(device, sizes, iters=iters, warmup=warmup)
+        if rank == 0:
+            queue.put(results)
+    finally:
+        dist.destroy_process_group()
+
+def run_collectives(device, nproc, sizes, iters=20, warmup=5):
+    """
+    Runs benchmark_collectives on every rank. Joins the existing job when
+    launched by torchrun / fake_multi_node_launcher.py (RANK set), otherwise
+    spawns `nproc` local processes. NCCL on CUDA, gloo on CPU otherwise.
+    Returns the results on rank 0 and None on the other ranks.
+    """
+    import socket
+    import torch.distributed as dist
+    import torch.multiprocessing as mp
+
+    # gloo has no MPS transport: measure host-side collectives instead
+    if device == "mps":
+        device = "cpu"
+    if "RANK" in os.environ and "WORLD_SIZE" in os.environ:
+        dist.init_process_group(backend="nccl" if device == "cuda" else "gloo")
+        try:
+            results = benchmark_collectives(device, sizes, iters=iters, warmup=warmup)
+            return results if dist.get_rank() == 0 else None
+        finally:
+            dist.destroy_process_group()
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("", 0))
+        master_port = s.getsockname()[1]
+    ctx = mp.get_context("spawn")
+    queue = ctx.SimpleQueue()
+    context = mp.start_processes(_collectives_worker, args=(nproc, master_port, device, sizes, iters, warmup, queue),
+                                 nprocs=nproc, join=False, start_method="spawn")
+    # Drain the queue while waiting: rank 0 cannot exit until its put() is read
+    # (a result larger than the pipe buffer blocks it), so joining first could deadlock.
+    # join() raises if any rank failed.
+    results = None
+    while not context.join(timeout=1):
+        if results is None and not queue.empty():
+            results = queue.get()
+    if results is None:
+        results = queue.get()
+    return results
+
+# -----------------------------------------------------------------------------
+# Regression Comparison
+# -----------------------------------------------------------------------------
+# Headline metrics by leaf key; spread statistics (p10, stddev, ...) are not gated
+HIGHER_IS_BETTER = {"tflops", "bandwidth_gb_s", "tokens_per_sec", "algbw_gb_s", "busbw_gb_s", "median_step_speedup"}
+LOWER_IS_BETTER = {"avg_time_seconds", "median_seconds", "avg_step_time_seconds", "latency_us",
+                   "activation_mb", "peak_memory_mb", "optimizer_step_seconds"}
+
+# Fields that identify a row in a sweep list (collectives, sweep, train_step)
+ROW_KEYS = ["optimizer", "dtype", "threads", "shape", "batch_size", "seq_len", "size_bytes"]
+
+def _row_key(row):
+    return ",".join(f"{k}={row[k]}" for k in ROW_KEYS if k in row)
+
+def flatten_metrics(results, prefix=""):
+    """{'matmul.tflops': 3.1, 'collectives.all_reduce[size_bytes=1048576].busbw_gb_s': 9.2, ...}"""
+    metrics = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            if key == "system_info":
+                continue
+            path = f"{prefix}.{key}" if prefix else key
+            if isinstance(value, (dict, list)):
+                metrics.update(flatten_metrics(value, path))
+            elif key in HIGHER_IS_BETTER | LOWER_IS_BETTER and isinstance(value, (int, float)):
+                metrics[path] = value
+    elif isinstance(results, list):
+        # Sweep rows are keyed by what they measured, not by position
+        for row in results:
+            key = _row_key(row) if isinstance(row, dict) else None
+            if key:
+                metrics.update(flatten_metrics(row, f"{prefix}[{key}]"))
+    return metrics
+
+def compare_results(baseline, candidate, threshold=0.05):
+    """
+    Returns rows of (metric, baseline, candidate, relative change, regressed)
+    for metrics present in both. Relative change is signed so that negative
+    is always worse; a metric regresses when it is worse by more than threshold.
+    """
+    base, cand = flatten_metrics(baseline), flatten_metrics(candidate)
+    rows = []
+    for path in sorted(base.keys() & cand.keys()):
+        old, new = base[path], cand[path]
+        if old == 0:
+            continue
+        change = (new - old) / abs(old)
+        if path.rsplit(".", 1)[-1] in LOWER_IS_BETTER:
+            change = -change
+        rows.append((path, old, new, change, change < -threshold))
+    return rows
+
+def compare_main(argv):
+    parser = argparse.ArgumentParser(prog="benchmark_suite.py compare",
+                                     description="Diff two result JSONs; exit 1 if any metric regressed")
+    parser.add_argument("baseline", type=str)
+    parser.add_argument("candidate", type=str)
+    parser.add_argument("--threshold", type=float, default=0.05,
+                        help="Allowed relative slowdown per metric (0.05 = 5%%)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    with open(args.candidate, "r") as f:
+        candidate = json.load(f)
+
+    rows = compare_results(baseline, candidate, threshold=args.threshold)
+    if not rows:
+        print("No metrics in common.")
+        return 2
+    width = max(len(row[0]) for row in rows)
+    for path, old, new, change, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{path:<{width}}  {old:12.4g} -> {new:12.4g}  {change * 100:+7.1f}%  {flag}")
+    regressions = sum(row[4] for row in rows)
+    print(f"\n{regressions} of {len(rows)} metrics regressed by more than {args.threshold * 100:.1f}%")
+    return 1 if regressions else 0
+
+
 def main():
+    # `benchmark_suite.py compare old.json new.json`; everything else runs a benchmark
+    if len(sys.argv) > 1 and sys.argv[1] == "compare":
+        sys.exit(compare_main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--device", type=str, choices=["cpu", "cuda", "mps", "auto"], default="auto")
+    parser.add_argument("--mode", type=str, choices=["kernels", "precision", "train_step", "sweep", "collectives"],
+                        default="kernels",
+                        help="kernels: matmul + bandwidth; precision: TinyTransformer step per autocast dtype; "
+                             "train_step: TinyTransformer step over a batch x seq_len grid; "
+                             "sweep: matmul over dtype x model GEMM shapes x CPU threads (roofline table); "
+                             "collectives: all_reduce / reduce_scatter / all_gather / broadcast / barrier sweep")
     parser.add_argument("--matmul_size", type=int, default=8192)
+    parser.add_argument("--model_config", type=str,
+                        default=os.path.join(SCRIPTS_DIR, "..", "config", "config.json"))
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--seq_len", type=int, default=64)
+    parser.add_argument("--batch_sizes", type=str, default="1,8,32", help="train_step: comma-separated grid")
+    parser.add_argument("--seq_lens", type=str, default="64,128,256", help="train_step: comma-separated grid")
+    parser.add_argument("--precision", type=str, choices=["fp32", "bf16", "fp16"], default="fp32",
+                        help="train_step: autocast precision")
+    parser.add_argument("--optimizer_impls", type=str, default="for-loop,foreach,fused",
+                        help="train_step: AdamW implementations to compare (first is the speedup baseline)")
+    parser.add_argument("--sweep_square", type=int, default=2048, help="sweep: square matmul size")
+    parser.add_argument("--threads", type=str, default=None,
+                        help="sweep (CPU): comma-separated torch.set_num_threads values "
+                             "(default: powers of two up to the core count)")
+    parser.add_argument("--nproc", type=int, default=4,
+                        help="collectives: local ranks to spawn (ignored under torchrun / the local launcher)")
+    parser.add_argument("--min_bytes", type=str, default="1K")
+    parser.add_argument("--max_bytes", type=str, default="1G")
+    parser.add_argument("--size_factor", type=int, default=2, help="collectives: message size step")
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--target_ci", type=float, default=0.02,
+                        help="kernels / precision / train_step / sweep: iterate until the 95%% CI is within this fraction of the mean")
+    parser.add_argument("--min_iters", type=int, default=5)
+    parser.add_argument("--max_iters", type=int, default=1000)
+    parser.add_argument("--max_time", type=float, default=10.0, help="kernels / precision / train_step / sweep: seconds per measurement")
     parser.add_argument("--out", type=str, default="benchmark_results.json")
     args = parser.parse_args()
 
@@ -149,15 +806,48 @@ def main():
         else:
             device = "cpu"
     
+    collectives = None
+    if args.mode == "collectives":
+        sizes = _message_sizes(_parse_bytes(args.min_bytes), _parse_bytes(args.max_bytes), args.size_factor)
+        collectives = run_collectives(device, args.nproc, sizes, iters=args.iters)
+        if collectives is None:
+            return  # non-zero rank: rank 0 writes the results
+
     print(f"Target Device: {device}")
     
     results = {
         "timestamp": time.time(),
         "device": device,
         "system_info": get_system_info(),
-        "matmul": benchmark_matmul(device, size=args.matmul_size),
-        "bandwidth": benchmark_bandwidth(device)
     }
+    timing = {"min_iters": args.min_iters, "max_iters": args.max_iters,
+              "max_time": args.max_time, "target_ci": args.target_ci}
+    if args.mode == "kernels":
+        results["matmul"] = benchmark_matmul(device, size=args.matmul_size, timing=timing)
+        results["bandwidth"] = benchmark_bandwidth(device, timing=timing)
+    elif args.mode == "precision":
+        results["precision"] = benchmark_precision(
+            device, args.model_config, batch_size=args.batch_size, seq_len=args.seq_len, timing=timing
+        )
+    elif args.mode == "train_step":
+        results["train_step"] = benchmark_train_step(
+            device, args.model_config,
+            batch_sizes=[int(b) for b in args.batch_sizes.split(",")],
+            seq_lens=[int(t) for t in args.seq_lens.split(",")],
+            precision=args.precision, timing=timing, optimizer_impls=args.optimizer_impls.split(","),
+        )
+    elif args.mode == "sweep":
+        if args.threads:
+            thread_counts = [int(t) for t in args.threads.split(",")]
+        else:
+            cores = os.cpu_count() or 1
+            thread_counts = sorted({2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores} | {cores})
+        results["sweep"] = benchmark_sweep(
+            device, args.model_config, batch_size=args.batch_size, seq_len=args.seq_len,
+            square_size=args.sweep_square, thread_counts=thread_counts, timing=timing,
+        )
+    elif args.mode == "collectives":
+        results["collectives"] = collectives
 
     # Add Device Name info
     if device == "cuda":
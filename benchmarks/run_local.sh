@@ -27,5 +27,9 @@ echo ""
 echo "=== Running Local Benchmark (CPU) ==="
 python3 benchmark_suite.py --device cpu --matmul_size 4096 --out local_cpu_results.json
 
+echo ""
+echo "=== Running Local Collectives Benchmark (gloo, 4 ranks) ==="
+python3 benchmark_suite.py --mode collectives --device cpu --nproc 4 --max_bytes 256M --out local_collectives_results.json
+
 echo ""
 echo "Done."
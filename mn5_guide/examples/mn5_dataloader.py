@@ -1,9 +1,26 @@
 import torch
 from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import default_collate
 import tempfile
 import os
+import sys
+
+# Copied from scripts/token_dataset.py so this example stays self-contained
+def collate_batch(batch):
+    """
+    collate_fn for datasets with __getitems__: the batch arrives already
+    stacked and is passed through. A list (per-item samples) is collated as usual.
+    """
+    if isinstance(batch, list):
+        return default_collate(batch)
+    return batch
 
 class Mn5Dataset(Dataset):
+    """
+    __getitems__ returns a whole, already-stacked batch: build the DataLoader
+    with collate_fn=collate_batch. The default collate would treat the
+    (images, labels) tuple as two samples and stack batches of batches.
+    """
     def __init__(self, size=1000):
         self.size = size
         # On MN5, ensure your data is in /gpfs/scratch, NOT /gpfs/projects or HOME.
@@ -27,10 +44,25 @@ class Mn5Dataset(Dataset):
         # Simulate data loading
         return torch.randn(3, 224, 224), torch.randint(0, 100, (1,))
 
-def get_optimized_loader(dataset, batch_size=32):
+    def __getitems__(self, indices):
+        # Batched fetch: one allocation for the whole batch (use collate_batch)
+        return torch.randn(len(indices), 3, 224, 224), torch.randint(0, 100, (len(indices), 1))
+
+def get_optimized_loader(dataset, batch_size=32, auto_tune=False, target_samples_per_sec=None):
     """
     Returns a DataLoader optimized for MN5 hardware (112 cores per node).
+
+    auto_tune=True measures instead of guessing: scripts/loader_tuning.py picks
+    the fewest workers / smallest prefetch that keep up with
+    target_samples_per_sec (or get within 5% of the fastest setting).
     """
+    if auto_tune:
+        # Needs the repository checkout (scripts/loader_tuning.py); the default path below does not
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+        from loader_tuning import auto_tune_loader
+        kwargs, _ = auto_tune_loader(dataset, batch_size, target_samples_per_sec, collate_fn=collate_batch)
+        print(f"[INFO] Auto-tuned DataLoader: {kwargs}")
+        return DataLoader(dataset, batch_size=batch_size, collate_fn=collate_batch, **kwargs)
     
     # MN5 Rule: 1 GPU : 20 CPUs.
     # So you realistically have ~15-18 works available per GPU.
@@ -41,6 +73,8 @@ def get_optimized_loader(dataset, batch_size=32):
     loader = DataLoader(
         dataset,
         batch_size=batch_size,
+        # Batches come pre-stacked from __getitems__ (required, see Mn5Dataset)
+        collate_fn=collate_batch,
         # Key for GPFS:
         num_workers=NUM_WORKERS,
         # Keeps workers alive between epochs to avoid re-forking overhead
@@ -55,7 +89,7 @@ def get_optimized_loader(dataset, batch_size=32):
 
 if __name__ == "__main__":
     ds = Mn5Dataset()
-    loader = get_optimized_loader(ds)
+    loader = get_optimized_loader(ds, auto_tune="--auto-tune" in sys.argv)
     print("DataLoader ready. Iterating...")
     for batch in loader:
         pass
@@ -1,9 +1,65 @@
 import os
+import re
+import random
+import numpy as np
 import torch
 import shutil
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def save_checkpoint_safe(model, optimizer, epoch, path):
+# Self-contained on purpose (copy it next to your training script). It follows
+# scripts/checkpointing.py (atomic_save, prune_checkpoints, AsyncCheckpointer,
+# RNG helpers); fix both together.
+
+def cleanup_old_checkpoints(path, keep_last=3, keep_every=None, interval=1):
+    """
+    Retention for numbered checkpoints next to `path` (epoch_7.pt -> epoch_*.pt).
+    Keeps the `keep_last` newest plus every `keep_every`-th save, deletes the rest.
+    `interval` is how far the number advances per save (e.g. the step interval
+    of step_<N>.pt files), so the n-th save is number // interval.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    pattern = re.compile(r"^(.*?)(\d+)(\.\w+)$")
+    match = pattern.match(name)
+    if match is None:
+        return
+
+    numbered = []
+    for other in os.listdir(directory):
+        m = pattern.match(other)
+        if m and m.group(1) == match.group(1) and m.group(3) == match.group(3):
+            numbered.append((int(m.group(2)), other))
+    numbered.sort()
+
+    keep = {num for num, _ in numbered[-keep_last:]} if keep_last > 0 else set()
+    if keep_every:
+        keep |= {num for num, _ in numbered if (num // interval) % keep_every == 0}
+    for num, other in numbered:
+        if num not in keep:
+            os.remove(os.path.join(directory, other))
+            print(f"[Checkpoint] Removed old checkpoint: {other}")
+
+def capture_rng_state():
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def restore_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    # set_rng_state needs CPU ByteTensors
+    torch.set_rng_state(state['torch'].cpu())
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all([s.cpu() for s in state['cuda']])
+
+def save_checkpoint_safe(model, optimizer, epoch, path, keep_last=None, keep_every=None,
+                         global_step=None, batches_in_epoch=None, interval=1):
     """
     Saves a checkpoint atomically to prevent corruption on GPFS.
     GPFS is robust, but if your job hits a time limit mid-write, 
@@ -20,8 +76,13 @@ def save_checkpoint_safe(model, optimizer, epoch, path):
     
     print(f"[Checkpoint] Saving to temporary file: {tmp_path}")
     
+    # global_step / batches_in_epoch + RNG state make mid-epoch resume possible:
+    # a preempted job loses at most one save interval, not a whole epoch.
     state = {
         'epoch': epoch,
+        'global_step': global_step,
+        'batches_in_epoch': batches_in_epoch,
+        'rng_state': capture_rng_state(),
         'model_state_dict': model.state_dict(),
         'optimizer_state_dict': optimizer.state_dict(),
     }
@@ -41,15 +102,115 @@ def save_checkpoint_safe(model, optimizer, epoch, path):
 
     # 5. Cleanup Old Checkpoints (Optional)
     # MN5 Scratch has a file count limit. Clean up!
-    # implementation specific...
+    if keep_last is not None:
+        cleanup_old_checkpoints(path, keep_last, keep_every, interval)
 
-def load_checkpoint(path, model, optimizer):
+def _to_cpu(obj):
+    # Snapshot: detached CPU copies, so training can keep updating the live weights
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+class AsyncCheckpointSaver:
+    """
+    Non-blocking version of save_checkpoint_safe.
+
+    On GPFS a synchronous torch.save of a real model can stall training for
+    tens of seconds. Here the training thread only pays for the GPU->CPU copy;
+    the .tmp write + rename + cleanup run on a background thread.
+    At most `max_in_flight` saves are queued; the next save() waits (back-pressure).
+
+    Errors from the writer are re-raised on the next save()/wait()/close().
+
+        saver = AsyncCheckpointSaver(keep_last=3, keep_every=10)
+        saver.save(model, optimizer, epoch, f"{ckpt_dir}/epoch_{epoch}.pt")
+        ...
+        saver.close()   # before the job exits: waits for pending writes
+    """
+    def __init__(self, max_in_flight=1, keep_last=None, keep_every=None):
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ckpt-writer")
+        self._pending = []
+
+    def save(self, model, optimizer, epoch, path, global_step=None, batches_in_epoch=None, interval=1):
+        self._raise_errors()
+        self._slots.acquire()
+        try:
+            state = _to_cpu({
+                'epoch': epoch,
+                'global_step': global_step,
+                'batches_in_epoch': batches_in_epoch,
+                'rng_state': capture_rng_state(),
+                'model_state_dict': model.state_dict(),
+                'optimizer_state_dict': optimizer.state_dict(),
+            })
+            future = self._executor.submit(self._write, state, path, interval)
+        except BaseException:
+            # Snapshot failed: give the slot back, or the next save() blocks forever
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append(future)
+
+    def _write(self, state, path, interval):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        torch.save(state, tmp_path)
+        shutil.move(tmp_path, path)
+        print(f"[Checkpoint] (async) Successfully renamed to: {path}")
+        if self.keep_last is not None:
+            cleanup_old_checkpoints(path, self.keep_last, self.keep_every, interval)
+
+    def _raise_errors(self):
+        done = [f for f in self._pending if f.done()]
+        self._pending = [f for f in self._pending if not f.done()]
+        for future in done:
+            future.result()
+
+    def wait(self):
+        # Re-raises any error from the background writer
+        for future in self._pending:
+            future.result()
+        self._pending = []
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+def load_training_state(path, model, optimizer):
+    """
+    Restores model, optimizer and RNG state. Returns a dict with
+    'epoch', 'global_step' and 'batches_in_epoch' (None if no checkpoint).
+
+    To resume mid-epoch, skip the first `batches_in_epoch` batches through the
+    sampler (e.g. slice DistributedSampler's indices after set_epoch), rather
+    than iterating the DataLoader over them.
+    """
     if not os.path.exists(path):
         print("[Checkpoint] No checkpoint found. Starting from scratch.")
-        return 0
+        return None
     
     print(f"[Checkpoint] Loading from {path}")
-    checkpoint = torch.load(path)
+    # CPU first: load_state_dict moves tensors to the model's device, RNG state must stay on the CPU
+    checkpoint = torch.load(path, map_location="cpu", weights_only=False)
     model.load_state_dict(checkpoint['model_state_dict'])
     optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
-    return checkpoint['epoch']
+    if 'rng_state' in checkpoint:
+        restore_rng_state(checkpoint['rng_state'])
+    return {
+        'epoch': checkpoint['epoch'],
+        'global_step': checkpoint.get('global_step'),
+        'batches_in_epoch': checkpoint.get('batches_in_epoch'),
+    }
+
+def load_checkpoint(path, model, optimizer):
+    state = load_training_state(path, model, optimizer)
+    return 0 if state is None else state['epoch']
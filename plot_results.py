@@ -10,7 +10,46 @@ def load_result(filename):
     with open(filename, 'r') as f:
         return json.load(f)
 
+COLLECTIVES = ["all_reduce", "reduce_scatter", "all_gather", "broadcast"]
+
+def plot_collectives(paths, out="collectives_comparison.png"):
+    # Bus bandwidth vs message size per collective, one line per results file
+    data = {}
+    for path in paths:
+        res = load_result(path)
+        if res and res.get("collectives"):
+            c = res["collectives"]
+            data[f"{os.path.basename(path)} ({c['backend']}, {c['world_size']} ranks)"] = c
+    if not data:
+        return
+
+    fig, axes = plt.subplots(1, len(COLLECTIVES), figsize=(5 * len(COLLECTIVES), 4.5))
+    for ax, op in zip(axes, COLLECTIVES):
+        for label, c in data.items():
+            if c.get(op):
+                ax.plot([r["size_bytes"] for r in c[op]], [r["busbw_gb_s"] for r in c[op]],
+                        marker="o", markersize=3, label=label)
+        ax.set_xscale("log", base=2)
+        ax.set_title(op)
+        ax.set_xlabel("Message size (bytes)")
+        ax.set_ylabel("Bus bandwidth GB/s")
+        ax.grid(linestyle='--', alpha=0.7)
+    axes[0].legend(fontsize=7)
+
+    plt.tight_layout()
+    plt.savefig(out)
+    print(f"Plot saved to {out}")
+    for label, c in data.items():
+        print(f"{label}: barrier latency {c['barrier']['latency_us']:.1f} us")
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collectives", nargs="*",
+                        default=["benchmarks/local_collectives_results.json"],
+                        help="Results files from benchmark_suite.py --mode collectives")
+    args = parser.parse_args()
+    plot_collectives(args.collectives)
+
     files = {
         "Local Mac (MPS)": "benchmarks/local_mps_results.json",
         "Local Mac (CPU)": "benchmarks/local_cpu_results.json",
@@ -21,7 +60,7 @@ def main():
     data = {}
     for label, path in files.items():
         res = load_result(path)
-        if res:
+        if res and "matmul" in res:
             data[label] = res
 
     if not data:
@@ -0,0 +1,475 @@
+import os
+import re
+import json
+import random
+import logging
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.distributed.optim import ZeroRedundancyOptimizer
+import torch.distributed.checkpoint as dcp
+from torch.distributed.checkpoint.state_dict import (
+    get_state_dict, set_state_dict, get_model_state_dict, set_model_state_dict,
+)
+from torch.distributed.fsdp import FullyShardedDataParallel as FSDP
+from torch.utils.data import Sampler
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Atomic Save + Retention
+# -----------------------------------------------------------------------------
+def atomic_save(state, path):
+    """torch.save to <path>.tmp, then rename. A job killed mid-write leaves the old file intact."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+_NUMBERED = re.compile(r"^(?P<prefix>.*?)(?P<num>\d+)(?P<ext>(\.\w+)?)$")
+
+def prune_checkpoints(path, keep_last=None, keep_every=None, interval=1):
+    """
+    Retention for numbered checkpoints that share a name pattern with `path`
+    (e.g. epoch_7.pt -> epoch_*.pt, step_000100.pt -> step_*.pt, and sharded
+    checkpoint directories such as ddp_step_00000100).
+
+    Keeps the `keep_last` highest-numbered ones plus every `keep_every`-th
+    save; deletes the rest. The number in the name advances by `interval` per
+    save (1 for epochs, --save-every-steps for step checkpoints), so the n-th
+    save is number // interval. keep_last=None disables pruning. MN5 scratch
+    has a file-count quota, so this matters there.
+    """
+    if keep_last is None:
+        return []
+    directory, name = os.path.split(os.path.abspath(path))
+    match = _NUMBERED.match(name)
+    if match is None:
+        return []
+
+    numbered = []
+    for other in os.listdir(directory):
+        m = _NUMBERED.match(other)
+        if m and m.group("prefix") == match.group("prefix") and m.group("ext") == match.group("ext"):
+            numbered.append((int(m.group("num")), other))
+    numbered.sort()
+
+    keep = {num for num, _ in numbered[-keep_last:]} if keep_last > 0 else set()
+    if keep_every:
+        keep |= {num for num, _ in numbered if (num // interval) % keep_every == 0}
+
+    removed = []
+    for num, other in numbered:
+        if num not in keep:
+            target = os.path.join(directory, other)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            else:
+                os.remove(target)
+            removed.append(other)
+    return removed
+
+# -----------------------------------------------------------------------------
+# Asynchronous Checkpointer
+# -----------------------------------------------------------------------------
+def snapshot_state(obj):
+    """
+    Detached CPU copy of every tensor in a (nested) state dict, so training can
+    keep mutating the live parameters while the copy is written. CUDA tensors
+    go through pinned buffers with non-blocking copies.
+    """
+    if isinstance(obj, torch.Tensor):
+        if obj.device.type == "cuda":
+            out = torch.empty(obj.shape, dtype=obj.dtype, pin_memory=True)
+            out.copy_(obj.detach(), non_blocking=True)
+            return out
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: snapshot_state(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot_state(v) for v in obj)
+    return obj
+
+class AsyncCheckpointer:
+    """
+    Writes checkpoints on a background thread.
+
+    save() blocks only for the device->host snapshot; serialization and the
+    filesystem write (tmp + rename) happen off the training thread. At most
+    `max_in_flight` saves are pending: a further save() waits for a slot
+    (back-pressure), so a slow filesystem cannot pile up host-memory copies.
+    Errors from the writer are re-raised on the next save()/wait().
+    """
+    def __init__(self, max_in_flight=1, keep_last=None, keep_every=None):
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ckpt-writer")
+        self._pending = []
+
+    def save(self, state, path, interval=1):
+        """`interval`: how far the number in `path` advances per save (see prune_checkpoints)."""
+        self._raise_errors()
+        self._slots.acquire()
+        try:
+            snapshot = snapshot_state(state)
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()  # pinned copies above are non-blocking
+            future = self._executor.submit(self._write, snapshot, path, interval)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append(future)
+        return future
+
+    def _write(self, snapshot, path, interval):
+        atomic_save(snapshot, path)
+        removed = prune_checkpoints(path, self.keep_last, self.keep_every, interval)
+        logger.info(f"[Checkpoint] Wrote {path}" + (f" (pruned {len(removed)} old)" if removed else ""))
+
+    def _raise_errors(self):
+        done = [f for f in self._pending if f.done()]
+        self._pending = [f for f in self._pending if not f.done()]
+        for future in done:
+            future.result()
+
+    def wait(self):
+        """Block until every pending save is on disk."""
+        for future in self._pending:
+            future.result()
+        self._pending = []
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+# -----------------------------------------------------------------------------
+# Sharded Checkpoints (DDP)
+# -----------------------------------------------------------------------------
+# Layout of a sharded checkpoint directory:
+#
+#   manifest.json        world size, every tensor's owning shard/shape/dtype,
+#                        optimizer param_groups and any extra training state
+#   shard_00000.pt ...   one file per rank, holding that rank's slice
+#   rank_state_00000.pt  optional per-rank state (RNG), only reused at the same world size
+#
+# Model and optimizer tensors are flattened into named entries
+# ("model/<key>", "optim/<param index>/<state name>") and spread across ranks
+# balanced by bytes, so each rank writes ~1/N of the checkpoint in parallel.
+# The manifest is written last: if it exists, all shards are complete.
+
+MANIFEST_NAME = "manifest.json"
+SHARDED_FORMAT = "sharded-v1"
+
+def _shard_path(directory, index):
+    return os.path.join(directory, f"shard_{index:05d}.pt")
+
+def _flatten_state(model_state, optim_state):
+    entries, optim_scalars = {}, {}
+    for key, value in model_state.items():
+        entries[f"model/{key}"] = value
+    for param_idx, param_state in optim_state["state"].items():
+        for name, value in param_state.items():
+            if isinstance(value, torch.Tensor):
+                entries[f"optim/{param_idx}/{name}"] = value
+            else:
+                optim_scalars[f"{param_idx}/{name}"] = value
+    return entries, optim_scalars
+
+def _unflatten_state(entries, optim_scalars, param_groups):
+    model_state, optim_state = {}, {}
+    for name, value in entries.items():
+        kind, rest = name.split("/", 1)
+        if kind == "model":
+            model_state[rest] = value
+        else:
+            param_idx, state_name = rest.split("/", 1)
+            optim_state.setdefault(int(param_idx), {})[state_name] = value
+    for name, value in optim_scalars.items():
+        param_idx, state_name = name.split("/", 1)
+        optim_state.setdefault(int(param_idx), {})[state_name] = value
+    return model_state, {"state": optim_state, "param_groups": param_groups}
+
+def _assign_shards(sizes, num_shards, fixed=None):
+    """
+    Greedy largest-first bin packing by bytes. Deterministic on every rank.
+    `fixed` pins entries to a shard first (state only that rank holds).
+    """
+    fixed = fixed or {}
+    loads = [0] * num_shards
+    assignment = dict(fixed)
+    for name, shard in fixed.items():
+        loads[shard] += sizes[name]
+    by_size = sorted((n for n in sizes if n not in fixed), key=lambda n: (-sizes[n], n))
+    for name in by_size:
+        shard = loads.index(min(loads))
+        assignment[name] = shard
+        loads[shard] += sizes[name]
+    return assignment
+
+def optimizer_state_dict(optimizer):
+    """
+    optimizer.state_dict() with global parameter indices. For a
+    ZeroRedundancyOptimizer this is the rank's own partition only (no
+    consolidation collective); load_state_dict accepts the merged result.
+    """
+    if not isinstance(optimizer, ZeroRedundancyOptimizer):
+        return optimizer.state_dict()
+    params = [p for group in optimizer.param_groups for p in group["params"]]
+    index = {id(p): i for i, p in enumerate(params)}
+    groups, start = [], 0
+    for group in optimizer.param_groups:
+        groups.append({**{k: v for k, v in group.items() if k != "params"},
+                       "params": list(range(start, start + len(group["params"])))})
+        start += len(group["params"])
+    state = {index[id(p)]: param_state for p, param_state in optimizer.optim.state.items()}
+    return {"state": state, "param_groups": groups}
+
+def _rank_state_path(directory, rank):
+    return os.path.join(directory, f"rank_state_{rank:05d}.pt")
+
+def save_sharded_checkpoint(directory, model, optimizer, extra=None, rank_state=None):
+    """
+    Collective: every rank calls this. Each rank writes only its own shard
+    (and its `rank_state`, e.g. RNG state, if given); rank 0 writes the
+    manifest once all shards are on disk.
+    Pass the unwrapped model (model.module for DDP) or the FSDP model itself
+    (written with torch.distributed.checkpoint, see below). The optimizer may
+    be a ZeroRedundancyOptimizer: each rank then writes its own partition's state.
+    """
+    if isinstance(model, FSDP):
+        return _save_dcp_checkpoint(directory, model, optimizer, extra, rank_state)
+    rank = dist.get_rank() if dist.is_initialized() else 0
+    world_size = dist.get_world_size() if dist.is_initialized() else 1
+    os.makedirs(directory, exist_ok=True)
+
+    optim_state = optimizer_state_dict(optimizer)
+    entries, optim_scalars = _flatten_state(model.state_dict(), optim_state)
+    meta = {name: {"shape": list(t.shape), "dtype": str(t.dtype).replace("torch.", ""),
+                   "bytes": t.numel() * t.element_size()} for name, t in entries.items()}
+
+    # Ranks may hold different entries (sharded optimizer state): merge what
+    # every rank has; an entry only some ranks hold is written by the first of them
+    all_meta, all_scalars = [meta], [optim_scalars]
+    if world_size > 1:
+        all_meta, all_scalars = [None] * world_size, [None] * world_size
+        dist.all_gather_object(all_meta, meta)
+        dist.all_gather_object(all_scalars, optim_scalars)
+    merged, holders = {}, {}
+    for r, rank_meta in enumerate(all_meta):
+        for name, m in rank_meta.items():
+            merged.setdefault(name, m)
+            holders.setdefault(name, []).append(r)
+    fixed = {name: ranks[0] for name, ranks in holders.items() if len(ranks) < world_size}
+    assignment = _assign_shards({name: m["bytes"] for name, m in merged.items()}, world_size, fixed)
+    optim_scalars = {k: v for rank_scalars in all_scalars for k, v in rank_scalars.items()}
+
+    mine = {name: t.detach().cpu() for name, t in entries.items() if assignment[name] == rank}
+    atomic_save(mine, _shard_path(directory, rank))
+    if rank_state is not None:
+        atomic_save(rank_state, _rank_state_path(directory, rank))
+
+    if world_size > 1:
+        dist.barrier()
+    if rank == 0:
+        manifest = {
+            "format": SHARDED_FORMAT,
+            "world_size": world_size,
+            "entries": {
+                name: {"shard": assignment[name], "shape": m["shape"], "dtype": m["dtype"]}
+                for name, m in merged.items()
+            },
+            "optim_param_groups": optim_state["param_groups"],
+            "optim_scalars": optim_scalars,
+            "extra": extra or {},
+        }
+        _write_manifest(directory, manifest)
+    if world_size > 1:
+        dist.barrier()
+
+def _write_manifest(directory, manifest):
+    tmp_path = os.path.join(directory, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+def load_sharded_checkpoint(directory, model, optimizer=None):
+    """
+    Collective: every rank calls this, at any world size.
+
+    Shard file i is read by rank i % world_size only, and each tensor is then
+    broadcast from the rank that read it. Loading a checkpoint saved with N
+    ranks into M ranks therefore "reshards" on load. Returns the manifest's
+    `extra` dict (epoch, step, ...).
+
+    Only the file reads are split across ranks: every rank still receives
+    every tensor (DDP replicas need the full model; a ZeroRedundancyOptimizer
+    drops the state outside its partition afterwards), so load time does not
+    shrink with more ranks the way save time does.
+    """
+    rank = dist.get_rank() if dist.is_initialized() else 0
+    world_size = dist.get_world_size() if dist.is_initialized() else 1
+    with open(os.path.join(directory, MANIFEST_NAME), "r") as f:
+        manifest = json.load(f)
+    if manifest.get("format") == DCP_FORMAT:
+        return _load_dcp_checkpoint(directory, model, optimizer, manifest)
+    if manifest.get("format") != SHARDED_FORMAT:
+        raise ValueError(f"{directory} is not a {SHARDED_FORMAT} checkpoint")
+    if isinstance(model, FSDP):
+        raise ValueError(f"{directory} is a {SHARDED_FORMAT} (DDP) checkpoint; FSDP resumes from "
+                         f"{DCP_FORMAT} checkpoints only")
+
+    local = {}
+    for shard in range(manifest["world_size"]):
+        if shard % world_size == rank:
+            local.update(torch.load(_shard_path(directory, shard), map_location="cpu", weights_only=True))
+
+    entries = {}
+    for name in sorted(manifest["entries"]):
+        meta = manifest["entries"][name]
+        owner = meta["shard"] % world_size
+        if owner == rank:
+            tensor = local[name]
+        else:
+            tensor = torch.empty(meta["shape"], dtype=getattr(torch, meta["dtype"]))
+        if world_size > 1:
+            dist.broadcast(tensor, src=owner)
+        entries[name] = tensor
+
+    model_state, optim_state = _unflatten_state(
+        entries, manifest["optim_scalars"], manifest["optim_param_groups"]
+    )
+    model.load_state_dict(model_state)
+    if optimizer is not None:
+        # JSON has no tuples: restore them where the live optimizer has one (AdamW betas)
+        for saved_group, group in zip(optim_state["param_groups"], optimizer.param_groups):
+            for key, value in saved_group.items():
+                if isinstance(group.get(key), tuple):
+                    saved_group[key] = tuple(value)
+        optimizer.load_state_dict(optim_state)
+    return manifest["extra"]
+
+# -----------------------------------------------------------------------------
+# Sharded Checkpoints (FSDP, torch.distributed.checkpoint)
+# -----------------------------------------------------------------------------
+# FSDP state is saved as sharded state dicts: every rank writes only the
+# parameter / optimizer shards it holds, and no rank ever materializes the
+# full model. DCP records each shard's global offsets, so loading at another
+# world size (or sharding strategy) reads just the byte ranges a rank needs.
+# The same manifest.json (format "dcp-v1") carries `extra` and is again
+# written last. Keys are the original parameter names, so a plain (DDP)
+# model can load these checkpoints too.
+DCP_FORMAT = "dcp-v1"
+
+def _save_dcp_checkpoint(directory, model, optimizer, extra=None, rank_state=None):
+    rank = dist.get_rank()
+    os.makedirs(directory, exist_ok=True)
+    model_state, optim_state = get_state_dict(model, optimizer)
+    dcp.save({"model": model_state, "optim": optim_state}, checkpoint_id=directory)
+    if rank_state is not None:
+        atomic_save(rank_state, _rank_state_path(directory, rank))
+    dist.barrier()
+    if rank == 0:
+        _write_manifest(directory, {"format": DCP_FORMAT, "world_size": dist.get_world_size(), "extra": extra or {}})
+    dist.barrier()
+
+def _load_dcp_checkpoint(directory, model, optimizer, manifest):
+    # The current (sharded) state dicts are the load targets: DCP fills each
+    # rank's local shards in place, then set_state_dict hands them back
+    if optimizer is None:
+        state = {"model": get_model_state_dict(model)}
+        dcp.load(state, checkpoint_id=directory)
+        set_model_state_dict(model, state["model"])
+    else:
+        model_state, optim_state = get_state_dict(model, optimizer)
+        state = {"model": model_state, "optim": optim_state}
+        dcp.load(state, checkpoint_id=directory)
+        set_state_dict(model, optimizer, model_state_dict=state["model"], optim_state_dict=state["optim"])
+    return manifest["extra"]
+
+def load_rank_state(directory):
+    """This rank's saved rank_state, or None (missing, or saved at another world size)."""
+    rank = dist.get_rank() if dist.is_initialized() else 0
+    world_size = dist.get_world_size() if dist.is_initialized() else 1
+    with open(os.path.join(directory, MANIFEST_NAME), "r") as f:
+        saved_world_size = json.load(f)["world_size"]
+    path = _rank_state_path(directory, rank)
+    if saved_world_size != world_size or not os.path.exists(path):
+        return None
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+# -----------------------------------------------------------------------------
+# Mid-Epoch Resume: Sampler Position + RNG State
+# -----------------------------------------------------------------------------
+class ResumableSampler(Sampler):
+    """
+    Wraps a deterministic sampler (DistributedSampler: the permutation depends
+    only on seed + epoch) and can start the next pass at an arbitrary offset.
+
+    Skipping only slices the index list, so resuming after N consumed batches
+    does not load or collate those batches again.
+    """
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.start_index = 0
+
+    def set_epoch(self, epoch):
+        self.sampler.set_epoch(epoch)
+
+    def skip(self, num_samples):
+        """Next __iter__ starts after `num_samples` indices (applies to one pass)."""
+        self.start_index = num_samples
+
+    def __iter__(self):
+        indices = list(iter(self.sampler))[self.start_index:]
+        self.start_index = 0
+        return iter(indices)
+
+    def __len__(self):
+        return max(len(self.sampler) - self.start_index, 0)
+
+def capture_rng_state():
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+def restore_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    # set_rng_state needs CPU ByteTensors, even if the checkpoint was loaded onto a device
+    torch.set_rng_state(state["torch"].cpu())
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all([s.cpu() for s in state["cuda"]])
+
+def latest_checkpoint(directory, pattern=r"^(step|epoch)_\d+\.pt$"):
+    """
+    Most recently written checkpoint in `directory` matching `pattern`, or None.
+    Sharded checkpoint directories only count once their manifest exists.
+    """
+    if not os.path.isdir(directory):
+        return None
+    candidates = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not re.match(pattern, name):
+            continue
+        if os.path.isdir(path):
+            path = os.path.join(path, MANIFEST_NAME)
+            if not os.path.exists(path):
+                continue
+        candidates.append(path)
+    if not candidates:
+        return None
+    latest = max(candidates, key=os.path.getmtime)
+    return os.path.dirname(latest) if latest.endswith(MANIFEST_NAME) else latest
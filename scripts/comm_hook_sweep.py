@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from comm_hooks import COMM_HOOKS
+
+# -----------------------------------------------------------------------------
+# Comm Hook Comparison
+# -----------------------------------------------------------------------------
+# Trains the tiny model once per DDP comm hook (same seed, same data order)
+# on local gloo ranks via fake_multi_node_launcher.py, then compares bytes
+# sent per step and the loss curve against plain fp32 all-reduce:
+#
+#   python scripts/comm_hook_sweep.py --nproc 4 --epochs 2
+#   python scripts/comm_hook_sweep.py --hooks allreduce,topk -- --topk-ratio 0.05
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def read_metrics(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize(records):
+    losses = [r["train/loss"] for r in records if "train/loss" in r]
+    sent = [r["comm/sent_mb_per_step"] for r in records if "comm/sent_mb_per_step" in r]
+    ratios = [r["comm/compression_ratio"] for r in records if "comm/compression_ratio" in r]
+    return {
+        "final_loss": losses[-1] if losses else None,
+        # Mean over the run, so the loss comparison isn't just the last noisy interval
+        "mean_loss": sum(losses) / len(losses) if losses else None,
+        "sent_mb_per_step": sum(sent) / len(sent) if sent else None,
+        "compression_ratio": sum(ratios) / len(ratios) if ratios else None,
+        "step_ms": records[-1].get("time/step_ms") if records else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare DDP gradient compression hooks")
+    parser.add_argument("--hooks", type=str, default=",".join(COMM_HOOKS))
+    parser.add_argument("--nnodes", type=int, default=1)
+    parser.add_argument("--nproc", type=int, default=2, help="Ranks per node")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--log-dir", type=str, default="logs/comm_hooks")
+    parser.add_argument("--out", type=str, default=None, help="Write the comparison as JSON")
+    parser.add_argument("train_args", nargs=argparse.REMAINDER,
+                        help="Extra ddp_simulation_train.py arguments (after --)")
+    args = parser.parse_args()
+    train_args = [a for a in args.train_args if a != "--"]
+
+    results = {}
+    for hook in args.hooks.split(","):
+        log_dir = os.path.join(args.log_dir, hook)
+        metrics_path = os.path.join(log_dir, "metrics.jsonl")
+        if os.path.exists(metrics_path):
+            os.remove(metrics_path)  # the JSONL backend appends
+        cmd = [
+            sys.executable, os.path.join(SCRIPTS_DIR, "fake_multi_node_launcher.py"),
+            "--nnodes", str(args.nnodes), "--nproc-per-node", str(args.nproc),
+            os.path.join(SCRIPTS_DIR, "ddp_simulation_train.py"),
+            "--comm-hook", hook, "--epochs", str(args.epochs), "--log-interval", "1",
+            "--log-dir", log_dir, "--metrics-backends", "jsonl", *train_args,
+        ]
+        print(f"=== {hook} ===", flush=True)
+        if subprocess.run(cmd).returncode != 0:
+            results[hook] = None
+            continue
+        results[hook] = summarize(read_metrics(metrics_path))
+
+    baseline = (results.get("allreduce") or {}).get("mean_loss")
+    print(f"\n{'hook':>10} {'MB/step':>10} {'ratio':>7} {'step ms':>9} {'final loss':>11} {'mean loss':>10} {'vs fp32':>8}")
+    for hook, r in results.items():
+        if r is None:
+            print(f"{hook:>10}  failed")
+            continue
+        delta = f"{(r['mean_loss'] - baseline) / baseline * 100:+.2f}%" if baseline and r["mean_loss"] else "-"
+        print(f"{hook:>10} {r['sent_mb_per_step']:10.3f} {r['compression_ratio']:6.1f}x {r['step_ms']:9.1f} "
+              f"{r['final_loss']:11.4f} {r['mean_loss']:10.4f} {delta:>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=4)
+    return 0 if all(results.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import threading
+import torch
+import torch.distributed as dist
+from torch.distributed.algorithms.ddp_comm_hooks import default_hooks, powerSGD_hook as powersgd
+
+# -----------------------------------------------------------------------------
+# Gradient Compression Hooks for DDP
+# -----------------------------------------------------------------------------
+# Every hook here is a plain DDP comm hook (state, bucket) -> Future[Tensor],
+# so it composes with training_metrics.timed_comm_hook. All of them only use
+# all_reduce / all_gather, which gloo supports, so they run on CPU ranks.
+#
+#   allreduce  full fp32 gradients (DDP's default)
+#   fp16/bf16  cast to 16 bits, all_reduce, cast back (2x fewer bytes)
+#   powersgd   rank-r low-rank approximation with error feedback (torch's PowerSGD)
+#   topk       k largest-magnitude entries per bucket, local error feedback
+COMM_HOOKS = ("allreduce", "fp16", "bf16", "powersgd", "topk")
+
+class CommStats:
+    """
+    Bytes a rank puts on the wire per optimizer step, vs. the dense fp32
+    gradient. Hooks call add() once per bucket (from the training thread).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.dense_bytes = 0
+        self.sent_bytes = 0
+        self.steps = 0
+
+    def add(self, bucket, sent_bytes):
+        with self._lock:
+            self.dense_bytes += bucket.buffer().numel() * 4
+            self.sent_bytes += sent_bytes
+            if bucket.is_last():
+                self.steps += 1
+
+    def summary(self):
+        """Averages since the previous summary() call."""
+        with self._lock:
+            steps = max(self.steps, 1)
+            metrics = {
+                "comm/sent_mb_per_step": self.sent_bytes / steps / 1e6,
+                "comm/compression_ratio": self.dense_bytes / self.sent_bytes if self.sent_bytes else 1.0,
+            }
+            self.reset()
+        return metrics
+
+def _allreduce_hook(state, bucket):
+    stats, group = state
+    stats.add(bucket, bucket.buffer().numel() * bucket.buffer().element_size())
+    return default_hooks.allreduce_hook(group, bucket)
+
+def _cast_hook(dtype):
+    def hook(state, bucket):
+        stats, group = state
+        buffer = bucket.buffer()
+        world_size = dist.get_world_size(group)
+        compressed = buffer.to(dtype).div_(world_size)
+        stats.add(bucket, compressed.numel() * compressed.element_size())
+        fut = dist.all_reduce(compressed, group=group, async_op=True).get_future()
+
+        def decompress(fut):
+            buffer.copy_(fut.value()[0])
+            return buffer
+
+        return fut.then(decompress)
+    return hook
+
+def _powersgd_sent_bytes(state, bucket):
+    """Mirrors powerSGD_hook: vanilla all_reduce before start_powerSGD_iter; after,
+    1-D tensors and matrices not worth compressing go dense, the rest as P and Q."""
+    if state.iter < state.start_powerSGD_iter:
+        return bucket.buffer().numel() * 4
+    numel = 0
+    for grad in bucket.gradients():
+        if grad.ndimension() <= 1:
+            numel += grad.numel()
+            continue
+        rows = grad.shape[0]
+        cols = grad.numel() // rows
+        rank = min(rows, cols, state.matrix_approximation_rank)
+        if (rows + cols) * rank * state.min_compression_rate < rows * cols:
+            numel += (rows + cols) * rank
+        else:
+            numel += rows * cols
+    return numel * 4
+
+def _powersgd_hook(state, bucket):
+    stats, psgd_state = state
+    stats.add(bucket, _powersgd_sent_bytes(psgd_state, bucket))
+    return powersgd.powerSGD_hook(psgd_state, bucket)
+
+class TopKState:
+    def __init__(self, group, ratio):
+        if not 0 < ratio <= 1:
+            raise ValueError(f"top-k ratio must be in (0, 1], got {ratio}")
+        self.group = group
+        self.ratio = ratio
+        # Per-bucket residual (gradient mass not sent yet), added back next step
+        self.residuals = {}
+
+def _pack(values, indices):
+    # int64 per entry: index in the high 32 bits, the fp32 value's bits in the low 32
+    bits = values.view(torch.int32).to(torch.int64) & 0xFFFFFFFF
+    return (indices.to(torch.int64) << 32) | bits
+
+def _unpack(packed):
+    bits = packed & 0xFFFFFFFF
+    bits = torch.where(bits >= 2 ** 31, bits - 2 ** 32, bits).to(torch.int32)
+    return bits.view(torch.float32), packed >> 32
+
+def _topk_hook(state, bucket):
+    stats, topk = state
+    buffer = bucket.buffer()
+    if buffer.dtype != torch.float32:
+        stats.add(bucket, buffer.numel() * buffer.element_size())
+        return default_hooks.allreduce_hook(topk.group, bucket)
+    world_size = dist.get_world_size(topk.group)
+
+    # Error feedback: what earlier steps left out is sent once it is large enough.
+    # DDP rebuilds its buckets after the first step, so a size change drops the residual.
+    residual = topk.residuals.get(bucket.index())
+    grad = buffer if residual is None or residual.shape != buffer.shape else buffer + residual
+    k = max(1, int(grad.numel() * topk.ratio))
+    _, indices = torch.topk(grad.abs(), k, sorted=False)
+    values = grad[indices]
+    residual = grad.clone()
+    residual[indices] = 0
+    topk.residuals[bucket.index()] = residual
+
+    packed = _pack(values, indices)
+    gathered = [torch.empty_like(packed) for _ in range(world_size)]
+    stats.add(bucket, packed.numel() * packed.element_size())
+    fut = dist.all_gather(gathered, packed, group=topk.group, async_op=True).get_future()
+
+    def decompress(fut):
+        values, indices = _unpack(torch.cat(gathered))
+        buffer.zero_()
+        buffer.index_add_(0, indices, values)
+        return buffer.div_(world_size)
+
+    return fut.then(decompress)
+
+def make_comm_hook(name, stats, process_group=None, powersgd_rank=1, powersgd_start_iter=10,
+                   powersgd_warm_start=True, topk_ratio=0.01):
+    """
+    Returns (state, hook) for model.register_comm_hook. Bytes sent go to `stats`.
+
+    PowerSGD runs plain all_reduce for the first powersgd_start_iter steps
+    (its recommended warm-up); warm_start reuses last step's Q as the next
+    power-iteration start, which saves one orthogonalization's worth of error.
+    """
+    if name == "allreduce":
+        return (stats, process_group), _allreduce_hook
+    if name in ("fp16", "bf16"):
+        dtype = torch.float16 if name == "fp16" else torch.bfloat16
+        return (stats, process_group), _cast_hook(dtype)
+    if name == "powersgd":
+        psgd_state = powersgd.PowerSGDState(
+            process_group=process_group,
+            matrix_approximation_rank=powersgd_rank,
+            start_powerSGD_iter=powersgd_start_iter,
+            warm_start=powersgd_warm_start,
+            use_error_feedback=True,
+        )
+        return (stats, psgd_state), _powersgd_hook
+    if name == "topk":
+        return (stats, TopKState(process_group, topk_ratio)), _topk_hook
+    raise ValueError(f"Unknown comm hook '{name}', expected one of {COMM_HOOKS}")
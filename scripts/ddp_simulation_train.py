@@ -1,14 +1,38 @@
 import os
 import json
+import math
 import argparse
+import time
 import logging
+import contextlib
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 import torch.distributed as dist
+from torch.utils.checkpoint import checkpoint
 from torch.utils.data import DataLoader, Dataset
 from torch.utils.data.distributed import DistributedSampler
 
+from token_dataset import TokenBinDataset, collate_batch
+from checkpointing import (
+    AsyncCheckpointer, ResumableSampler, save_sharded_checkpoint, load_sharded_checkpoint, load_rank_state,
+    capture_rng_state, restore_rng_state, latest_checkpoint, prune_checkpoints,
+)
+from train_utils import (
+    PRECISIONS, COMPILE_MODES, resolve_grad_accum_steps, accumulation_window, autocast_context,
+    make_grad_scaler, compile_model, StepClock, resolve_ddp_config, OPTIMIZER_IMPLS, LR_SCHEDULES,
+    resolve_optimizer_impl, optimizer_impl_kwargs, param_groups, make_optimizer, make_lr_scheduler,
+)
+from metrics_sink import METRICS_BACKENDS, make_metrics_sink
+from comm_hooks import COMM_HOOKS, CommStats, make_comm_hook
+from zero import ZERO_STAGES, make_zero_optimizer, zero_param_owners, zero_reduce_hook, optimizer_memory_report
+from loader_tuning import loader_kwargs, auto_tune_loader
+from fsdp_utils import SHARDING_STRATEGIES, BACKWARD_PREFETCH, wrap_fsdp, shard_replicas, local_parameter_bytes
+from training_metrics import (
+    StepTimer, RunningMetrics, format_metrics, timed_comm_hook, training_flops_per_token, load_peak_flops,
+)
+
 # -----------------------------------------------------------------------------
 # Logging Setup (Rank Aware)
 # -----------------------------------------------------------------------------
@@ -32,24 +56,36 @@ def setup_logging(rank, save_dir):
 # -----------------------------------------------------------------------------
 # Tiny Model Definition (Redefined for standalone clarity)
 # -----------------------------------------------------------------------------
+ATTN_IMPLEMENTATIONS = ("sdpa", "manual")
+
 class TinyAttention(nn.Module):
-    def __init__(self, hidden_size, num_heads, dropout=0.1):
+    def __init__(self, hidden_size, num_heads, dropout=0.1, attn_implementation="sdpa"):
         super().__init__()
+        if attn_implementation not in ATTN_IMPLEMENTATIONS:
+            raise ValueError(f"Unknown attn_implementation: {attn_implementation}")
         self.num_heads = num_heads
         self.head_dim = hidden_size // num_heads
         self.scale = self.head_dim ** -0.5
+        self.attn_implementation = attn_implementation
         self.qkv = nn.Linear(hidden_size, hidden_size * 3)
         self.proj = nn.Linear(hidden_size, hidden_size)
         self.dropout = nn.Dropout(dropout)
         
-    def forward(self, x):
+    def forward(self, x, mask=None):
         B, T, C = x.shape
         qkv = self.qkv(x).view(B, T, 3, self.num_heads, self.head_dim)
         q, k, v = qkv.permute(2, 0, 3, 1, 4)
-        attn = (q @ k.transpose(-2, -1)) * self.scale
-        attn = attn.softmax(dim=-1)
-        attn = self.dropout(attn)
-        out = (attn @ v).transpose(1, 2).contiguous().view(B, T, C)
+        if self.attn_implementation == "sdpa":
+            out = F.scaled_dot_product_attention(
+                q, k, v, dropout_p=self.dropout.p if self.training else 0.0, is_causal=True
+            )
+        else:
+            attn = (q @ k.transpose(-2, -1)) * self.scale
+            attn = attn.masked_fill(mask == 0, float("-inf"))
+            attn = attn.softmax(dim=-1)
+            attn = self.dropout(attn)
+            out = attn @ v
+        out = out.transpose(1, 2).contiguous().view(B, T, C)
         return self.proj(out)
 
 class TinyMLP(nn.Module):
@@ -67,29 +103,54 @@ class TinyMLP(nn.Module):
         x = self.fc2(x)
         return self.dropout(x)
 
+class TinyBlock(nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.ln1 = nn.LayerNorm(config["hidden_size"])
+        self.attn = TinyAttention(config["hidden_size"], config["num_attention_heads"],
+                                  attn_implementation=config.get("attn_implementation", "sdpa"))
+        self.ln2 = nn.LayerNorm(config["hidden_size"])
+        self.mlp = TinyMLP(config["hidden_size"], config["intermediate_size"])
+
+    def forward(self, x, mask):
+        x = x + self.attn(self.ln1(x), mask)
+        x = x + self.mlp(self.ln2(x))
+        return x
+
 class TinyTransformer(nn.Module):
     def __init__(self, config):
         super().__init__()
         self.embeddings = nn.Embedding(config["vocab_size"], config["hidden_size"])
-        self.blocks = nn.ModuleList([
-            nn.ModuleDict({
-                "ln1": nn.LayerNorm(config["hidden_size"]),
-                "attn": TinyAttention(config["hidden_size"], config["num_attention_heads"]),
-                "ln2": nn.LayerNorm(config["hidden_size"]),
-                "mlp": TinyMLP(config["hidden_size"], config["intermediate_size"])
-            }) for _ in range(config["num_hidden_layers"])
-        ])
-        self.head = nn.Linear(config["hidden_size"], config["vocab_size"])
+        self.blocks = nn.ModuleList([TinyBlock(config) for _ in range(config["num_hidden_layers"])])
+        self.head = nn.Linear(config["hidden_size"], config["vocab_size"], bias=False)
+        # Weight tying (as in train_tiny_transformer.py): FSDP keeps both uses in the root unit
+        self.head.weight = self.embeddings.weight
+        # Activation checkpointing: true = every block, N = every N-th block
+        self.checkpoint_every = int(config.get("gradient_checkpointing", False))
+        # Causal mask for the manual attention path (sliced per step, not rebuilt)
+        max_T = config["max_position_embeddings"]
+        self.register_buffer(
+            "causal_mask",
+            torch.tril(torch.ones(max_T, max_T, dtype=torch.bool)).view(1, 1, max_T, max_T),
+            persistent=False,
+        )
 
     def forward(self, input_ids, labels=None):
+        T = input_ids.shape[1]
+        mask = self.causal_mask[:, :, :T, :T]
         x = self.embeddings(input_ids)
-        for block in self.blocks:
-            x = x + block["attn"](block["ln1"](x))
-            x = x + block["mlp"](block["ln2"](x))
+        for i, block in enumerate(self.blocks):
+            if self.checkpoint_every and self.training and i % self.checkpoint_every == 0:
+                x = checkpoint(block, x, mask, use_reentrant=False)
+            else:
+                x = block(x, mask)
         logits = self.head(x)
         loss = None
         if labels is not None:
-            loss = nn.CrossEntropyLoss()(logits.view(-1, logits.size(-1)), labels.view(-1))
+            # Shift so that tokens < n predict n (otherwise the task is a copy)
+            shift_logits = logits[..., :-1, :].contiguous()
+            shift_labels = labels[..., 1:].contiguous()
+            loss = nn.CrossEntropyLoss()(shift_logits.view(-1, logits.size(-1)), shift_labels.view(-1))
         return logits, loss
 
 # -----------------------------------------------------------------------------
@@ -108,6 +169,10 @@ class SyntheticTextDataset(Dataset):
         data = torch.randint(0, self.vocab_size, (self.seq_len,))
         return {"input_ids": data, "labels": data}
 
+    def __getitems__(self, indices):
+        data = torch.randint(0, self.vocab_size, (len(indices), self.seq_len))
+        return {"input_ids": data, "labels": data}
+
 # -----------------------------------------------------------------------------
 # DDP Logic
 # -----------------------------------------------------------------------------
@@ -117,7 +182,94 @@ def ddp_main():
     parser.add_argument("--model-config", type=str, default="config/config.json")
     parser.add_argument("--epochs", type=int, default=2)
     parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--attn-implementation", type=str, choices=ATTN_IMPLEMENTATIONS, default=None)
+    parser.add_argument("--data-path", type=str, default=None, help="Token file prefix (default: synthetic data)")
+    parser.add_argument("--seq-len", type=int, default=64)
+    parser.add_argument("--num-workers", type=int, default=0, help="DataLoader workers per rank")
+    parser.add_argument("--prefetch-factor", type=int, default=2)
+    parser.add_argument("--auto-tune-loader", action="store_true",
+                        help="Pick workers / prefetch at startup (cores split across LOCAL_WORLD_SIZE ranks)")
+    parser.add_argument("--loader-target-samples-per-sec", type=float, default=None,
+                        help="Per-rank consumption rate for --auto-tune-loader")
+    parser.add_argument("--strategy", type=str, choices=["ddp", "fsdp"], default="ddp",
+                        help="ddp: replicated model; fsdp: parameters, grads and optimizer state sharded per TinyBlock")
+    parser.add_argument("--sharding-strategy", type=str, choices=list(SHARDING_STRATEGIES), default="full",
+                        help="FSDP: full (ZeRO-3), grad-op (ZeRO-2), hybrid (full within a node, "
+                             "replicated across nodes) or no-shard")
+    parser.add_argument("--cpu-offload", action="store_true", help="FSDP: keep parameter shards on the CPU")
+    parser.add_argument("--backward-prefetch", type=str, choices=list(BACKWARD_PREFETCH), default="pre",
+                        help="FSDP: when to all-gather the next block's parameters in backward")
+    parser.add_argument("--forward-prefetch", action="store_true",
+                        help="FSDP: all-gather the next block's parameters during the current forward")
+    parser.add_argument("--ddp-config", type=str, default=None,
+                        help="JSON with DDP options (e.g. config/ddp_config.json); flags below override it")
+    parser.add_argument("--bucket-cap-mb", type=float, default=None, help="Gradient bucket size (DDP default 25)")
+    parser.add_argument("--gradient-as-bucket-view", action=argparse.BooleanOptionalAction, default=None,
+                        help="Gradients alias the all-reduce buckets (saves one copy + memory)")
+    parser.add_argument("--static-graph", action=argparse.BooleanOptionalAction, default=None,
+                        help="Same graph and used parameters every step (lets DDP reorder buckets)")
+    parser.add_argument("--find-unused-parameters", action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument("--comm-hook", type=str, choices=COMM_HOOKS, default="allreduce",
+                        help="Gradient communication: full fp32, fp16/bf16 cast, PowerSGD or top-k")
+    parser.add_argument("--powersgd-rank", type=int, default=1, help="PowerSGD matrix approximation rank")
+    parser.add_argument("--powersgd-start-iter", type=int, default=10,
+                        help="Plain all-reduce for this many steps first (must be > 1)")
+    parser.add_argument("--powersgd-warm-start", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--topk-ratio", type=float, default=0.01, help="Fraction of gradient entries sent by topk")
+    parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--weight-decay", type=float, default=0.01,
+                        help="AdamW decay on weight matrices (norms, biases and embeddings are never decayed)")
+    parser.add_argument("--optimizer-impl", type=str, choices=OPTIMIZER_IMPLS, default="auto",
+                        help="AdamW update: fused kernel, foreach (batched over tensors) or per-tensor loop")
+    parser.add_argument("--lr-schedule", type=str, choices=LR_SCHEDULES, default="constant")
+    parser.add_argument("--warmup-steps", type=int, default=0, help="Linear LR warmup, in optimizer steps")
+    parser.add_argument("--min-lr-ratio", type=float, default=0.1, help="Cosine schedule floor, as a fraction of the LR")
+    parser.add_argument("--zero-stage", type=int, choices=ZERO_STAGES, default=0,
+                        help="1: shard AdamW state across ranks (ZeroRedundancyOptimizer); "
+                             "2: also reduce each gradient only to its owning rank (less communication; every "
+                             "rank still holds full gradients, unlike ZeRO-2: use --strategy fsdp "
+                             "--sharding-strategy grad-op for that)")
+    parser.add_argument("--checkpoint-format", type=str, choices=["full", "sharded"], default=None,
+                        help="full: rank 0 saves model weights; sharded: every rank saves its slice of model + optimizer "
+                             "(default: full for ddp, sharded for fsdp)")
+    parser.add_argument("--resume-from", type=str, default=None,
+                        help="Sharded checkpoint directory to resume from (any world size), or 'latest'")
+    parser.add_argument("--save-every-steps", type=int, default=None,
+                        help="Sharded checkpoint every N optimizer steps (mid-epoch resumable)")
+    parser.add_argument("--seed", type=int, default=0, help="Data shuffling seed")
+    parser.add_argument("--keep-last-checkpoints", type=int, default=None,
+                        help="Retention (full files or sharded directories): keep only the K most recent")
+    parser.add_argument("--keep-every-checkpoints", type=int, default=None,
+                        help="Retention: additionally keep every M-th checkpoint")
+    parser.add_argument("--grad-accum-steps", type=int, default=1, help="Micro-batches per optimizer step")
+    parser.add_argument("--global-batch-size", type=int, default=None,
+                        help="Effective batch size across all ranks; overrides --grad-accum-steps")
+    parser.add_argument("--precision", type=str, choices=PRECISIONS, default="fp32")
+    parser.add_argument("--compile", type=str, choices=COMPILE_MODES, default="none")
+    parser.add_argument("--compile-scope", type=str, choices=["model", "block"], default="model")
+    parser.add_argument("--compile-cache-dir", type=str,
+                        default=os.environ.get("TORCHINDUCTOR_CACHE_DIR", ".cache/inductor"))
+    parser.add_argument("--compile-fallback-eager", action=argparse.BooleanOptionalAction, default=True,
+                        help="Run eagerly where compilation fails (dynamo suppress_errors, process-wide); "
+                             "--no-compile-fallback-eager makes compile errors fail the run")
+    parser.add_argument("--log-dir", type=str, default="logs/ddp", help="Metrics output directory (rank 0)")
+    parser.add_argument("--metrics-backends", type=str, default="tensorboard,jsonl",
+                        help=f"Comma-separated, from {METRICS_BACKENDS}")
+    parser.add_argument("--log-interval", type=int, default=10)
+    parser.add_argument("--peak-flops-from", type=str, default=None,
+                        help="benchmark_suite.py results JSON whose matmul TFLOPS is the per-rank MFU peak")
+    parser.add_argument("--peak-tflops", type=float, default=None, help="Per-rank peak TFLOPS; overrides --peak-flops-from")
+    parser.add_argument("--sync-timing", action="store_true")
     args = parser.parse_args()
+    fsdp = args.strategy == "fsdp"
+    if args.checkpoint_format is None:
+        args.checkpoint_format = "sharded" if fsdp else "full"
+    if fsdp and args.checkpoint_format == "full":
+        parser.error("--strategy fsdp saves collectively; use --checkpoint-format sharded")
+    if fsdp and (args.zero_stage or args.comm_hook != "allreduce"):
+        parser.error("--zero-stage and --comm-hook are DDP options (FSDP already shards and reduce-scatters)")
+    if args.save_every_steps and args.checkpoint_format != "sharded":
+        parser.error("--save-every-steps needs --checkpoint-format sharded (full checkpoints hold weights only)")
 
     # DDP Environment Variables set by torchrun
     # LOCAL_RANK: Rank on the current node
@@ -137,6 +289,8 @@ def ddp_main():
     # Load Config
     with open(args.model_config, 'r') as f:
         config = json.load(f)
+    if args.attn_implementation:
+        config["attn_implementation"] = args.attn_implementation
 
     # Device
     # For simulation on Mac, we use CPU or MPS.
@@ -148,54 +302,263 @@ def ddp_main():
     logger.info(f"Running on device: {device}")
 
     # Data
-    dataset = SyntheticTextDataset(config["vocab_size"], 64, 1000)
+    if args.data_path:
+        # Memory-mapped: every rank opens the same file, pages are shared by the OS
+        dataset = TokenBinDataset(args.data_path, seq_len=args.seq_len)
+        if dataset.vocab_size > config["vocab_size"]:
+            raise ValueError(f"{args.data_path} uses vocab_size={dataset.vocab_size}, model has {config['vocab_size']}")
+    else:
+        dataset = SyntheticTextDataset(config["vocab_size"], args.seq_len, 1000)
     
     # DISTRIBUTED SAMPLER
-    sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank, shuffle=True)
-    dataloader = DataLoader(dataset, batch_size=args.batch_size, sampler=sampler)
+    # (wrapped so a resumed run can skip this rank's already-consumed batches)
+    sampler = ResumableSampler(
+        DistributedSampler(dataset, num_replicas=world_size, rank=rank, shuffle=True, seed=args.seed)
+    )
+    # Workers / prefetch. Auto-tuning runs on all ranks at once (they share the
+    # node's cores, as in training); every rank then uses rank 0's choice.
+    loader_opts = loader_kwargs(args.num_workers, args.prefetch_factor, persistent_workers=args.num_workers > 0)
+    if args.auto_tune_loader:
+        loader_opts, _ = auto_tune_loader(dataset, args.batch_size, args.loader_target_samples_per_sec,
+                                          pin_memory=False, collate_fn=collate_batch)
+        chosen = [loader_opts]
+        dist.broadcast_object_list(chosen, src=0)
+        loader_opts = chosen[0]
+    logger.info(f"DataLoader settings: {loader_opts}")
+    # With torch.compile, a short final batch would trigger a full recompile
+    dataloader = DataLoader(dataset, batch_size=args.batch_size, sampler=sampler,
+                            collate_fn=collate_batch, drop_last=args.compile != "none",
+                            generator=torch.Generator().manual_seed(args.seed), **loader_opts)
 
-    # Model
+    # Model (same init for a given --seed, so runs with different comm hooks compare;
+    # then a per-rank stream for dropout and synthetic data)
+    torch.manual_seed(args.seed)
     model = TinyTransformer(config).to(device)
+    torch.manual_seed(args.seed + rank)
+    # Counted before wrapping: FSDP leaves each rank only its shard of the parameters
+    flops_per_token = training_flops_per_token(model, config, args.seq_len)
+    param_bytes = local_parameter_bytes(model)
+    # Compile before wrapping: DDP then splits the graph at bucket boundaries
+    compile_model(model, args.compile, scope=args.compile_scope, cache_dir=args.compile_cache_dir,
+                  fallback_to_eager=args.compile_fallback_eager)
     
-    # In DDP, we wrap the model. 
-    # Since we are on CPU/Gloo, we use DistributedDataParallel.
-    # Note: On CPU, device_ids should be None.
-    model = torch.nn.parallel.DistributedDataParallel(model, device_ids=None)
+    if fsdp:
+        # One FSDP unit per TinyBlock; embeddings + head (tied or not) stay in the root unit.
+        # On CPU/gloo FSDP runs without device_id; hybrid builds its node groups from LOCAL_WORLD_SIZE.
+        model = wrap_fsdp(
+            model, TinyBlock, sharding=args.sharding_strategy, cpu_offload=args.cpu_offload,
+            backward_prefetch=args.backward_prefetch, forward_prefetch=args.forward_prefetch, device=device,
+        )
+        logger.info(f"FSDP: sharding={args.sharding_strategy} cpu_offload={args.cpu_offload} "
+                    f"backward_prefetch={args.backward_prefetch} forward_prefetch={args.forward_prefetch}")
+        logger.info(f"Parameters: {local_parameter_bytes(model) / 1e6:.2f} MB on this rank "
+                    f"of {param_bytes / 1e6:.2f} MB")
+    else:
+        # In DDP, we wrap the model. 
+        # Since we are on CPU/Gloo, we use DistributedDataParallel.
+        # Note: On CPU, device_ids should be None.
+        # Bucketing / overlap knobs: DDP defaults < --ddp-config JSON < CLI flags
+        ddp_config = resolve_ddp_config(
+            args.ddp_config,
+            bucket_cap_mb=args.bucket_cap_mb,
+            gradient_as_bucket_view=args.gradient_as_bucket_view,
+            static_graph=args.static_graph,
+            find_unused_parameters=args.find_unused_parameters,
+        )
+        logger.info(f"DDP config: {ddp_config}")
+        model = torch.nn.parallel.DistributedDataParallel(model, device_ids=None, **ddp_config)
+    # Checkpoints take the unwrapped module under DDP, the FSDP root itself under FSDP
+    state_model = model if fsdp else model.module
 
-    optimizer = optim.AdamW(model.parameters(), lr=1e-3)
+    # Step timing + MFU. Tokens and peak FLOPs are both counted across all ranks.
+    # The comm hook times each gradient bucket's all-reduce into the "comm" phase,
+    # and the part left running after backward's last bucket into "comm_exposed".
+    peak_flops = load_peak_flops(device, args.peak_flops_from, args.peak_tflops)
+    timer = StepTimer(
+        device, flops_per_token, peak_flops * world_size if peak_flops else None, sync=args.sync_timing,
+    )
+    # AdamW without decay on norms / biases / embeddings, fused or foreach update.
+    # ZeRO stage >= 1: each rank keeps AdamW state for its partition of the parameters only
+    optimizer_impl = resolve_optimizer_impl(device, args.optimizer_impl)
+    if args.zero_stage >= 1:
+        optimizer = make_zero_optimizer(param_groups(model, args.weight_decay), optim.AdamW,
+                                        lr=args.learning_rate, **optimizer_impl_kwargs(optimizer_impl))
+    else:
+        optimizer = make_optimizer(model, args.learning_rate, args.weight_decay, optimizer_impl)
+    logger.info(f"AdamW: {optimizer_impl}, ZeRO stage: {args.zero_stage}")
+
+    # Gradient compression (allreduce = plain fp32); bytes sent per step go to comm_stats.
+    # --zero-stage 2 replaces the all-reduce with a reduce to each parameter's owner.
+    # FSDP reduce-scatters inside its own units, so no DDP hook (and no comm stats) there.
+    comm_stats = None if fsdp else CommStats()
+    if not fsdp:
+        if args.zero_stage == 2:
+            if args.comm_hook != "allreduce":
+                raise ValueError("--zero-stage 2 has its own gradient reduction; use --comm-hook allreduce")
+            hook_state, hook = (comm_stats, zero_param_owners(optimizer)), zero_reduce_hook
+        else:
+            hook_state, hook = make_comm_hook(
+                args.comm_hook, comm_stats, powersgd_rank=args.powersgd_rank,
+                powersgd_start_iter=args.powersgd_start_iter, powersgd_warm_start=args.powersgd_warm_start,
+                topk_ratio=args.topk_ratio,
+            )
+            logger.info(f"DDP comm hook: {args.comm_hook}")
+        model.register_comm_hook((timer, hook_state), timed_comm_hook(hook))
+    # On-device loss sums, all-reduced once per log interval (global average, one sync)
+    running = RunningMetrics(device)
+
+    # Gradient accumulation (global batch = micro batch x world size x accum steps)
+    grad_accum_steps = resolve_grad_accum_steps(
+        args.batch_size, world_size, args.grad_accum_steps, args.global_batch_size
+    )
+    logger.info(
+        f"Micro-batch {args.batch_size} x {world_size} ranks x {grad_accum_steps} accumulation steps = "
+        f"global batch {args.batch_size * world_size * grad_accum_steps}"
+    )
+
+    # Mixed precision: autocast forward/loss, fp32 master weights, scaler for fp16
+    # FSDP and --zero-stage 2 leave each rank only part of the gradients, so the fp16 overflow
+    # check is all-reduced: otherwise ranks disagree on skipping the (collective) step
+    scaler = make_grad_scaler(device, args.precision, sharded=fsdp or args.zero_stage == 2)
+
+    # Resume (sharded checkpoints reshard to the current world size on load)
+    global_step = 0
+    start_epoch, resume_batches = 0, 0
+    resume_dir = args.resume_from
+    if resume_dir == "latest":
+        resume_dir = latest_checkpoint("checkpoints", pattern=r"^ddp_(step|epoch)_\d+$")
+    if resume_dir:
+        load_start = time.perf_counter()
+        extra = load_sharded_checkpoint(resume_dir, state_model, optimizer)
+        global_step = extra.get("global_step", 0)
+        start_epoch = extra.get("epoch", 0)
+        # Progress is stored in global samples so it maps onto a different world size
+        # or batch size; each rank then skips its share of the epoch's permutation.
+        resume_batches = extra.get("samples_in_epoch", 0) // (world_size * args.batch_size)
+        if resume_batches >= len(dataloader):
+            start_epoch, resume_batches = start_epoch + 1, 0
+        rank_state = load_rank_state(resume_dir)
+        if rank_state is not None:
+            restore_rng_state(rank_state["rng_state"])
+            scaler.load_state_dict(rank_state["scaler_state_dict"])
+        logger.info(f"Resumed from {resume_dir} in {time.perf_counter() - load_start:.2f}s: "
+                    f"epoch {start_epoch}, batch {resume_batches}, step {global_step}")
+
+    # LR schedule over all optimizer steps, positioned at global_step on resume
+    total_steps = args.epochs * math.ceil(len(dataloader) / grad_accum_steps)
+    scheduler = make_lr_scheduler(optimizer, args.lr_schedule, args.warmup_steps, total_steps,
+                                  args.min_lr_ratio, start_step=global_step)
+
+    def save_sharded(ckpt_dir, epoch, batches_in_epoch, interval=1):
+        # Every rank writes ~1/world_size of model + optimizer state in parallel
+        save_start = time.perf_counter()
+        save_sharded_checkpoint(
+            ckpt_dir, state_model, optimizer,
+            extra={
+                "epoch": epoch,
+                "global_step": global_step,
+                "samples_in_epoch": batches_in_epoch * args.batch_size * world_size,
+            },
+            rank_state={"rng_state": capture_rng_state(), "scaler_state_dict": scaler.state_dict()},
+        )
+        logger.info(f"Saved sharded checkpoint: {ckpt_dir} ({time.perf_counter() - save_start:.2f}s)")
+        # Retention: save_sharded_checkpoint returns after the manifest barrier, so every
+        # rank is done with older directories and rank 0 alone deletes them
+        if rank == 0:
+            removed = prune_checkpoints(ckpt_dir, args.keep_last_checkpoints, args.keep_every_checkpoints, interval)
+            if removed:
+                logger.info(f"Pruned {len(removed)} old sharded checkpoints")
+
+    # Rank 0 writes full checkpoints on a background thread
+    checkpointer = AsyncCheckpointer(
+        keep_last=args.keep_last_checkpoints, keep_every=args.keep_every_checkpoints
+    ) if rank == 0 and args.checkpoint_format == "full" else None
+
+    # Metrics are written by rank 0 only, on a background thread
+    sink = make_metrics_sink(args.log_dir, args.metrics_backends) if rank == 0 else None
 
     logger.info("Starting training...")
     
     # Training Loop
-    for epoch in range(args.epochs):
+    clock = StepClock()
+    step_tokens = 0
+    optimizer.zero_grad(set_to_none=True)
+    for epoch in range(start_epoch, args.epochs):
         # IMPORTANT: Set epoch for sampler shuffling
         sampler.set_epoch(epoch)
+        skip_batches = resume_batches if epoch == start_epoch else 0
+        sampler.skip(skip_batches * args.batch_size)
+        num_batches = skip_batches + len(dataloader)
         
-        for step, batch in enumerate(dataloader):
+        for micro_step, batch in enumerate(timer.iter_data(dataloader), start=skip_batches):
+            is_boundary, window_size = accumulation_window(micro_step, num_batches, grad_accum_steps)
             input_ids = batch["input_ids"].to(device)
             labels = batch["labels"].to(device)
+            step_tokens += input_ids.numel()
             
-            optimizer.zero_grad()
-            logits, loss = model(input_ids, labels=labels)
-            
-            loss.backward()
+            # no_sync(): skip the gradient all-reduce on non-boundary micro-steps,
+            # grads accumulate locally and are reduced once on the boundary backward
+            sync_context = contextlib.nullcontext() if is_boundary else model.no_sync()
+            with sync_context:
+                with timer.phase("forward"), autocast_context(device, args.precision):
+                    logits, loss = model(input_ids, labels=labels)
+                with timer.phase("backward"):
+                    scaler.scale(loss / window_size).backward()
+            running.update(loss, input_ids.numel())
+            if not is_boundary:
+                continue
             
             # Gradients are synchronized here automatically by DDP
-            optimizer.step()
+            with timer.phase("optimizer"):
+                scaler.step(optimizer)
+                scaler.update()
+                scheduler.step()
+                # set_to_none: the next backward writes fresh grads instead of a memset + add
+                optimizer.zero_grad(set_to_none=True)
+            clock.tick()
+            timer.end_step(step_tokens * world_size)
+            step_tokens = 0
+            if clock.steps == 1:
+                # Optimizer state exists after the first step (collective: every rank is here)
+                replicas = shard_replicas(args.sharding_strategy, world_size,
+                                          int(os.environ.get("LOCAL_WORLD_SIZE", world_size))) if fsdp else None
+                memory = optimizer_memory_report(optimizer, replicas)
+                logger.info(f"Optimizer state: {memory['memory/optimizer_state_mb']:.2f} MB on this rank, "
+                            f"{memory['memory/optimizer_state_replicated_mb']:.2f} MB replicated "
+                            f"({memory['memory/optimizer_state_saved'] * 100:.0f}% saved)")
+                if rank == 0:
+                    sink.log(global_step, memory)
+            
+            if global_step % args.log_interval == 0:
+                metrics = {**running.compute(), **timer.summary(), **(comm_stats.summary() if comm_stats else {}),
+                           "train/lr": scheduler.get_last_lr()[0]}
+                logger.info(f"Epoch {epoch} | Step {global_step} | Loss: {metrics['train/loss']:.4f} | "
+                            f"{format_metrics(metrics)}")
+                if rank == 0:
+                    sink.log(global_step, metrics)
+            global_step += 1
             
-            if step % 10 == 0:
-                logger.info(f"Epoch {epoch} | Step {step} | Loss: {loss.item():.4f}")
+            if args.save_every_steps and global_step % args.save_every_steps == 0:
+                save_sharded(f"checkpoints/ddp_step_{global_step:08d}", epoch, micro_step + 1,
+                             interval=args.save_every_steps)
 
         # Dist Barrier
         dist.barrier()
         
-        # Checkpointing (Rank 0 only)
-        if rank == 0:
+        if args.checkpoint_format == "sharded":
+            save_sharded(f"checkpoints/ddp_epoch_{epoch}", epoch, num_batches)
+        # Checkpointing (Rank 0 only). Other ranks no longer wait for the
+        # write: rank 0 only blocks for the CPU snapshot.
+        elif rank == 0:
             ckpt_path = f"checkpoints/ddp_epoch_{epoch}.pt"
-            os.makedirs("checkpoints", exist_ok=True)
-            torch.save(model.module.state_dict(), ckpt_path)
-            logger.info(f"Saved checkpoint: {ckpt_path}")
+            checkpointer.save(model.module.state_dict(), ckpt_path)
+            logger.info(f"Queued checkpoint: {ckpt_path}")
             
+    if checkpointer is not None:
+        checkpointer.close()
+    logger.info(f"Step timing: {clock.summary()}")
+    if rank == 0:
+        sink.close()
     dist.destroy_process_group()
     logger.info("Process group destroyed. Exiting.")
 
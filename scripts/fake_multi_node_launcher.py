@@ -1,80 +1,198 @@
 import os
 import sys
 import time
+import signal
 import argparse
 import socket
+import subprocess
 
-def simulate_barrier(name):
-    print(f"[{name}] Entering barrier...")
-    time.sleep(1) # Simulate network sync delay
-    print(f"[{name}] Exited barrier.")
+# -----------------------------------------------------------------------------
+# Local Multi-Node Launcher
+# -----------------------------------------------------------------------------
+# Spawns NODE_COUNT x NPROC_PER_NODE worker processes on this machine, each with
+# the env a real launcher (torchrun / srun) would give it, so multi-node
+# topologies can be exercised without SLURM:
+#
+#   python scripts/fake_multi_node_launcher.py --nnodes 2 --nproc-per-node 4
+#       (no script: built-in gloo self-check of rank mapping + collectives)
+#   python scripts/fake_multi_node_launcher.py --nnodes 4 --nproc-per-node 4 \
+#       scripts/ddp_simulation_train.py --epochs 1
+#
+# If any rank fails, the rest of the job is terminated (like torchrun). With
+# --max-restarts N the whole group is relaunched up to N times; training
+# scripts resume via their own checkpoints (e.g. --resume-from latest).
 
-def main():
-    parser = argparse.ArgumentParser(description="Fake Multi-Node Launcher Simulation")
-    # We can accept args or read env vars. Docs emphasize env vars.
-    parser.parse_args()
-
-    print("--- FAKE MULTI-NODE LAUNCHER SIMULATION ---")
-    
-    # 1. Read Environment Variables
-    # These are typically set by SLURM or a launcher script (like torchrun)
-    node_rank = int(os.environ.get("NODE_RANK", "0"))
-    local_rank = int(os.environ.get("LOCAL_RANK", "0"))
-    world_size_nodes = int(os.environ.get("WORLD_SIZE_NODES", "1")) # Number of nodes
-    nproc_per_node = int(os.environ.get("NPROC_PER_NODE", "4")) # GPUs per node
-    
-    master_addr = os.environ.get("MASTER_ADDR", "localhost")
-    master_port = os.environ.get("MASTER_PORT", "12355")
-
-    # 2. Calculate Global Rank (The Mapping Logic)
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("", 0))
+        return s.getsockname()[1]
+
+def worker_env(node_rank, local_rank, nnodes, nproc_per_node, master_addr, master_port, restart_count):
     # global_rank = (node_rank * nproc_per_node) + local_rank
-    # total_world_size = world_size_nodes * nproc_per_node
-    
-    global_rank = (node_rank * nproc_per_node) + local_rank
-    total_world_size = world_size_nodes * nproc_per_node
-    
-    # In a real scenario, WORLD_SIZE is usually the total world size already.
-    # But for this simulation, we are deriving it to show understanding.
-    
-    identity = f"Node {node_rank} | Local Rank {local_rank}"
-
-    print(f"\n[Environment Configuration]")
-    print(f"MASTER_ADDR: {master_addr}")
-    print(f"MASTER_PORT: {master_port}")
-    print(f"Nodes: {world_size_nodes}")
-    print(f"Procs per Node: {nproc_per_node}")
-    
-    print(f"\n[Identity Reading]")
-    print(f"NODE_RANK  : {node_rank}")
-    print(f"LOCAL_RANK : {local_rank}")
-    
-    print(f"\n[Calculated Global State]")
-    print(f"GLOBAL_RANK: {global_rank}")
-    print(f"WORLD_SIZE : {total_world_size}")
-    
-    print(f"\n[{identity}] Initializing Fake Process Group...")
-    time.sleep(0.5)
-    print(f"[{identity}] Connected to {master_addr}:{master_port}")
-    
-    # 3. Simulate Distributed Barrier
-    print(f"\n[{identity}] Simulating Distributed Barrier...")
-    simulate_barrier(identity)
-    
-    # 4. SLURM Concept Explanation
-    print(f"\n[{identity}] SLURM Context (Concept):")
-    print(f"  If running under SLURM:")
-    print(f"  SLURM_PROCID would be: {global_rank}")
-    print(f"  SLURM_LOCALID would be: {local_rank}")
-    print(f"  SLURM_NODEID  would be: {node_rank}")
-    
-    # 5. Simulate Training Step
-    print(f"\n[{identity}] Starting Fake Training Step 1...")
-    time.sleep(0.5)
-    print(f"[{identity}] Forward pass complete.")
-    print(f"[{identity}] Backward pass (Gradient All-Reduce) complete.")
-    print(f"[{identity}] Optimizer step complete.")
-    
-    print(f"\n[{identity}] Simulation Complete. Exiting.")
+    env = dict(os.environ)
+    env.update({
+        "RANK": str(node_rank * nproc_per_node + local_rank),
+        "LOCAL_RANK": str(local_rank),
+        "NODE_RANK": str(node_rank),
+        "GROUP_RANK": str(node_rank),
+        "WORLD_SIZE": str(nnodes * nproc_per_node),
+        "LOCAL_WORLD_SIZE": str(nproc_per_node),
+        "WORLD_SIZE_NODES": str(nnodes),
+        "NPROC_PER_NODE": str(nproc_per_node),
+        "MASTER_ADDR": master_addr,
+        "MASTER_PORT": str(master_port),
+        "TORCHELASTIC_RESTART_COUNT": str(restart_count),
+    })
+    # Many ranks share one box: avoid nnodes * nproc * cores intra-op threads (torchrun does the same)
+    env.setdefault("OMP_NUM_THREADS", "1")
+    return env
+
+def terminate(procs, timeout=10.0):
+    for p in procs:
+        if p.poll() is None:
+            p.send_signal(signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    for p in procs:
+        try:
+            p.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
+
+def run_group(cmd, args, restart_count):
+    """Launches one attempt. Returns 0 if every rank succeeded, else the first failure's exit code."""
+    master_port = args.master_port or find_free_port()
+    world_size = args.nnodes * args.nproc_per_node
+    print(f"[Launcher] Attempt {restart_count}: {args.nnodes} nodes x {args.nproc_per_node} procs = "
+          f"{world_size} ranks, master {args.master_addr}:{master_port}", flush=True)
+
+    procs = []
+    for node_rank in range(args.nnodes):
+        for local_rank in range(args.nproc_per_node):
+            env = worker_env(node_rank, local_rank, args.nnodes, args.nproc_per_node,
+                             args.master_addr, master_port, restart_count)
+            procs.append(subprocess.Popen(cmd, env=env))
+
+    try:
+        while True:
+            codes = [p.poll() for p in procs]
+            failed = [(rank, code) for rank, code in enumerate(codes) if code not in (None, 0)]
+            if failed:
+                rank, code = failed[0]
+                print(f"[Launcher] Rank {rank} exited with code {code}; terminating the other ranks", flush=True)
+                terminate(procs)
+                return code
+            if all(code == 0 for code in codes):
+                return 0
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        terminate(procs)
+        raise
+
+# -----------------------------------------------------------------------------
+# Built-in Worker: gloo self-check
+# -----------------------------------------------------------------------------
+def self_check_worker(fail_rank=None):
+    import torch
+    import torch.distributed as dist
+
+    # 1. Identity, as set by the launcher (or SLURM / torchrun)
+    rank = int(os.environ["RANK"])
+    local_rank = int(os.environ["LOCAL_RANK"])
+    node_rank = int(os.environ["NODE_RANK"])
+    world_size = int(os.environ["WORLD_SIZE"])
+    nproc_per_node = int(os.environ["LOCAL_WORLD_SIZE"])
+    nnodes = world_size // nproc_per_node
+    restart_count = int(os.environ.get("TORCHELASTIC_RESTART_COUNT", "0"))
+    identity = f"Node {node_rank} | Local Rank {local_rank} | Global Rank {rank}"
+    assert rank == node_rank * nproc_per_node + local_rank, "rank mapping mismatch"
+
+    # 2. Real rendezvous through MASTER_ADDR:MASTER_PORT
+    dist.init_process_group(backend="gloo", init_method="env://")
+    print(f"[{identity}] Connected to {os.environ['MASTER_ADDR']}:{os.environ['MASTER_PORT']} "
+          f"(world size {world_size}; SLURM_PROCID={rank} SLURM_NODEID={node_rank} SLURM_LOCALID={local_rank})",
+          flush=True)
+
+    if fail_rank == rank and restart_count == 0:
+        raise RuntimeError(f"[{identity}] Simulated failure (first attempt only)")
+
+    # 3. Barrier, then collectives over the world, each node, and each local-rank "rail"
+    dist.barrier()
+    t = torch.tensor([float(rank)])
+    dist.all_reduce(t)
+    assert t.item() == world_size * (world_size - 1) / 2, f"world all_reduce got {t.item()}"
+
+    # new_group is collective: every rank creates every group, in the same order
+    node_groups = [dist.new_group(list(range(n * nproc_per_node, (n + 1) * nproc_per_node)))
+                   for n in range(nnodes)]
+    rail_groups = [dist.new_group(list(range(l, world_size, nproc_per_node)))
+                   for l in range(nproc_per_node)]
+
+    t = torch.tensor([1.0])
+    dist.all_reduce(t, group=node_groups[node_rank])  # intra-node (NVLink on a real node)
+    assert t.item() == nproc_per_node, f"intra-node all_reduce got {t.item()}"
+    t = torch.tensor([1.0])
+    dist.all_reduce(t, group=rail_groups[local_rank])  # inter-node, same local rank
+    assert t.item() == nnodes, f"inter-node all_reduce got {t.item()}"
+
+    gathered = [torch.zeros(1) for _ in range(world_size)]
+    dist.all_gather(gathered, torch.tensor([float(rank)]))
+    assert [int(g.item()) for g in gathered] == list(range(world_size)), "all_gather order mismatch"
+
+    dist.barrier()
+    if rank == 0:
+        print(f"[Launcher] Self-check passed: {nnodes} nodes x {nproc_per_node} procs "
+              f"(barrier, world / intra-node / inter-node all_reduce, all_gather)", flush=True)
+    dist.destroy_process_group()
+
+# -----------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Local multi-node launcher (one box, many ranks)")
+    # Defaults from env so the old WORLD_SIZE_NODES / NPROC_PER_NODE exports keep working
+    parser.add_argument("--nnodes", type=int,
+                        default=int(os.environ.get("NODE_COUNT", os.environ.get("WORLD_SIZE_NODES", "2"))))
+    parser.add_argument("--nproc-per-node", type=int, default=int(os.environ.get("NPROC_PER_NODE", "4")))
+    parser.add_argument("--master-addr", type=str, default=os.environ.get("MASTER_ADDR", "127.0.0.1"))
+    parser.add_argument("--master-port", type=int, default=None,
+                        help="Rendezvous port (default: a free port, picked per attempt)")
+    parser.add_argument("--max-restarts", type=int, default=0,
+                        help="Relaunch the whole group up to N times after a failure")
+    parser.add_argument("--fail-rank", type=int, default=None,
+                        help="Self-check only: make this rank fail on the first attempt")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("script", nargs="?", default=None,
+                        help="Training script to run on every rank (default: built-in gloo self-check)")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    if args.worker:
+        self_check_worker(args.fail_rank)
+        return 0
+
+    if args.script:
+        cmd = [sys.executable, args.script, *args.script_args]
+    else:
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker"]
+        if args.fail_rank is not None:
+            cmd += ["--fail-rank", str(args.fail_rank)]
+
+    # Treat a SIGTERM to the launcher (scancel, CI timeout) like Ctrl-C: take the workers down too
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    for attempt in range(args.max_restarts + 1):
+        try:
+            code = run_group(cmd, args, attempt)
+        except KeyboardInterrupt:
+            print("[Launcher] Interrupted, workers terminated", flush=True)
+            return 130
+        if code == 0:
+            print(f"[Launcher] All {args.nnodes * args.nproc_per_node} ranks finished successfully.", flush=True)
+            return 0
+        if attempt < args.max_restarts:
+            print(f"[Launcher] Restarting ({attempt + 1}/{args.max_restarts})", flush=True)
+    print(f"[Launcher] Job failed after {args.max_restarts + 1} attempt(s)", flush=True)
+    return code
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import os
+import functools
+import torch.distributed as dist
+from torch.distributed.fsdp import (
+    FullyShardedDataParallel as FSDP, ShardingStrategy, BackwardPrefetch, CPUOffload,
+)
+from torch.distributed.fsdp.wrap import lambda_auto_wrap_policy
+
+# -----------------------------------------------------------------------------
+# FSDP Wrapping
+# -----------------------------------------------------------------------------
+# Each transformer block becomes its own FSDP unit: its parameters are
+# all-gathered just before the block runs and freed right after, so a rank
+# only ever holds one full block plus its shard of everything else.
+# Whatever is not inside a wrapped block (embeddings, final head) lives in
+# the root unit.
+
+SHARDING_STRATEGIES = {
+    "full": ShardingStrategy.FULL_SHARD,        # params, grads and optimizer state sharded (ZeRO-3)
+    "grad-op": ShardingStrategy.SHARD_GRAD_OP,  # params kept gathered between forward and backward (ZeRO-2)
+    "hybrid": ShardingStrategy.HYBRID_SHARD,    # FULL_SHARD inside a node, replicated across nodes
+    "no-shard": ShardingStrategy.NO_SHARD,      # DDP-equivalent, for comparison
+}
+BACKWARD_PREFETCH = {
+    "pre": BackwardPrefetch.BACKWARD_PRE,    # gather the next block before this block's grads (more memory, more overlap)
+    "post": BackwardPrefetch.BACKWARD_POST,
+    "none": None,
+}
+
+def shared_parameter_names(model):
+    """Groups of parameter names that are the same tensor, e.g. a tied LM head."""
+    by_param = {}
+    for name, param in model.named_parameters(remove_duplicate=False):
+        by_param.setdefault(param, []).append(name)
+    return [names for names in by_param.values() if len(names) > 1]
+
+def block_wrap_policy(model, block_cls):
+    """
+    Wrap every `block_cls` instance, except one holding a parameter that is
+    also used outside it: a tied weight must sit in a single FSDP unit, so such
+    a block (and the other user) stays in the enclosing unit. For TinyTransformer
+    that keeps head.weight / embeddings.weight together in the root unit.
+    """
+    tied = [set(names) for names in shared_parameter_names(model)]
+    wrap = set()
+    for prefix, module in model.named_modules():
+        if not isinstance(module, block_cls):
+            continue
+        inside = {f"{prefix}.{name}" for name, _ in module.named_parameters(remove_duplicate=False)}
+        if not any(group & inside and group - inside for group in tied):
+            wrap.add(module)
+    return functools.partial(lambda_auto_wrap_policy, lambda_fn=lambda m: m in wrap)
+
+def node_process_groups(local_world_size):
+    """
+    (intra-node, inter-node) groups for HYBRID_SHARD. FSDP's own default
+    derives them from the CUDA device count, which is 0 on CPU, so build them
+    from LOCAL_WORLD_SIZE. Collective: every rank creates every group.
+    """
+    world_size, rank = dist.get_world_size(), dist.get_rank()
+    if world_size % local_world_size:
+        raise ValueError(f"world size {world_size} is not a multiple of {local_world_size} ranks per node")
+    intra = inter = None
+    for node in range(world_size // local_world_size):
+        ranks = list(range(node * local_world_size, (node + 1) * local_world_size))
+        group = dist.new_group(ranks)
+        if rank in ranks:
+            intra = group
+    for local_rank in range(local_world_size):
+        ranks = list(range(local_rank, world_size, local_world_size))
+        group = dist.new_group(ranks)
+        if rank in ranks:
+            inter = group
+    return intra, inter
+
+def wrap_fsdp(model, block_cls, sharding="full", cpu_offload=False, backward_prefetch="pre",
+              forward_prefetch=False, device=None):
+    """
+    Wraps `model` with one FSDP unit per `block_cls` plus the root.
+    use_orig_params keeps the original parameter names and objects, so the
+    optimizer, tied weights and checkpoints see the model as written.
+    """
+    process_group = None
+    if sharding == "hybrid":
+        process_group = node_process_groups(int(os.environ.get("LOCAL_WORLD_SIZE", dist.get_world_size())))
+    return FSDP(
+        model,
+        process_group=process_group,
+        sharding_strategy=SHARDING_STRATEGIES[sharding],
+        auto_wrap_policy=block_wrap_policy(model, block_cls),
+        cpu_offload=CPUOffload(offload_params=cpu_offload),
+        backward_prefetch=BACKWARD_PREFETCH[backward_prefetch],
+        forward_prefetch=forward_prefetch,
+        device_id=device if device is not None and device.type == "cuda" else None,
+        use_orig_params=True,
+    )
+
+def shard_replicas(sharding, world_size, local_world_size):
+    """How many full copies of the sharded state exist across all ranks."""
+    if sharding == "no-shard":
+        return world_size
+    if sharding == "hybrid":
+        return world_size // local_world_size
+    return 1
+
+def local_parameter_bytes(model):
+    # With use_orig_params, parameters outside this rank's shard have numel 0
+    return sum(p.numel() * p.element_size() for p in model.parameters())
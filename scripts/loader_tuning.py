@@ -0,0 +1,187 @@
+import os
+import time
+import logging
+import itertools
+import statistics
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from token_dataset import collate_batch
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# DataLoader Throughput
+# -----------------------------------------------------------------------------
+# A loader is "fast enough" when it produces samples at least as fast as the
+# training step consumes them. More workers than that only cost CPU cores
+# (on MN5: 20 per GPU) and host memory (prefetch_factor * num_workers batches).
+
+def loader_kwargs(num_workers, prefetch_factor=2, pin_memory=False, persistent_workers=False):
+    """DataLoader keyword arguments; worker-only options are dropped for num_workers=0."""
+    kwargs = {"num_workers": num_workers, "pin_memory": pin_memory}
+    if num_workers > 0:
+        kwargs["prefetch_factor"] = prefetch_factor
+        kwargs["persistent_workers"] = persistent_workers
+    return kwargs
+
+def benchmark_loader(dataset, batch_size, num_batches=50, warmup_batches=5, epochs=2,
+                     collate_fn=None, **kwargs):
+    """
+    Iterates `epochs` passes of up to `num_batches` batches through a
+    DataLoader built with `kwargs` (see loader_kwargs) and reports:
+
+    - samples_per_sec: steady-state rate, after the first warmup_batches
+    - batch_p50_ms / batch_p90_ms: wait per next() call
+    - startup_seconds: iterator creation + first batch, averaged over epochs
+      (the cost persistent_workers avoids from the second epoch on)
+    """
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, collate_fn=collate_fn or collate_batch,
+                        drop_last=True, **kwargs)
+    waits, startups, samples, steady_seconds = [], [], 0, 0.0
+    for _ in range(epochs):
+        start = time.perf_counter()
+        iterator = iter(loader)
+        for i, batch in enumerate(itertools.islice(iterator, num_batches)):
+            now = time.perf_counter()
+            if i == 0:
+                startups.append(now - start)
+            elif i >= warmup_batches:
+                waits.append(now - start)
+                steady_seconds += now - start
+                samples += batch_size
+            start = now
+        del iterator
+    if not waits:
+        raise ValueError(f"dataset too small: need more than {warmup_batches} batches of {batch_size}")
+
+    waits.sort()
+    return {
+        **kwargs,
+        "samples_per_sec": samples / steady_seconds,
+        "batch_p50_ms": statistics.median(waits) * 1000,
+        "batch_p90_ms": waits[int(0.9 * (len(waits) - 1))] * 1000,
+        "startup_seconds": statistics.fmean(startups),
+    }
+
+def default_max_workers():
+    """CPU cores available to this rank (LOCAL_WORLD_SIZE ranks share the node)."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS
+        cores = os.cpu_count() or 1
+    # One core stays with the training process itself
+    return max(0, cores // int(os.environ.get("LOCAL_WORLD_SIZE", "1")) - 1)
+
+def auto_tune_loader(dataset, batch_size, target_samples_per_sec=None, max_workers=None,
+                     prefetch_factors=(2, 4), pin_memory=None, collate_fn=None, num_batches=50,
+                     headroom=1.1):
+    """
+    Picks the cheapest DataLoader settings that keep up with training.
+
+    Candidates are tried from cheapest up (0, 1, 2, 4, ... workers; smallest
+    prefetch_factor first) and the first one reaching
+    target_samples_per_sec * headroom wins. Without a target, the first
+    reaching 95% of the fastest candidate wins. Returns (kwargs for
+    DataLoader, list of all measurements).
+
+    Runs under torch.random.fork_rng, so tuning (workers=0 calls
+    __getitem__ in-process) leaves the training RNG stream untouched.
+    """
+    if max_workers is None:
+        max_workers = default_max_workers()
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+    worker_counts = [0] + [2 ** i for i in range(max_workers.bit_length()) if 2 ** i <= max_workers]
+    if max_workers not in worker_counts:
+        worker_counts.append(max_workers)
+
+    results = []
+    with torch.random.fork_rng(devices=[]):
+        for num_workers in worker_counts:
+            for prefetch_factor in (prefetch_factors if num_workers > 0 else prefetch_factors[:1]):
+                kwargs = loader_kwargs(num_workers, prefetch_factor, pin_memory, persistent_workers=num_workers > 0)
+                result = benchmark_loader(dataset, batch_size, num_batches=num_batches, epochs=1,
+                                          collate_fn=collate_fn, **kwargs)
+                results.append(result)
+                logger.info(f"Loader workers={num_workers} prefetch={kwargs.get('prefetch_factor', '-')}: "
+                            f"{result['samples_per_sec']:.0f} samples/s, p90 {result['batch_p90_ms']:.2f} ms")
+                # Cheapest-first: stop as soon as an explicit target is met
+                if target_samples_per_sec and result["samples_per_sec"] >= target_samples_per_sec * headroom:
+                    return _pick(result), results
+
+    if target_samples_per_sec:
+        best = max(results, key=lambda r: r["samples_per_sec"])
+        logger.warning(f"No loader setting reaches {target_samples_per_sec:.0f} samples/s; "
+                       f"using the fastest ({best['samples_per_sec']:.0f} samples/s)")
+        return _pick(best), results
+    fastest = max(r["samples_per_sec"] for r in results)
+    chosen = next(r for r in results if r["samples_per_sec"] >= 0.95 * fastest)
+    return _pick(chosen), results
+
+def _pick(result):
+    return {k: result[k] for k in ("num_workers", "pin_memory", "prefetch_factor", "persistent_workers")
+            if k in result}
+
+class PerItemDataset(Dataset):
+    """Hides a dataset's __getitems__, to measure what batched fetching saves."""
+    __getitems__ = None
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        return self.dataset[idx]
+
+# -----------------------------------------------------------------------------
+# CLI: full grid over one of the training datasets
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    import json
+    import argparse
+    from token_dataset import TokenBinDataset
+
+    parser = argparse.ArgumentParser(description="DataLoader throughput grid and auto-tune")
+    parser.add_argument("--data-path", type=str, default=None, help="Token file prefix (default: synthetic data)")
+    parser.add_argument("--seq-len", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--num-batches", type=int, default=50)
+    parser.add_argument("--workers", type=str, default="0,1,2,4,8")
+    parser.add_argument("--prefetch-factors", type=str, default="2,4")
+    parser.add_argument("--target-samples-per-sec", type=float, default=None)
+    parser.add_argument("--fetch", type=str, choices=["batched", "per-item"], default="batched",
+                        help="per-item: ignore the dataset's __getitems__ (one __getitem__ per sample)")
+    parser.add_argument("--out", type=str, default=None, help="Write the grid as JSON")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.data_path:
+        dataset = TokenBinDataset(args.data_path, seq_len=args.seq_len)
+    else:
+        from train_tiny_transformer import SyntheticTextDataset
+        dataset = SyntheticTextDataset(vocab_size=1000, seq_len=args.seq_len, num_samples=args.batch_size * 200)
+    if args.fetch == "per-item":
+        dataset = PerItemDataset(dataset)
+
+    pin_options = [False, True] if torch.cuda.is_available() else [False]
+    grid = []
+    for num_workers in (int(w) for w in args.workers.split(",")):
+        prefetch = [int(p) for p in args.prefetch_factors.split(",")] if num_workers > 0 else [2]
+        persistent = [False, True] if num_workers > 0 else [False]
+        for prefetch_factor, pin_memory, persistent_workers in itertools.product(prefetch, pin_options, persistent):
+            r = benchmark_loader(dataset, args.batch_size, num_batches=args.num_batches,
+                                 **loader_kwargs(num_workers, prefetch_factor, pin_memory, persistent_workers))
+            grid.append(r)
+            print(f"workers={num_workers:>2} prefetch={r.get('prefetch_factor', '-'):>2} pin={pin_memory!s:>5} "
+                  f"persistent={r.get('persistent_workers', False)!s:>5} | {r['samples_per_sec']:10.0f} samples/s | "
+                  f"p50 {r['batch_p50_ms']:.2f} ms p90 {r['batch_p90_ms']:.2f} ms | startup {r['startup_seconds']:.3f} s")
+
+    chosen, _ = auto_tune_loader(dataset, args.batch_size, args.target_samples_per_sec,
+                                 num_batches=args.num_batches)
+    print(f"\nauto_tune_loader -> {chosen}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"grid": grid, "auto_tune": chosen}, f, indent=4)
@@ -0,0 +1,145 @@
+import os
+import csv
+import json
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Backends (only ever called from the sink's writer thread)
+# -----------------------------------------------------------------------------
+class TensorBoardBackend:
+    def __init__(self, log_dir):
+        # Optional dependency: only needed when this backend is selected
+        from torch.utils.tensorboard import SummaryWriter
+        self.writer = SummaryWriter(log_dir=log_dir)
+
+    def write(self, step, wall_time, metrics):
+        for name, value in metrics.items():
+            self.writer.add_scalar(name, value, step, walltime=wall_time)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+class JsonlBackend:
+    """One JSON object per record: {"step", "time", <metric>: value, ...}."""
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "a")
+
+    def write(self, step, wall_time, metrics):
+        self.file.write(json.dumps({"step": step, "time": wall_time, **metrics}) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class CsvBackend:
+    """Long format (step, time, name, value), so new metric names never change the header."""
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        self.writer = csv.writer(self.file)
+        if is_new:
+            self.writer.writerow(["step", "time", "name", "value"])
+
+    def write(self, step, wall_time, metrics):
+        for name, value in metrics.items():
+            self.writer.writerow([step, wall_time, name, value])
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+METRICS_BACKENDS = ("tensorboard", "jsonl", "csv")
+
+def make_backend(name, log_dir):
+    if name == "tensorboard":
+        return TensorBoardBackend(log_dir)
+    if name == "jsonl":
+        return JsonlBackend(os.path.join(log_dir, "metrics.jsonl"))
+    if name == "csv":
+        return CsvBackend(os.path.join(log_dir, "metrics.csv"))
+    raise ValueError(f"Unknown metrics backend '{name}', expected one of {METRICS_BACKENDS}")
+
+# -----------------------------------------------------------------------------
+# Asynchronous Sink
+# -----------------------------------------------------------------------------
+_STOP = object()
+
+class MetricsSink:
+    """
+    Fans metric records out to backends on a background thread.
+
+    log() never blocks the training loop: records go into a bounded queue and,
+    if the writer thread has fallen behind and the queue is full, the record is
+    dropped and counted instead. Backends are flushed every flush_interval
+    seconds and once more on close(), which drains everything still queued.
+    """
+    def __init__(self, backends, max_queue=1024, flush_interval=5.0):
+        self.backends = list(backends)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="metrics-sink", daemon=True)
+        self._thread.start()
+
+    def log(self, step, metrics):
+        try:
+            self._queue.put_nowait((step, time.time(), dict(metrics)))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                for backend in self.backends:
+                    try:
+                        backend.write(*item)
+                    except Exception as e:
+                        logger.warning(f"[Metrics] {type(backend).__name__} write failed: {e}")
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+    def _flush(self):
+        for backend in self.backends:
+            try:
+                backend.flush()
+            except Exception as e:
+                logger.warning(f"[Metrics] {type(backend).__name__} flush failed: {e}")
+
+    def close(self):
+        # The stop marker queues behind pending records, so they are all written first
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._flush()
+        for backend in self.backends:
+            backend.close()
+        if self.dropped:
+            logger.warning(f"[Metrics] Dropped {self.dropped} records (queue full)")
+
+def make_metrics_sink(log_dir, backends=("tensorboard", "jsonl"), max_queue=1024):
+    """backends: names from METRICS_BACKENDS (or a comma-separated string)."""
+    if isinstance(backends, str):
+        backends = [name.strip() for name in backends.split(",") if name.strip()]
+    os.makedirs(log_dir, exist_ok=True)
+    return MetricsSink([make_backend(name, log_dir) for name in backends], max_queue=max_queue)
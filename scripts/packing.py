@@ -0,0 +1,103 @@
+import numpy as np
+import torch
+
+from token_dataset import TokenBinDataset
+
+# -----------------------------------------------------------------------------
+# Document-Aware Datasets over a Pre-tokenized Corpus
+# -----------------------------------------------------------------------------
+# Both datasets return variable metadata per sample:
+#   input_ids    (L,) token ids
+#   position_ids (L,) position inside the owning document (restarts at 0)
+#   segment_ids  (L,) document index inside the row, -1 for padding
+# collate_documents() turns those into the batch TinyTransformer.forward
+# expects, including a block-diagonal causal attention mask.
+
+class PackedTokenDataset(TokenBinDataset):
+    """
+    Packed rows: documents are concatenated back-to-back and cut into full
+    seq_len rows (no padding). Attention never crosses a document boundary;
+    a document split across two rows continues at position 0 in the next row.
+    """
+    # Per-row document metadata: fetched per item, collated by collate_documents
+    __getitems__ = None
+
+    def __getitem__(self, idx):
+        start = idx * self.seq_len
+        end = start + self.seq_len
+        offsets = self.doc_offsets
+        # Documents overlapping [start, end): first..last (inclusive)
+        first = int(np.searchsorted(offsets, start, side="right")) - 1
+        last = int(np.searchsorted(offsets, end - 1, side="right")) - 1
+        bounds = np.asarray(offsets[first:last + 1])
+
+        pos = np.arange(start, end)
+        segment = np.searchsorted(bounds, pos, side="right") - 1
+        seg_start = np.maximum(bounds[segment], start)
+
+        return {
+            "input_ids": torch.from_numpy(self.tokens[start:end].astype(np.int64)),
+            "position_ids": torch.from_numpy(pos - seg_start),
+            "segment_ids": torch.from_numpy(segment),
+        }
+
+class DocumentDataset(TokenBinDataset):
+    """
+    One document per sample, truncated to seq_len (padded later by the collator).
+    This is the unpacked baseline used to measure what packing saves.
+    """
+    __getitems__ = None
+
+    def __init__(self, path, seq_len):
+        super().__init__(path, seq_len)
+        self.num_samples = self.meta["num_docs"]
+
+    def __getitem__(self, idx):
+        start = int(self.doc_offsets[idx])
+        end = min(int(self.doc_offsets[idx + 1]), start + self.seq_len)
+        n = end - start
+        return {
+            "input_ids": torch.from_numpy(self.tokens[start:end].astype(np.int64)),
+            "position_ids": torch.arange(n),
+            "segment_ids": torch.zeros(n, dtype=torch.long),
+        }
+
+# -----------------------------------------------------------------------------
+# Collator
+# -----------------------------------------------------------------------------
+def document_attention_mask(segment_ids):
+    """
+    (B, T) segment ids -> (B, 1, T, T) boolean mask, True = may attend.
+    Causal within a segment, blocked across segments. Padding (-1) forms its
+    own segment so no query row is fully masked (keeps softmax finite).
+    """
+    T = segment_ids.shape[1]
+    same_doc = segment_ids.unsqueeze(2) == segment_ids.unsqueeze(1)
+    causal = torch.ones(T, T, dtype=torch.bool, device=segment_ids.device).tril()
+    return (same_doc & causal).unsqueeze(1)
+
+def collate_documents(batch, seq_len=None, pad_id=0):
+    T = seq_len or max(len(sample["input_ids"]) for sample in batch)
+    B = len(batch)
+    input_ids = torch.full((B, T), pad_id, dtype=torch.long)
+    position_ids = torch.zeros((B, T), dtype=torch.long)
+    segment_ids = torch.full((B, T), -1, dtype=torch.long)
+    for i, sample in enumerate(batch):
+        n = len(sample["input_ids"])
+        input_ids[i, :n] = sample["input_ids"]
+        position_ids[i, :n] = sample["position_ids"]
+        segment_ids[i, :n] = sample["segment_ids"]
+
+    # No loss on padding, nor on the first token of a document (its
+    # "previous token" belongs to another document)
+    labels = input_ids.clone()
+    labels[(segment_ids < 0) | (position_ids == 0)] = -100
+
+    return {
+        "input_ids": input_ids,
+        "labels": labels,
+        "position_ids": position_ids,
+        "attention_mask": document_attention_mask(segment_ids),
+        # Useful (non-pad) tokens, for padding-aware throughput
+        "num_tokens": torch.tensor(int((segment_ids >= 0).sum())),
+    }
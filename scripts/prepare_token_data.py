@@ -0,0 +1,90 @@
+import os
+import json
+import argparse
+import logging
+
+from token_dataset import TokenBinWriter
+
+# -----------------------------------------------------------------------------
+# Offline Tokenization: text / jsonl -> <prefix>.bin + sidecars
+# -----------------------------------------------------------------------------
+# Tokenize ONCE here, then train from the memory-mapped output with
+# `--data-path <prefix>` (see docs/09-data-pipeline.md).
+#
+#   python scripts/prepare_token_data.py data/raw/*.jsonl --out data/tokens/train
+#   python scripts/prepare_token_data.py corpus.txt --out data/tokens/train --tokenizer gpt2
+logging.basicConfig(
+    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+    datefmt="%m/%d/%Y %H:%M:%S",
+    level=logging.INFO,
+)
+logger = logging.getLogger(__name__)
+
+class ByteTokenizer:
+    """UTF-8 bytes as token ids (0-255) plus EOS=256. Fits the tiny config's vocab."""
+    name = "byte"
+    vocab_size = 257
+    eos_id = 256
+
+    def encode(self, text):
+        return list(text.encode("utf-8"))
+
+class HFTokenizer:
+    def __init__(self, name):
+        # Optional dependency: only needed for real tokenizers
+        from transformers import AutoTokenizer
+        self.tok = AutoTokenizer.from_pretrained(name)
+        self.name = name
+        self.vocab_size = len(self.tok)
+        self.eos_id = self.tok.eos_token_id if self.tok.eos_token_id is not None else self.vocab_size
+
+    def encode(self, text):
+        return self.tok.encode(text, add_special_tokens=False)
+
+def iter_documents(path, text_key):
+    """jsonl: one document per line (field `text_key`). Text: blank-line separated."""
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)[text_key]
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        doc = []
+        for line in f:
+            if line.strip():
+                doc.append(line)
+            elif doc:
+                yield "".join(doc)
+                doc = []
+        if doc:
+            yield "".join(doc)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert text/jsonl into a memory-mappable token file")
+    parser.add_argument("inputs", nargs="+", help="Input .txt or .jsonl files")
+    parser.add_argument("--out", type=str, required=True, help="Output prefix (writes .bin/.idx/.json)")
+    parser.add_argument("--tokenizer", type=str, default="byte",
+                        help="'byte' or a HuggingFace tokenizer name/path")
+    parser.add_argument("--text-key", type=str, default="text", help="Field holding the text in jsonl")
+    args = parser.parse_args()
+
+    tokenizer = ByteTokenizer() if args.tokenizer == "byte" else HFTokenizer(args.tokenizer)
+    vocab_size = max(tokenizer.vocab_size, tokenizer.eos_id + 1)
+    writer = TokenBinWriter(args.out, vocab_size, tokenizer.eos_id, tokenizer.name)
+
+    for path in args.inputs:
+        logger.info(f"Tokenizing {path}")
+        for text in iter_documents(path, args.text_key):
+            writer.add_document(tokenizer.encode(text))
+
+    meta = writer.close()
+    logger.info(
+        f"Wrote {meta['num_tokens']} tokens / {meta['num_docs']} docs "
+        f"({meta['dtype']}, vocab {meta['vocab_size']}) to {os.path.abspath(writer.bin_path)}"
+    )
+
+if __name__ == "__main__":
+    main()
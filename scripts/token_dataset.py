@@ -0,0 +1,159 @@
+import os
+import json
+import numpy as np
+import torch
+from torch.utils.data import Dataset, default_collate
+
+# -----------------------------------------------------------------------------
+# Pre-tokenized Binary Format
+# -----------------------------------------------------------------------------
+# A corpus prepared by prepare_token_data.py is three files sharing a prefix:
+#
+#   <prefix>.bin   flat token ids (uint16 if vocab fits, else uint32), no header
+#   <prefix>.idx   .npy int64 array of document start offsets (num_docs + 1)
+#   <prefix>.json  metadata: dtype, num_tokens, num_docs, vocab_size, eos_id
+#
+# Everything is read through memory maps, so opening a corpus costs the same
+# for 1 MB or 1 TB, and DataLoader workers share the OS page cache instead of
+# each holding a private copy.
+
+def bin_paths(prefix):
+    if prefix.endswith(".bin"):
+        prefix = prefix[:-len(".bin")]
+    return prefix + ".bin", prefix + ".idx", prefix + ".json"
+
+def token_dtype(vocab_size):
+    return np.uint16 if vocab_size <= np.iinfo(np.uint16).max + 1 else np.uint32
+
+def read_metadata(prefix):
+    _, _, meta_path = bin_paths(prefix)
+    with open(meta_path, "r") as f:
+        return json.load(f)
+
+class TokenBinDataset(Dataset):
+    """
+    Fixed-length windows over a memory-mapped token file.
+
+    Sample i is tokens[i * seq_len : (i + 1) * seq_len]; windows may cross
+    document boundaries (the EOS token separates documents). Only the
+    requested window is read and converted to int64.
+    """
+    def __init__(self, path, seq_len):
+        self.bin_path, self.idx_path, _ = bin_paths(path)
+        self.meta = read_metadata(path)
+        self.seq_len = seq_len
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.num_tokens = self.meta["num_tokens"]
+        self.vocab_size = self.meta["vocab_size"]
+        self.num_samples = self.num_tokens // seq_len
+        if self.num_samples == 0:
+            raise ValueError(f"{self.bin_path} has {self.num_tokens} tokens, fewer than seq_len={seq_len}")
+        # Opened lazily (per process) so pickling to DataLoader workers is free
+        self._tokens = None
+        self._doc_offsets = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_tokens"] = None
+        state["_doc_offsets"] = None
+        return state
+
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = np.memmap(self.bin_path, dtype=self.dtype, mode="r", shape=(self.num_tokens,))
+        return self._tokens
+
+    @property
+    def doc_offsets(self):
+        if self._doc_offsets is None:
+            self._doc_offsets = np.load(self.idx_path, mmap_mode="r")
+        return self._doc_offsets
+
+    def __len__(self):
+        return self.num_samples
+
+    def __getitem__(self, idx):
+        start = idx * self.seq_len
+        data = torch.from_numpy(self.tokens[start:start + self.seq_len].astype(np.int64))
+        return {"input_ids": data, "labels": data}
+
+    def __getitems__(self, indices):
+        # Whole batch in one fancy-index gather: (B, 1) starts + (T,) offsets
+        starts = np.asarray(indices, dtype=np.int64)[:, None] * self.seq_len
+        data = torch.from_numpy(self.tokens[starts + np.arange(self.seq_len)].astype(np.int64))
+        return {"input_ids": data, "labels": data}
+
+# -----------------------------------------------------------------------------
+# Batched Fetch
+# -----------------------------------------------------------------------------
+# DataLoader (torch >= 2.0) hands each sampled batch of indices to
+# dataset.__getitems__ when it exists, then passes the result to collate_fn.
+# Datasets here return an already-batched dict from __getitems__, so the
+# loader must use collate_batch, which only collates per-item lists.
+# Subclasses that can't batch set __getitems__ = None to get per-item fetching.
+
+def collate_batch(batch):
+    """collate_fn for datasets with or without __getitems__."""
+    if isinstance(batch, list):
+        return default_collate(batch)
+    return batch
+
+def fetch_batch(dataset, indices):
+    """One (B, T) batch from dataset, vectorized if it supports __getitems__."""
+    if getattr(dataset, "__getitems__", None):
+        return collate_batch(dataset.__getitems__(indices))
+    return default_collate([dataset[i] for i in indices])
+
+# -----------------------------------------------------------------------------
+# Writer (used by prepare_token_data.py)
+# -----------------------------------------------------------------------------
+class TokenBinWriter:
+    """Streams documents to <prefix>.bin and writes the sidecars on close()."""
+    def __init__(self, prefix, vocab_size, eos_id, tokenizer_name, flush_tokens=1 << 20):
+        self.bin_path, self.idx_path, self.meta_path = bin_paths(prefix)
+        os.makedirs(os.path.dirname(os.path.abspath(self.bin_path)), exist_ok=True)
+        self.dtype = token_dtype(vocab_size)
+        self.vocab_size = vocab_size
+        self.eos_id = eos_id
+        self.tokenizer_name = tokenizer_name
+        self.flush_tokens = flush_tokens
+        self.offsets = [0]
+        self._buffer = []
+        self._buffered = 0
+        # Write to tmp names and rename at the end, so a killed run never
+        # leaves a .bin that looks complete
+        self._bin = open(self.bin_path + ".tmp", "wb")
+
+    def add_document(self, ids):
+        ids = list(ids) + [self.eos_id]
+        self._buffer.append(np.asarray(ids, dtype=self.dtype))
+        self._buffered += len(ids)
+        self.offsets.append(self.offsets[-1] + len(ids))
+        if self._buffered >= self.flush_tokens:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            np.concatenate(self._buffer).tofile(self._bin)
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        self._flush()
+        self._bin.close()
+        with open(self.idx_path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(self.offsets, dtype=np.int64))
+        meta = {
+            "dtype": np.dtype(self.dtype).name,
+            "num_tokens": self.offsets[-1],
+            "num_docs": len(self.offsets) - 1,
+            "vocab_size": self.vocab_size,
+            "eos_id": self.eos_id,
+            "tokenizer": self.tokenizer_name,
+        }
+        with open(self.meta_path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=4)
+        for path in (self.bin_path, self.idx_path, self.meta_path):
+            os.replace(path + ".tmp", path)
+        return meta
@@ -2,12 +2,30 @@ import os
 import json
 import math
 import argparse
+import functools
 import logging
 import torch
 import torch.nn as nn
-import torch.optim as optim
+import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
 from torch.utils.data import DataLoader, Dataset
-from torch.utils.tensorboard import SummaryWriter
+from torch.utils.data.distributed import DistributedSampler
+
+from token_dataset import TokenBinDataset, collate_batch
+from packing import PackedTokenDataset, DocumentDataset, collate_documents
+from checkpointing import (
+    AsyncCheckpointer, ResumableSampler, capture_rng_state, restore_rng_state, latest_checkpoint,
+)
+from train_utils import (
+    PRECISIONS, COMPILE_MODES, resolve_grad_accum_steps, accumulation_window, autocast_context,
+    make_grad_scaler, compile_model, StepClock, OPTIMIZER_IMPLS, LR_SCHEDULES, resolve_optimizer_impl,
+    make_optimizer, make_lr_scheduler,
+)
+from training_metrics import (
+    StepTimer, RunningMetrics, format_metrics, training_flops_per_token, load_peak_flops,
+)
+from metrics_sink import METRICS_BACKENDS, make_metrics_sink
+from loader_tuning import loader_kwargs, auto_tune_loader
 
 # -----------------------------------------------------------------------------
 # Logging Setup
@@ -23,36 +41,54 @@ logger = logging.getLogger(__name__)
 # Tiny Model Components (From Scratch)
 # -----------------------------------------------------------------------------
 
+ATTN_IMPLEMENTATIONS = ("sdpa", "manual")
+
 class TinyAttention(nn.Module):
-    def __init__(self, hidden_size, num_heads, dropout=0.1):
+    def __init__(self, hidden_size, num_heads, dropout=0.1, attn_implementation="sdpa"):
         super().__init__()
+        if attn_implementation not in ATTN_IMPLEMENTATIONS:
+            raise ValueError(f"Unknown attn_implementation: {attn_implementation}")
         self.num_heads = num_heads
         self.head_dim = hidden_size // num_heads
         self.scale = self.head_dim ** -0.5
+        # "sdpa": fused F.scaled_dot_product_attention (flash / mem-efficient kernels)
+        # "manual": explicit (B, H, T, T) score matrix, kept as a reference path
+        self.attn_implementation = attn_implementation
         
         self.qkv = nn.Linear(hidden_size, hidden_size * 3)
         self.proj = nn.Linear(hidden_size, hidden_size)
         self.dropout = nn.Dropout(dropout)
         
-    def forward(self, x, mask=None):
+    def forward(self, x, mask=None, is_causal=False):
         B, T, C = x.shape
         # (B, T, 3 * hidden_size) -> (B, T, 3, num_heads, head_dim)
         qkv = self.qkv(x).view(B, T, 3, self.num_heads, self.head_dim)
         # Permute to (3, B, num_heads, T, head_dim)
         q, k, v = qkv.permute(2, 0, 3, 1, 4)
         
-        # Attention scores: (B, num_heads, T, T)
-        attn = (q @ k.transpose(-2, -1)) * self.scale
-        
-        if mask is not None:
-            # mask is (B, 1, T, T) or similar broadcastable shape
-            attn = attn.masked_fill(mask == 0, float("-inf"))
+        if self.attn_implementation == "sdpa":
+            # Fused path: never materializes the (T, T) scores when is_causal=True.
+            # mask (if given) is boolean, True = "may attend".
+            out = F.scaled_dot_product_attention(
+                q, k, v,
+                attn_mask=mask,
+                dropout_p=self.dropout.p if self.training else 0.0,
+                is_causal=is_causal and mask is None,
+            )
+        else:
+            # Attention scores: (B, num_heads, T, T)
+            attn = (q @ k.transpose(-2, -1)) * self.scale
             
-        attn = attn.softmax(dim=-1)
-        attn = self.dropout(attn)
+            if mask is not None:
+                # mask is (B, 1, T, T) or similar broadcastable shape
+                attn = attn.masked_fill(mask == 0, float("-inf"))
+                
+            attn = attn.softmax(dim=-1)
+            attn = self.dropout(attn)
+            out = attn @ v
         
         # Output: (B, num_heads, T, head_dim)
-        out = (attn @ v).transpose(1, 2).contiguous().view(B, T, C)
+        out = out.transpose(1, 2).contiguous().view(B, T, C)
         return self.proj(out)
 
 class TinyMLP(nn.Module):
@@ -77,7 +113,8 @@ class TinyBlock(nn.Module):
         self.attn = TinyAttention(
             config["hidden_size"], 
             config["num_attention_heads"], 
-            config["attention_probs_dropout_prob"]
+            config["attention_probs_dropout_prob"],
+            config.get("attn_implementation", "sdpa"),
         )
         
         self.ln2 = nn.LayerNorm(config["hidden_size"], eps=config["layer_norm_eps"])
@@ -87,8 +124,8 @@ class TinyBlock(nn.Module):
             config["hidden_dropout_prob"]
         )
         
-    def forward(self, x, mask=None):
-        x = x + self.attn(self.ln1(x), mask)
+    def forward(self, x, mask=None, is_causal=False):
+        x = x + self.attn(self.ln1(x), mask, is_causal)
         x = x + self.mlp(self.ln2(x))
         return x
 
@@ -110,21 +147,49 @@ class TinyTransformer(nn.Module):
         
         # Weight tying
         self.head.weight = self.embeddings.weight
+        
+        # Activation checkpointing: true = every block, N = every N-th block
+        # (blocks 0, N, 2N, ...). Checkpointed blocks keep only their input and
+        # recompute the rest in backward, trading ~1 extra forward for memory.
+        self.checkpoint_every = int(config.get("gradient_checkpointing", False))
+        
+        # Causal mask for the manual attention path, built once and sliced per step.
+        # Non-persistent: it follows the model across .to(device) but stays out of
+        # the state_dict, so checkpoints are unchanged.
+        self.attn_implementation = config.get("attn_implementation", "sdpa")
+        max_T = config["max_position_embeddings"]
+        self.register_buffer(
+            "causal_mask",
+            torch.tril(torch.ones(max_T, max_T, dtype=torch.bool)).view(1, 1, max_T, max_T),
+            persistent=False,
+        )
 
-    def forward(self, input_ids, labels=None):
+    def forward(self, input_ids, labels=None, position_ids=None, attention_mask=None):
         B, T = input_ids.shape
         
-        # Basic causal mask: (B, 1, T, T)
-        mask = torch.tril(torch.ones(T, T, device=input_ids.device)).view(1, 1, T, T)
+        if attention_mask is not None:
+            # Explicit (B, 1, T, T) boolean mask, e.g. block-diagonal for packed rows
+            mask, is_causal = attention_mask, False
+        elif self.attn_implementation == "sdpa":
+            # SDPA applies causality itself (is_causal=True), no mask tensor needed
+            mask, is_causal = None, True
+        else:
+            # Cached causal mask: (1, 1, T, T) view, no allocation per step
+            mask, is_causal = self.causal_mask[:, :, :T, :T], False
         
-        pos_ids = torch.arange(T, device=input_ids.device).unsqueeze(0)
+        if position_ids is None:
+            position_ids = torch.arange(T, device=input_ids.device).unsqueeze(0)
         
-        x = self.embeddings(input_ids) + self.pos_embeddings(pos_ids)
+        x = self.embeddings(input_ids) + self.pos_embeddings(position_ids)
         x = self.layer_norm(x)
         x = self.dropout(x)
         
-        for block in self.blocks:
-            x = block(x, mask)
+        for i, block in enumerate(self.blocks):
+            if self.checkpoint_every and self.training and i % self.checkpoint_every == 0:
+                # Non-reentrant variant: works with DDP/no_sync and inputs that don't require grad
+                x = checkpoint(block, x, mask, is_causal, use_reentrant=False)
+            else:
+                x = block(x, mask, is_causal)
             
         logits = self.head(x)
         
@@ -156,6 +221,11 @@ class SyntheticTextDataset(Dataset):
         # For causal LM, labels are typically same as input (shifted inside model)
         return {"input_ids": data, "labels": data}
 
+    def __getitems__(self, indices):
+        # One randint for the whole batch instead of B calls + a stack
+        data = torch.randint(0, self.vocab_size, (len(indices), self.seq_len))
+        return {"input_ids": data, "labels": data}
+
 # -----------------------------------------------------------------------------
 # Main Training Logic
 # -----------------------------------------------------------------------------
@@ -169,66 +239,236 @@ def train(args):
     with open(args.model_config, 'r') as f:
         config = json.load(f)
         
+    if args.attn_implementation:
+        config["attn_implementation"] = args.attn_implementation
     logger.info(f"Loaded config: {config}")
     
     # Setup Device
     device = get_device()
     logger.info(f"Using device: {device}")
     
-    # Setup Data
-    dataset = SyntheticTextDataset(
-        vocab_size=config["vocab_size"],
-        seq_len=64,
-        num_samples=1000
+    # Setup Data (collate_batch passes through batches built by __getitems__)
+    collate_fn = collate_batch
+    if args.document_mode != "stream":
+        # Document-aware rows: packed (full rows) or padded (one doc per row)
+        if not args.data_path:
+            raise ValueError(f"--document-mode {args.document_mode} requires --data-path")
+        dataset_cls = PackedTokenDataset if args.document_mode == "packed" else DocumentDataset
+        dataset = dataset_cls(args.data_path, seq_len=args.seq_len)
+        collate_fn = functools.partial(
+            collate_documents, seq_len=args.seq_len, pad_id=dataset.meta["eos_id"]
+        )
+        logger.info(f"Document mode '{args.document_mode}': {len(dataset)} rows of {args.seq_len} tokens")
+    elif args.data_path:
+        # Pre-tokenized corpus (scripts/prepare_token_data.py), memory-mapped
+        dataset = TokenBinDataset(args.data_path, seq_len=args.seq_len)
+        logger.info(f"Loaded {dataset.num_tokens} tokens ({len(dataset)} samples) from {args.data_path}")
+    else:
+        dataset = SyntheticTextDataset(
+            vocab_size=config["vocab_size"],
+            seq_len=args.seq_len,
+            num_samples=1000
+        )
+    # Token ids past the embedding table would only fail later, inside the first forward
+    if args.data_path and dataset.vocab_size > config["vocab_size"]:
+        raise ValueError(
+            f"{args.data_path} uses vocab_size={dataset.vocab_size}, "
+            f"model config has {config['vocab_size']}"
+        )
+    # Seeded, epoch-keyed shuffling (a 1-replica DistributedSampler) so a resumed
+    # run can recompute the epoch's order and skip the batches it already consumed
+    sampler = ResumableSampler(
+        DistributedSampler(dataset, num_replicas=1, rank=0, shuffle=True, seed=args.seed)
+    )
+    # Workers / prefetch: from the flags, or measured against the target rate
+    loader_opts = loader_kwargs(args.num_workers, args.prefetch_factor,
+                                pin_memory=device.type == "cuda", persistent_workers=args.num_workers > 0)
+    if args.auto_tune_loader:
+        loader_opts, _ = auto_tune_loader(dataset, args.batch_size, args.loader_target_samples_per_sec,
+                                          collate_fn=collate_fn)
+    logger.info(f"DataLoader settings: {loader_opts}")
+    # With torch.compile, a short final batch would trigger a full recompile.
+    # A private generator keeps iterator creation from consuming the global RNG,
+    # so restored RNG state replays dropout exactly after a resume.
+    dataloader = DataLoader(
+        dataset, batch_size=args.batch_size, sampler=sampler, collate_fn=collate_fn,
+        drop_last=args.compile != "none", generator=torch.Generator().manual_seed(args.seed),
+        **loader_opts,
     )
-    dataloader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True)
     
     # Setup Model
     model = TinyTransformer(config).to(device)
     logger.info("Model initialized.")
+    compile_model(model, args.compile, scope=args.compile_scope, cache_dir=args.compile_cache_dir,
+                  fallback_to_eager=args.compile_fallback_eager)
+    
+    # Optimizer (no weight decay on norms / biases / embeddings; fused or foreach update)
+    optimizer_impl = resolve_optimizer_impl(device, args.optimizer_impl)
+    optimizer = make_optimizer(model, args.learning_rate, args.weight_decay, optimizer_impl)
+    logger.info(f"AdamW ({optimizer_impl}): " + ", ".join(
+        f"{sum(p.numel() for p in g['params'])} params with weight decay {g['weight_decay']}"
+        for g in optimizer.param_groups))
+    
+    # Gradient accumulation: several micro-batches per optimizer step
+    grad_accum_steps = resolve_grad_accum_steps(
+        args.batch_size, grad_accum_steps=args.grad_accum_steps, global_batch_size=args.global_batch_size
+    )
+    logger.info(
+        f"Micro-batch {args.batch_size} x {grad_accum_steps} accumulation steps = "
+        f"effective batch {args.batch_size * grad_accum_steps}"
+    )
+    
+    # Mixed precision (GradScaler is a pass-through unless fp16)
+    scaler = make_grad_scaler(device, args.precision)
+    logger.info(f"Precision: {args.precision}")
+    
+    # Metrics (TensorBoard / JSONL / CSV) are written on a background thread
+    sink = make_metrics_sink(args.log_dir, args.metrics_backends)
     
-    # Optimizer
-    optimizer = optim.AdamW(model.parameters(), lr=args.learning_rate)
+    # Per-step phase timing, throughput and MFU (peak from benchmarks/*_results.json)
+    flops_per_token = training_flops_per_token(model, config, args.seq_len)
+    peak_flops = load_peak_flops(device, args.peak_flops_from, args.peak_tflops)
+    if peak_flops is None:
+        logger.info("No peak FLOPs figure found (--peak-flops-from / --peak-tflops); MFU not reported")
+    else:
+        logger.info(f"MFU vs peak {peak_flops / 1e12:.2f} TFLOPS, {flops_per_token / 1e6:.2f} MFLOPs/token")
+    timer = StepTimer(device, flops_per_token, peak_flops, sync=args.sync_timing)
+    # Loss is accumulated on-device and read back once per log interval
+    running = RunningMetrics(device)
+    
+    # Checkpoints are written on a background thread (tmp + rename, with retention)
+    checkpointer = AsyncCheckpointer(
+        max_in_flight=args.max_inflight_checkpoints,
+        keep_last=args.keep_last_checkpoints,
+        keep_every=args.keep_every_checkpoints,
+    )
     
-    # Tensorboard
-    writer = SummaryWriter(log_dir=args.log_dir)
+    def save_checkpoint(path, epoch, batches_in_epoch, global_step, last_loss, interval=1):
+        # Everything needed to continue mid-epoch; returns after the CPU snapshot
+        checkpointer.save({
+            "epoch": epoch,
+            "batches_in_epoch": batches_in_epoch,
+            "global_step": global_step,
+            "model_state_dict": model.state_dict(),
+            "optimizer_state_dict": optimizer.state_dict(),
+            "scaler_state_dict": scaler.state_dict(),
+            "rng_state": capture_rng_state(),
+            "loss": last_loss,
+        }, path, interval=interval)
+        logger.info(f"Queued checkpoint {path}")
     
     # Training Loop
+    # global_step counts optimizer steps, not micro-batches
     global_step = 0
+    start_epoch, resume_batches = 0, 0
+    last_loss = None
+    
+    # Resume (step- or epoch-granular checkpoint)
+    resume_path = latest_checkpoint(args.checkpoint_dir) if args.resume_from == "latest" else args.resume_from
+    if resume_path:
+        # Loaded on the CPU: load_state_dict moves weights / optimizer state to the device,
+        # and the RNG states must stay CPU ByteTensors for torch.set_rng_state
+        state = torch.load(resume_path, map_location="cpu", weights_only=False)
+        model.load_state_dict(state["model_state_dict"])
+        optimizer.load_state_dict(state["optimizer_state_dict"])
+        if "scaler_state_dict" in state:
+            scaler.load_state_dict(state["scaler_state_dict"])
+        if "rng_state" in state:
+            restore_rng_state(state["rng_state"])
+        global_step = state.get("global_step", 0)
+        last_loss = state.get("loss")
+        start_epoch = state["epoch"]
+        resume_batches = state.get("batches_in_epoch", len(dataloader))
+        if resume_batches >= len(dataloader):
+            start_epoch, resume_batches = start_epoch + 1, 0
+        logger.info(f"Resumed from {resume_path}: epoch {start_epoch}, batch {resume_batches}, step {global_step}")
+    elif args.resume_from:
+        logger.info(f"No checkpoint found in {args.checkpoint_dir}, starting from scratch")
+    
+    # LR schedule over all optimizer steps, positioned at global_step on resume
+    total_steps = args.epochs * math.ceil(len(dataloader) / grad_accum_steps)
+    scheduler = make_lr_scheduler(optimizer, args.lr_schedule, args.warmup_steps, total_steps,
+                                  args.min_lr_ratio, start_step=global_step)
+    
     model.train()
     
     logger.info("Starting training...")
     
-    for epoch in range(args.epochs):
-        for batch in dataloader:
+    # Useful tokens per optimizer step (excludes padding in document modes)
+    step_tokens = 0
+    
+    clock = StepClock()
+    optimizer.zero_grad(set_to_none=True)
+    for epoch in range(start_epoch, args.epochs):
+        sampler.set_epoch(epoch)
+        # Skip consumed batches by slicing the sampler's indices (no data is loaded)
+        skip_batches = resume_batches if epoch == start_epoch else 0
+        sampler.skip(skip_batches * args.batch_size)
+        num_batches = skip_batches + len(dataloader)
+        
+        for micro_step, batch in enumerate(timer.iter_data(dataloader), start=skip_batches):
+            is_boundary, window_size = accumulation_window(micro_step, num_batches, grad_accum_steps)
             input_ids = batch["input_ids"].to(device)
             labels = batch["labels"].to(device)
+            position_ids = batch["position_ids"].to(device) if "position_ids" in batch else None
+            attention_mask = batch["attention_mask"].to(device) if "attention_mask" in batch else None
+            micro_tokens = int(batch["num_tokens"]) if "num_tokens" in batch else input_ids.numel()
+            step_tokens += micro_tokens
             
-            optimizer.zero_grad()
-            logits, loss = model(input_ids, labels=labels)
+            with timer.phase("forward"), autocast_context(device, args.precision):
+                logits, loss = model(
+                    input_ids, labels=labels, position_ids=position_ids, attention_mask=attention_mask
+                )
             
-            loss.backward()
-            optimizer.step()
+            # Scale so the accumulated gradient is that of the mean loss over the window
+            with timer.phase("backward"):
+                scaler.scale(loss / window_size).backward()
+            running.update(loss, micro_tokens)
+            if not is_boundary:
+                continue
+            
+            with timer.phase("optimizer"):
+                scaler.step(optimizer)
+                scaler.update()
+                scheduler.step()
+                # set_to_none: the next backward writes fresh grads instead of a memset + add
+                optimizer.zero_grad(set_to_none=True)
+            clock.tick()
+            timer.end_step(step_tokens)
+            step_tokens = 0
             
             # Logging
             if global_step % args.log_interval == 0:
-                logger.info(f"Epoch {epoch} | Step {global_step} | Loss: {loss.item():.4f}")
-                writer.add_scalar("train/loss", loss.item(), global_step)
+                metrics = {**running.compute(), **timer.summary(), "train/lr": scheduler.get_last_lr()[0]}
+                logger.info(
+                    f"Epoch {epoch} | Step {global_step} | Loss: {metrics['train/loss']:.4f} | "
+                    f"{format_metrics(metrics)}"
+                )
+                sink.log(global_step, metrics)
+                # Last logged (interval-average) loss, stored in checkpoints without a sync
+                last_loss = metrics["train/loss"]
                 
             global_step += 1
             
+            # Step-granular checkpoint: preemption loses at most save_every_steps steps
+            if args.save_every_steps and global_step % args.save_every_steps == 0:
+                save_checkpoint(
+                    os.path.join(args.checkpoint_dir, f"step_{global_step:08d}.pt"),
+                    epoch, micro_step + 1, global_step, last_loss, interval=args.save_every_steps,
+                )
+            
         # Checkpoint at end of epoch
-        os.makedirs(args.checkpoint_dir, exist_ok=True)
-        ckpt_path = os.path.join(args.checkpoint_dir, f"epoch_{epoch}.pt")
-        torch.save({
-            "epoch": epoch,
-            "model_state_dict": model.state_dict(),
-            "optimizer_state_dict": optimizer.state_dict(),
-            "loss": loss.item(),
-        }, ckpt_path)
-        logger.info(f"Saved checkpoint to {ckpt_path}")
+        save_checkpoint(
+            os.path.join(args.checkpoint_dir, f"epoch_{epoch}.pt"), epoch, num_batches, global_step, last_loss
+        )
         
-    writer.close()
+    checkpointer.close()
+    logger.info(f"Step timing: {clock.summary()}")
+    if clock.first_step_time is not None:
+        sink.log(0, {"perf/first_step_seconds": clock.first_step_time})
+    if clock.steady_state_step_time() is not None:
+        sink.log(global_step, {"perf/steady_state_step_seconds": clock.steady_state_step_time()})
+    sink.close()
     logger.info("Training complete.")
 
 if __name__ == "__main__":
@@ -237,9 +477,67 @@ if __name__ == "__main__":
     parser.add_argument("--batch-size", type=int, default=8)
     parser.add_argument("--epochs", type=int, default=2)
     parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--weight-decay", type=float, default=0.01,
+                        help="AdamW decay on weight matrices (norms, biases and embeddings are never decayed)")
+    parser.add_argument("--optimizer-impl", type=str, choices=OPTIMIZER_IMPLS, default="auto",
+                        help="AdamW update: fused kernel, foreach (batched over tensors) or per-tensor loop")
+    parser.add_argument("--lr-schedule", type=str, choices=LR_SCHEDULES, default="constant")
+    parser.add_argument("--warmup-steps", type=int, default=0, help="Linear LR warmup, in optimizer steps")
+    parser.add_argument("--min-lr-ratio", type=float, default=0.1, help="Cosine schedule floor, as a fraction of the LR")
     parser.add_argument("--log-dir", type=str, default="logs/local_tiny")
     parser.add_argument("--checkpoint-dir", type=str, default="checkpoints")
     parser.add_argument("--log-interval", type=int, default=10)
+    parser.add_argument("--save-every-steps", type=int, default=None,
+                        help="Also checkpoint every N optimizer steps (mid-epoch, resumable)")
+    parser.add_argument("--resume-from", type=str, default=None,
+                        help="Checkpoint file to resume from, or 'latest' for the newest in --checkpoint-dir")
+    parser.add_argument("--seed", type=int, default=0, help="Data shuffling seed")
+    parser.add_argument("--keep-last-checkpoints", type=int, default=None,
+                        help="Retention: keep only the K most recent checkpoints (default: keep all)")
+    parser.add_argument("--keep-every-checkpoints", type=int, default=None,
+                        help="Retention: additionally keep every M-th checkpoint")
+    parser.add_argument("--max-inflight-checkpoints", type=int, default=1,
+                        help="Async saves allowed in flight before save() blocks")
+    parser.add_argument("--data-path", type=str, default=None,
+                        help="Token file prefix from prepare_token_data.py (default: synthetic data)")
+    parser.add_argument("--seq-len", type=int, default=64)
+    parser.add_argument("--grad-accum-steps", type=int, default=1,
+                        help="Micro-batches per optimizer step (cf. gradient_accumulation_steps in deepspeed_config.json)")
+    parser.add_argument("--global-batch-size", type=int, default=None,
+                        help="Effective batch size; overrides --grad-accum-steps")
+    parser.add_argument("--precision", type=str, choices=PRECISIONS, default="fp32",
+                        help="Autocast dtype for forward/loss; fp16 adds a GradScaler")
+    parser.add_argument("--compile", type=str, choices=COMPILE_MODES, default="none",
+                        help="torch.compile mode (falls back to eager on failure)")
+    parser.add_argument("--compile-scope", type=str, choices=["model", "block"], default="model",
+                        help="Compile the whole model or each TinyBlock separately")
+    parser.add_argument("--compile-cache-dir", type=str,
+                        default=os.environ.get("TORCHINDUCTOR_CACHE_DIR", ".cache/inductor"),
+                        help="Persistent inductor cache, reused across runs on the same node")
+    parser.add_argument("--compile-fallback-eager", action=argparse.BooleanOptionalAction, default=True,
+                        help="Run eagerly where compilation fails (dynamo suppress_errors, process-wide); "
+                             "--no-compile-fallback-eager makes compile errors fail the run")
+    parser.add_argument("--document-mode", type=str, choices=["stream", "packed", "padded"], default="stream",
+                        help="stream: plain windows; packed: full rows with document masks; "
+                             "padded: one document per row (baseline)")
+    parser.add_argument("--attn-implementation", type=str, choices=ATTN_IMPLEMENTATIONS, default=None,
+                        help="Override config attn_implementation (default: sdpa)")
+    parser.add_argument("--num-workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--prefetch-factor", type=int, default=2, help="Batches prefetched per worker")
+    parser.add_argument("--auto-tune-loader", action="store_true",
+                        help="Benchmark loader settings at startup and use the cheapest that keeps up "
+                             "(overrides --num-workers / --prefetch-factor)")
+    parser.add_argument("--loader-target-samples-per-sec", type=float, default=None,
+                        help="Consumption rate for --auto-tune-loader (default: 95%% of the fastest setting)")
+    parser.add_argument("--metrics-backends", type=str, default="tensorboard,jsonl",
+                        help=f"Comma-separated metrics outputs under --log-dir, from {METRICS_BACKENDS}")
+    parser.add_argument("--peak-flops-from", type=str, default=None,
+                        help="benchmark_suite.py results JSON whose matmul TFLOPS is the MFU peak "
+                             "(default: benchmarks/<mn5_gpu|local_mps|local_cpu>_results.json)")
+    parser.add_argument("--peak-tflops", type=float, default=None,
+                        help="Peak TFLOPS for MFU; overrides --peak-flops-from")
+    parser.add_argument("--sync-timing", action="store_true",
+                        help="Synchronize the device around each timed phase (exact breakdown, slower)")
     
     args = parser.parse_args()
     
@@ -0,0 +1,260 @@
+import os
+import json
+import math
+import time
+import logging
+import functools
+import contextlib
+import torch
+import torch.nn as nn
+from torch.optim.lr_scheduler import LambdaLR
+
+# -----------------------------------------------------------------------------
+# Small helpers shared by train_tiny_transformer.py and ddp_simulation_train.py
+# -----------------------------------------------------------------------------
+
+def resolve_grad_accum_steps(micro_batch_size, world_size=1, grad_accum_steps=1, global_batch_size=None):
+    """
+    Number of micro-batches per optimizer step.
+
+    global_batch_size (if given) wins over grad_accum_steps and must be a
+    multiple of micro_batch_size * world_size, e.g. 32 = 4 (micro) x 2 (ranks) x 4 (accum).
+    """
+    if global_batch_size is None:
+        if grad_accum_steps < 1:
+            raise ValueError(f"grad_accum_steps must be >= 1, got {grad_accum_steps}")
+        return grad_accum_steps
+
+    per_step = micro_batch_size * world_size
+    if global_batch_size < per_step or global_batch_size % per_step != 0:
+        raise ValueError(
+            f"global batch size {global_batch_size} is not a multiple of "
+            f"micro batch {micro_batch_size} x world size {world_size}"
+        )
+    return global_batch_size // per_step
+
+def accumulation_window(micro_step, num_micro_steps, grad_accum_steps):
+    """
+    Returns (is_boundary, window_size) for a micro-step within an epoch.
+
+    window_size is the number of micro-batches that contribute to the current
+    optimizer step; it is smaller than grad_accum_steps only for the trailing
+    window of an epoch. Dividing each micro-batch loss by window_size keeps the
+    accumulated gradient equal to the gradient of the mean loss.
+    """
+    window_start = (micro_step // grad_accum_steps) * grad_accum_steps
+    window_size = min(grad_accum_steps, num_micro_steps - window_start)
+    is_boundary = micro_step + 1 == window_start + window_size
+    return is_boundary, window_size
+
+# -----------------------------------------------------------------------------
+# Mixed Precision
+# -----------------------------------------------------------------------------
+PRECISIONS = ("fp32", "bf16", "fp16")
+PRECISION_DTYPES = {"bf16": torch.bfloat16, "fp16": torch.float16}
+
+def autocast_context(device, precision):
+    """
+    torch.autocast for bf16/fp16, a no-op for fp32. Parameters (master weights)
+    and optimizer state stay fp32; only the forward/loss ops run in low precision.
+    Works on CPU too, which is how the bf16 path is exercised without a GPU.
+    """
+    if precision == "fp32":
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=PRECISION_DTYPES[precision])
+
+def make_grad_scaler(device, precision, sharded=False):
+    # Loss scaling is only needed for fp16 (narrow exponent range); bf16 has fp32's range
+    if sharded:
+        # FSDP / --zero-stage 2: each rank sees only its gradient shard, so the inf/nan check is all-reduced
+        from torch.distributed.fsdp.sharded_grad_scaler import ShardedGradScaler
+        return ShardedGradScaler(device.type, enabled=precision == "fp16")
+    return torch.amp.GradScaler(device.type, enabled=precision == "fp16")
+
+# -----------------------------------------------------------------------------
+# torch.compile
+# -----------------------------------------------------------------------------
+COMPILE_MODES = ("none", "default", "reduce-overhead", "max-autotune")
+
+def compile_model(model, mode, scope="model", cache_dir=None, fallback_to_eager=False):
+    """
+    Compiles `model` (or each of model.blocks) in place with nn.Module.compile,
+    so state_dict keys and DDP wrapping are unaffected. Returns True if compiled.
+
+    Compilation itself is lazy: the cost lands on the first forward, so callers
+    should time the first step separately (see StepClock), and compile errors
+    (graph capture, inductor) surface there, not here. With fallback_to_eager
+    dynamo's suppress_errors is turned on, so a frame that fails to compile
+    runs eagerly instead. That setting is process-wide (it applies to every
+    later compile in the process too), so the training entry points enable it
+    (their default) and library callers do not.
+    """
+    logger = logging.getLogger(__name__)
+    if mode == "none":
+        return False
+
+    if cache_dir:
+        # Inductor's default cache is /tmp/torchinductor_$USER, wiped between jobs.
+        # A stable directory lets relaunches on the same node reuse compiled kernels.
+        os.environ["TORCHINDUCTOR_CACHE_DIR"] = os.path.abspath(cache_dir)
+        os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+        os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+    if fallback_to_eager:
+        import torch._dynamo
+        torch._dynamo.config.suppress_errors = True
+    targets = model.blocks if scope == "block" else [model]
+    for module in targets:
+        module.compile(mode=mode)
+
+    logger.info(f"torch.compile enabled (mode={mode}, scope={scope}, fallback_to_eager={fallback_to_eager}, "
+                f"cache={os.environ.get('TORCHINDUCTOR_CACHE_DIR')})")
+    return True
+
+class StepClock:
+    """
+    Separates the first optimizer step (compilation / warm-up) from
+    steady-state step time. Call tick() after every optimizer step.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_step_time = None
+        self.first_step_end = None
+        self.last_step_end = None
+        self.steps = 0
+
+    def tick(self):
+        now = time.perf_counter()
+        self.steps += 1
+        if self.first_step_time is None:
+            self.first_step_time = now - self.start
+            self.first_step_end = now
+        self.last_step_end = now
+
+    def steady_state_step_time(self):
+        if self.steps < 2:
+            return None
+        return (self.last_step_end - self.first_step_end) / (self.steps - 1)
+
+    def summary(self):
+        if self.steps == 0:
+            return "no optimizer steps taken"
+        steady = self.steady_state_step_time()
+        steady_str = f"{steady * 1000:.2f} ms" if steady is not None else "n/a"
+        return (f"first step (compile + warm-up): {self.first_step_time:.2f} s | "
+                f"steady-state step: {steady_str} over {self.steps - 1} steps")
+
+# -----------------------------------------------------------------------------
+# DDP Wrapping
+# -----------------------------------------------------------------------------
+# DistributedDataParallel knobs that decide how gradient all-reduce overlaps
+# with backward. Defaults match torch's.
+DDP_DEFAULTS = {
+    "bucket_cap_mb": 25,
+    "gradient_as_bucket_view": False,
+    "static_graph": False,
+    "find_unused_parameters": False,
+    "broadcast_buffers": True,
+}
+
+def resolve_ddp_config(config_path=None, **overrides):
+    """
+    DDP keyword arguments: DDP_DEFAULTS, then a JSON file (the top-level
+    "ddp" section if present, else the whole object), then non-None overrides.
+    """
+    ddp_config = dict(DDP_DEFAULTS)
+    if config_path:
+        with open(config_path, "r") as f:
+            loaded = json.load(f)
+        loaded = loaded.get("ddp", loaded)
+        unknown = set(loaded) - set(DDP_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown DDP options in {config_path}: {sorted(unknown)}")
+        ddp_config.update(loaded)
+    ddp_config.update({k: v for k, v in overrides.items() if v is not None})
+    return ddp_config
+
+# -----------------------------------------------------------------------------
+# Optimizer + LR Schedule
+# -----------------------------------------------------------------------------
+# AdamW's per-parameter Python loop ("for-loop") launches a handful of small
+# kernels per tensor; TinyTransformer has ~10 tensors per block, so on small
+# models the loop itself is a visible slice of the step. "foreach" batches
+# each update op across all tensors, "fused" does the whole update in one kernel.
+OPTIMIZER_IMPLS = ("auto", "fused", "foreach", "for-loop")
+LR_SCHEDULES = ("constant", "cosine")
+NO_DECAY_MODULES = (nn.LayerNorm, nn.Embedding)
+
+def param_groups(model, weight_decay):
+    """
+    AdamW groups: weight matrices decayed; norm scales, biases and embeddings
+    not. Classified by owning module and name rather than ndim, so it also
+    holds for FSDP's flattened 1-D shards. A shared (tied) parameter counts
+    under its first owner: a tied LM head follows the embedding.
+    """
+    owners = {}
+    for module in model.modules():
+        for name, param in module.named_parameters(recurse=False):
+            owners.setdefault(param, (module, name))
+    decay, no_decay = [], []
+    for param in model.parameters():
+        if not param.requires_grad:
+            continue
+        module, name = owners[param]
+        if isinstance(module, NO_DECAY_MODULES) or name == "bias":
+            no_decay.append(param)
+        else:
+            decay.append(param)
+    groups = [{"params": decay, "weight_decay": weight_decay}, {"params": no_decay, "weight_decay": 0.0}]
+    return [group for group in groups if group["params"]]
+
+def _fused_supported(device):
+    # Fused AdamW: CUDA always, CPU / MPS only on newer torch builds
+    try:
+        param = torch.zeros(1, device=device, requires_grad=True)
+        param.grad = torch.zeros_like(param)
+        torch.optim.AdamW([param], fused=True).step()
+        return True
+    except (RuntimeError, TypeError, ValueError):
+        return False
+
+def resolve_optimizer_impl(device, impl="auto"):
+    """'auto' -> fused if this device/torch supports it, else foreach."""
+    if impl == "auto":
+        return "fused" if _fused_supported(device) else "foreach"
+    if impl not in OPTIMIZER_IMPLS:
+        raise ValueError(f"Unknown optimizer implementation '{impl}', expected one of {OPTIMIZER_IMPLS}")
+    return impl
+
+def optimizer_impl_kwargs(impl):
+    """AdamW keyword arguments for a resolved implementation."""
+    if impl == "fused":
+        return {"fused": True}
+    return {"foreach": impl == "foreach"}
+
+def make_optimizer(model, lr, weight_decay=0.01, impl="foreach"):
+    return torch.optim.AdamW(param_groups(model, weight_decay), lr=lr, **optimizer_impl_kwargs(impl))
+
+def lr_multiplier(step, schedule="constant", warmup_steps=0, total_steps=None, min_lr_ratio=0.1):
+    """Linear warmup over warmup_steps, then constant or cosine decay to min_lr_ratio at total_steps."""
+    if step < warmup_steps:
+        return (step + 1) / warmup_steps
+    if schedule == "constant" or not total_steps:
+        return 1.0
+    progress = min(1.0, (step - warmup_steps) / max(1, total_steps - warmup_steps))
+    return min_lr_ratio + (1.0 - min_lr_ratio) * 0.5 * (1.0 + math.cos(math.pi * progress))
+
+def make_lr_scheduler(optimizer, schedule="constant", warmup_steps=0, total_steps=None, min_lr_ratio=0.1,
+                      start_step=0):
+    """
+    LambdaLR stepped once per optimizer step. The LR is a pure function of
+    the step, so a resumed run passes start_step=global_step (created after
+    the optimizer state is loaded) instead of checkpointing scheduler state.
+    """
+    if schedule not in LR_SCHEDULES:
+        raise ValueError(f"Unknown LR schedule '{schedule}', expected one of {LR_SCHEDULES}")
+    for group in optimizer.param_groups:
+        group.setdefault("initial_lr", group["lr"])
+    multiplier = functools.partial(lr_multiplier, schedule=schedule, warmup_steps=warmup_steps,
+                                   total_steps=total_steps, min_lr_ratio=min_lr_ratio)
+    return LambdaLR(optimizer, multiplier, last_epoch=start_step - 1)
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from collections import defaultdict
+import torch
+import torch.nn as nn
+import torch.distributed as dist
+
+# -----------------------------------------------------------------------------
+# Step Timing
+# -----------------------------------------------------------------------------
+PHASES = ("data", "forward", "backward", "optimizer", "comm", "comm_exposed")
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elif device.type == "mps":
+        torch.mps.synchronize()
+
+class StepTimer:
+    """
+    Per-optimizer-step time breakdown: data wait, forward, backward, optimizer
+    and (DDP) gradient communication, plus tokens/sec and MFU per interval.
+
+    Cheap enough to leave on: a few perf_counter() calls per step and no device
+    syncs. On GPUs the phases then measure host-side (launch) time while the
+    step total stays accurate; pass sync=True for an exact per-phase breakdown
+    at the cost of one synchronize per phase.
+
+        for batch in timer.iter_data(dataloader):
+            with timer.phase("forward"): ...
+            with timer.phase("backward"): ...
+            with timer.phase("optimizer"): ...
+            timer.end_step(num_tokens)
+    """
+    def __init__(self, device, flops_per_token=None, peak_flops=None, sync=False):
+        self.device = device
+        self.flops_per_token = flops_per_token
+        self.peak_flops = peak_flops
+        self.sync = sync
+        self._lock = threading.Lock()  # comm times arrive on the backend's thread
+        self._reset_interval()
+        self._reset_step_comm()
+
+    def _reset_interval(self):
+        self.totals = defaultdict(float)
+        self.steps = 0
+        self.tokens = 0
+        self.comm_buckets = 0
+        self.interval_start = time.perf_counter()
+
+    def _reset_step_comm(self):
+        self._last_launch = None
+        self._last_done = None
+        self._step_buckets = 0
+
+    def iter_data(self, iterable):
+        """Wraps a DataLoader; time blocked in next() is the data-wait phase."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self.add("data", time.perf_counter() - start)
+            yield batch
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.sync:
+            synchronize(self.device)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.sync:
+                synchronize(self.device)
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] += seconds
+
+    def add_comm(self, launch, done):
+        """One gradient bucket's collective, launched and completed at perf_counter() times."""
+        with self._lock:
+            self.totals["comm"] += done - launch
+            self._last_launch = launch if self._last_launch is None else max(self._last_launch, launch)
+            self._last_done = done if self._last_done is None else max(self._last_done, done)
+            self._step_buckets += 1
+
+    def end_step(self, num_tokens):
+        self.steps += 1
+        self.tokens += num_tokens
+        if self._step_buckets:
+            # The last bucket is launched once backward has produced every gradient;
+            # whatever communication runs past that point is not hidden by compute.
+            with self._lock:
+                self.totals["comm_exposed"] += max(0.0, self._last_done - self._last_launch)
+                self.comm_buckets += self._step_buckets
+                self._reset_step_comm()
+
+    def summary(self):
+        """Averages since the previous summary() call, then starts a new interval."""
+        elapsed = time.perf_counter() - self.interval_start
+        steps = max(self.steps, 1)
+        metrics = {f"time/{name}_ms": self.totals[name] / steps * 1000 for name in PHASES if name in self.totals}
+        metrics["time/step_ms"] = elapsed / steps * 1000
+        metrics["perf/tokens_per_sec"] = self.tokens / elapsed if elapsed > 0 else 0.0
+        if self.totals["comm"] > 0:
+            metrics["perf/comm_overlap"] = 1.0 - self.totals["comm_exposed"] / self.totals["comm"]
+            metrics["comm/buckets_per_step"] = self.comm_buckets / steps
+        if self.flops_per_token and self.peak_flops:
+            achieved = metrics["perf/tokens_per_sec"] * self.flops_per_token
+            metrics["perf/achieved_tflops"] = achieved / 1e12
+            metrics["perf/mfu"] = achieved / self.peak_flops
+        self._reset_interval()
+        return metrics
+
+def format_metrics(metrics):
+    parts = []
+    for key in ("time/step_ms", "time/data_ms", "time/forward_ms", "time/backward_ms",
+                "time/optimizer_ms", "time/comm_ms", "time/comm_exposed_ms"):
+        if key in metrics:
+            parts.append(f"{key.split('/')[1][:-3]} {metrics[key]:.1f}ms")
+    if "perf/comm_overlap" in metrics:
+        parts.append(f"overlap {metrics['perf/comm_overlap'] * 100:.0f}%")
+    if "comm/sent_mb_per_step" in metrics:
+        parts.append(f"sent {metrics['comm/sent_mb_per_step']:.2f}MB/step ({metrics['comm/compression_ratio']:.1f}x)")
+    parts.append(f"{metrics['perf/tokens_per_sec']:.0f} tok/s")
+    if "perf/mfu" in metrics:
+        parts.append(f"MFU {metrics['perf/mfu'] * 100:.2f}%")
+    return " | ".join(parts)
+
+# -----------------------------------------------------------------------------
+# Running Loss (no per-step host syncs)
+# -----------------------------------------------------------------------------
+class RunningMetrics:
+    """
+    Token-weighted running loss kept on the device between log boundaries.
+
+    update() only queues device ops (loss.item() would drain the device queue
+    every step); compute() does the single host sync per interval and, under
+    torch.distributed, a single all_reduce so the logged loss is the global
+    average over every rank's tokens. All ranks must call compute() together.
+    """
+    def __init__(self, device):
+        self.device = device
+        self.reset()
+
+    def reset(self):
+        self.loss_sum = torch.zeros((), device=self.device)
+        self.tokens = 0
+
+    def update(self, loss, num_tokens):
+        # num_tokens is a host-side count, so weighting costs no sync
+        self.loss_sum += loss.detach().float() * num_tokens
+        self.tokens += num_tokens
+
+    def compute(self):
+        totals = torch.stack([self.loss_sum, torch.tensor(float(self.tokens), device=self.device)])
+        if dist.is_available() and dist.is_initialized():
+            dist.all_reduce(totals)
+        loss_sum, tokens = totals.tolist()
+        self.reset()
+        return {"train/loss": loss_sum / tokens if tokens else float("nan")}
+
+# -----------------------------------------------------------------------------
+# DDP Communication Timing
+# -----------------------------------------------------------------------------
+def timed_comm_hook(inner_hook):
+    """
+    Wraps a DDP comm hook so each bucket's collective time is added to the
+    timer's "comm" phase. Register with
+        model.register_comm_hook((timer, inner_state), timed_comm_hook(inner_hook))
+    Bucket times are summed, so "comm" is total communication time, part of
+    which overlaps with backward compute. "comm_exposed" is the part that
+    does not: from the last bucket's launch to the last completion.
+    """
+    def hook(state, bucket):
+        timer, inner_state = state
+        start = time.perf_counter()
+        future = inner_hook(inner_state, bucket)
+
+        def record(fut):
+            timer.add_comm(start, time.perf_counter())
+            return fut.value()
+
+        return future.then(record)
+    return hook
+
+# -----------------------------------------------------------------------------
+# Model FLOPs Utilization
+# -----------------------------------------------------------------------------
+def matmul_param_count(model):
+    """
+    Parameters that take part in matmuls: every nn.Linear weight/bias, counted
+    once even if shared (a tied LM head counts the embedding matrix once).
+    Embedding lookups are free, so untied input embeddings are excluded.
+    """
+    seen = {}
+    for module in model.modules():
+        if isinstance(module, nn.Linear):
+            for param in module.parameters(recurse=False):
+                seen[id(param)] = param.numel()
+    return sum(seen.values())
+
+def training_flops_per_token(model, config, seq_len):
+    """
+    Standard transformer estimate (Kaplan / PaLM appendix B):
+    6 * N for forward + backward weight matmuls, plus 12 * L * H * T for the
+    attention score and value matmuls.
+    """
+    n = matmul_param_count(model)
+    attention = 12 * config["num_hidden_layers"] * config["hidden_size"] * seq_len
+    return 6 * n + attention
+
+# Measured matmul peaks from benchmarks/benchmark_suite.py, by training device
+DEFAULT_PEAK_FILES = {
+    "cuda": "mn5_gpu_results.json",
+    "mps": "local_mps_results.json",
+    "cpu": "local_cpu_results.json",
+}
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks")
+
+def load_peak_flops(device, results_path=None, peak_tflops=None):
+    """
+    Peak FLOP/s used as the MFU denominator: --peak-tflops if given, else the
+    measured matmul TFLOPS in a benchmark results JSON (default chosen by device).
+    Returns None if neither is available.
+    """
+    if peak_tflops:
+        return peak_tflops * 1e12
+    path = results_path or os.path.join(BENCHMARKS_DIR, DEFAULT_PEAK_FILES.get(device.type, ""))
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r") as f:
+        results = json.load(f)
+    matmul = results.get("matmul") or {}
+    return matmul["tflops"] * 1e12 if matmul.get("tflops") else None
@@ -0,0 +1,103 @@
+import torch
+import torch.distributed as dist
+from torch.distributed.optim import ZeroRedundancyOptimizer
+
+# -----------------------------------------------------------------------------
+# ZeRO-style Sharding (native torch, no DeepSpeed)
+# -----------------------------------------------------------------------------
+# Stage 1: ZeroRedundancyOptimizer partitions parameters across ranks; each
+#          rank keeps AdamW state (exp_avg, exp_avg_sq) only for its partition,
+#          steps only those parameters and broadcasts them back.
+# Stage 2 (owner-reduce): additionally, each gradient is reduced only to the
+#          rank that owns its parameter instead of all-reduced to every rank,
+#          with one dist.reduce per owner so it runs on gloo. This is not ZeRO-2:
+#          DDP still owns full-size bucket buffers on every rank, so no gradient
+#          memory is saved, and a bucket costs up to world_size reduces rather
+#          than one collective. FSDP's grad-op sharding (fsdp_utils.py) is the
+#          real ZeRO-2.
+ZERO_STAGES = (0, 1, 2)
+
+def make_zero_optimizer(params, optimizer_class, **defaults):
+    return ZeroRedundancyOptimizer(params, optimizer_class=optimizer_class, **defaults)
+
+def zero_param_owners(optimizer):
+    """
+    Collective. {parameter: owning rank} for a ZeroRedundancyOptimizer, built
+    from each rank's local optimizer (`optimizer.optim`) rather than the
+    private `_param_to_rank`, which is not a stable API.
+    """
+    params = [p for group in optimizer.param_groups for p in group["params"]]
+    index = {p: i for i, p in enumerate(params)}
+    local = [index[p] for group in optimizer.optim.param_groups for p in group["params"]]
+    gathered = [None] * dist.get_world_size()
+    dist.all_gather_object(gathered, local)
+    return {params[i]: rank for rank, indices in enumerate(gathered) for i in indices}
+
+def zero_reduce_hook(state, bucket):
+    """
+    DDP comm hook for --zero-stage 2 (owner-reduce). state = (CommStats, zero_param_owners(optimizer)).
+
+    The bucket buffer is the parameters' gradients back to back; each owner's
+    slice is reduced (averaged) to that owner only. Slices owned by other
+    ranks are zeroed, since their optimizer step happens elsewhere. Ranks
+    therefore see different gradients: an fp16 GradScaler must agree on
+    overflow across ranks (make_grad_scaler(sharded=True)).
+    """
+    stats, owners = state
+    rank, world_size = dist.get_rank(), dist.get_world_size()
+    buffer = bucket.buffer()
+    params = bucket.parameters()
+
+    slices, offset = [], 0
+    for param in params:
+        slices.append((owners[param], offset, param.numel()))
+        offset += param.numel()
+
+    chunks, futures = {}, []
+    for owner in sorted({owner for owner, _, _ in slices}):
+        chunks[owner] = torch.cat([buffer[start:start + n] for o, start, n in slices if o == owner]).div_(world_size)
+        futures.append(dist.reduce(chunks[owner], dst=owner, async_op=True).get_future())
+    stats.add(bucket, buffer.numel() * buffer.element_size())
+
+    def scatter_back(fut):
+        pos = 0
+        for owner, start, n in slices:
+            if owner == rank:
+                buffer[start:start + n].copy_(chunks[rank][pos:pos + n])
+                pos += n
+            else:
+                buffer[start:start + n].zero_()
+        return buffer
+
+    return torch.futures.collect_all(futures).then(scatter_back)
+
+def optimizer_state_bytes(optimizer):
+    """Bytes of optimizer state tensors held by this rank."""
+    local = optimizer.optim if isinstance(optimizer, ZeroRedundancyOptimizer) else optimizer
+    return sum(
+        value.numel() * value.element_size()
+        for param_state in local.state.values()
+        for value in param_state.values()
+        if isinstance(value, torch.Tensor)
+    )
+
+def optimizer_memory_report(optimizer, replicas=None):
+    """
+    Collective. This rank's optimizer state vs. what a replicated optimizer
+    would hold: the sum over ranks divided by how many copies of the state
+    exist (`replicas`; default 1 for ZeRO, whose partitions don't overlap,
+    else the world size). FSDP passes its own count (see fsdp_utils.shard_replicas).
+    """
+    local = optimizer_state_bytes(optimizer)
+    full = local
+    if dist.is_initialized():
+        if replicas is None:
+            replicas = 1 if isinstance(optimizer, ZeroRedundancyOptimizer) else dist.get_world_size()
+        total = torch.tensor([float(local)])
+        dist.all_reduce(total)
+        full = total.item() / replicas
+    return {
+        "memory/optimizer_state_mb": local / 1e6,
+        "memory/optimizer_state_replicated_mb": full / 1e6,
+        "memory/optimizer_state_saved": 1.0 - local / full if full else 0.0,
+    }
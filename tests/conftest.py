@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The training scripts import each other as top-level modules (python scripts/<name>.py);
+# benchmarks/benchmark_suite.py is run the same way
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
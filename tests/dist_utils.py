@@ -0,0 +1,41 @@
+import os
+import socket
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+# -----------------------------------------------------------------------------
+# Multi-rank tests on the gloo CPU backend
+# -----------------------------------------------------------------------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _worker(rank, world_size, port, out_dir, fn, args):
+    # The same variables torchrun sets, for code that reads them (e.g. LOCAL_WORLD_SIZE)
+    os.environ.update(
+        MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port), RANK=str(rank), WORLD_SIZE=str(world_size),
+        LOCAL_RANK=str(rank), LOCAL_WORLD_SIZE=str(world_size),
+    )
+    torch.set_num_threads(1)
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    try:
+        result = fn(rank, world_size, *args)
+        torch.save(result, os.path.join(out_dir, f"result_{rank:05d}.pt"))
+    finally:
+        dist.destroy_process_group()
+
+def run_ranks(fn, world_size, out_dir, *args):
+    """
+    Runs fn(rank, world_size, *args) on `world_size` spawned gloo ranks and
+    returns every rank's return value, in rank order. `fn` must be a
+    module-level function. Results come back through files in `out_dir`
+    (e.g. a pytest tmp_path), so large results cannot block a pipe.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    mp.spawn(_worker, args=(world_size, _free_port(), str(out_dir), fn, args), nprocs=world_size, join=True)
+    return [
+        torch.load(os.path.join(out_dir, f"result_{rank:05d}.pt"), weights_only=False)
+        for rank in range(world_size)
+    ]
@@ -0,0 +1,58 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import ddp_simulation_train
+from train_tiny_transformer import TinyTransformer
+
+CONFIG = {
+    "vocab_size": 97,
+    "hidden_size": 32,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 4,
+    "intermediate_size": 64,
+    "max_position_embeddings": 32,
+    "layer_norm_eps": 1e-12,
+    "hidden_dropout_prob": 0.0,
+    "attention_probs_dropout_prob": 0.0,
+}
+
+def _logits_and_grads(attn_implementation, input_ids, attention_mask=None):
+    torch.manual_seed(0)
+    model = TinyTransformer({**CONFIG, "attn_implementation": attn_implementation})
+    logits, loss = model(input_ids, labels=input_ids, attention_mask=attention_mask)
+    loss.backward()
+    return logits.detach(), {name: p.grad for name, p in model.named_parameters()}
+
+def test_manual_and_sdpa_match_causal():
+    torch.manual_seed(1)
+    input_ids = torch.randint(0, CONFIG["vocab_size"], (2, 16))
+    manual_logits, manual_grads = _logits_and_grads("manual", input_ids)
+    sdpa_logits, sdpa_grads = _logits_and_grads("sdpa", input_ids)
+
+    torch.testing.assert_close(sdpa_logits, manual_logits, atol=1e-5, rtol=1e-4)
+    for name, grad in manual_grads.items():
+        torch.testing.assert_close(sdpa_grads[name], grad, atol=1e-5, rtol=1e-4, msg=name)
+
+def test_manual_and_sdpa_match_block_diagonal_mask():
+    # Two packed documents per row: the explicit-mask path of both implementations
+    torch.manual_seed(1)
+    T = 16
+    input_ids = torch.randint(0, CONFIG["vocab_size"], (2, T))
+    causal = torch.tril(torch.ones(T, T, dtype=torch.bool))
+    doc = torch.arange(T) >= T // 2
+    mask = (causal & (doc[:, None] == doc[None, :])).expand(2, 1, T, T)
+
+    manual_logits, manual_grads = _logits_and_grads("manual", input_ids, mask)
+    sdpa_logits, sdpa_grads = _logits_and_grads("sdpa", input_ids, mask)
+
+    torch.testing.assert_close(sdpa_logits, manual_logits, atol=1e-5, rtol=1e-4)
+    for name, grad in manual_grads.items():
+        torch.testing.assert_close(sdpa_grads[name], grad, atol=1e-5, rtol=1e-4, msg=name)
+
+@pytest.mark.parametrize("model_cls", [TinyTransformer, ddp_simulation_train.TinyTransformer],
+                         ids=["train_tiny_transformer", "ddp_simulation_train"])
+def test_unknown_attn_implementation_is_rejected(model_cls):
+    # A typo must not silently fall through to the manual path
+    with pytest.raises(ValueError, match="flash"):
+        model_cls({**CONFIG, "attn_implementation": "flash"})
@@ -0,0 +1,86 @@
+import json
+import statistics
+import pytest
+
+pytest.importorskip("torch")
+
+from benchmark_suite import summarize_samples, flatten_metrics, compare_results, compare_main
+
+MS = 1_000_000  # ns
+
+def test_summarize_samples_trims_tukey_outliers_from_mean_only():
+    stats = summarize_samples([10 * MS] * 9 + [100 * MS])
+    assert stats["iterations"] == 10
+    assert stats["outliers"] == 1
+    # median / percentiles use every sample, mean / stddev / CI only the kept ones
+    assert stats["median_seconds"] == pytest.approx(0.010)
+    assert stats["p90_seconds"] > 0.010
+    assert stats["mean_seconds"] == pytest.approx(0.010)
+    assert stats["stddev_seconds"] == 0.0
+    assert stats["ci95_rel"] == 0.0
+
+def test_summarize_samples_confidence_interval():
+    samples = [9 * MS, 11 * MS] * 10
+    stats = summarize_samples(samples)
+    seconds = [x / 1e9 for x in samples]
+    stddev = statistics.stdev(seconds)
+    assert stats["outliers"] == 0
+    assert stats["mean_seconds"] == pytest.approx(0.010)
+    assert stats["stddev_seconds"] == pytest.approx(stddev)
+    assert stats["ci95_rel"] == pytest.approx(1.96 * stddev / len(samples) ** 0.5 / 0.010)
+
+def test_summarize_samples_few_samples_are_not_trimmed():
+    stats = summarize_samples([1 * MS, 2 * MS, 50 * MS])
+    assert stats["outliers"] == 0
+    assert (stats["p10_seconds"], stats["p90_seconds"]) == pytest.approx((0.001, 0.050))
+    assert stats["mean_seconds"] == pytest.approx(53 / 3 / 1000)
+
+RESULTS = {
+    "system_info": {"tflops": 99.0},
+    "matmul": {"tflops": 10.0, "median_seconds": 0.5, "p90_seconds": 0.7},
+    "collectives": {"all_reduce": [
+        {"size_bytes": 1024, "busbw_gb_s": 1.0, "avg_time_seconds": 0.002},
+        {"size_bytes": 2048, "busbw_gb_s": 2.0, "avg_time_seconds": 0.003},
+    ]},
+}
+
+def test_flatten_metrics_keys_rows_and_skips_ungated_values():
+    assert flatten_metrics(RESULTS) == {
+        "matmul.tflops": 10.0,
+        "matmul.median_seconds": 0.5,
+        "collectives.all_reduce[size_bytes=1024].busbw_gb_s": 1.0,
+        "collectives.all_reduce[size_bytes=1024].avg_time_seconds": 0.002,
+        "collectives.all_reduce[size_bytes=2048].busbw_gb_s": 2.0,
+        "collectives.all_reduce[size_bytes=2048].avg_time_seconds": 0.003,
+    }
+
+def test_compare_results_direction():
+    baseline = {"matmul": {"tflops": 10.0, "median_seconds": 1.0}, "bandwidth": {"bandwidth_gb_s": 100.0}}
+    candidate = {"matmul": {"tflops": 9.0, "median_seconds": 0.9}, "bandwidth": {"bandwidth_gb_s": 97.0}}
+    rows = {path: (change, regressed) for path, _, _, change, regressed in compare_results(baseline, candidate)}
+    # Higher is better: fewer TFLOPS is a regression
+    assert rows["matmul.tflops"] == (pytest.approx(-0.1), True)
+    # Lower is better: less time is an improvement (positive change)
+    assert rows["matmul.median_seconds"] == (pytest.approx(0.1), False)
+    # Within the 5% threshold
+    assert rows["bandwidth.bandwidth_gb_s"] == (pytest.approx(-0.03), False)
+
+    slower = compare_results(baseline, {"matmul": {"median_seconds": 1.2}})
+    assert [(path, regressed) for path, _, _, _, regressed in slower] == [("matmul.median_seconds", True)]
+
+def _write(tmp_path, name, results):
+    path = tmp_path / name
+    path.write_text(json.dumps(results))
+    return str(path)
+
+def test_compare_main_exit_codes(tmp_path):
+    baseline = _write(tmp_path, "baseline.json", RESULTS)
+    same = _write(tmp_path, "same.json", RESULTS)
+    slower = _write(tmp_path, "slower.json", {**RESULTS, "matmul": {"tflops": 5.0, "median_seconds": 1.0}})
+    unrelated = _write(tmp_path, "unrelated.json", {"bandwidth": {"bandwidth_gb_s": 10.0}})
+
+    assert compare_main([baseline, same]) == 0
+    assert compare_main([baseline, slower]) == 1
+    # A looser threshold lets the same slowdown pass
+    assert compare_main([baseline, slower, "--threshold", "2.0"]) == 0
+    assert compare_main([baseline, unrelated]) == 2
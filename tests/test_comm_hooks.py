@@ -0,0 +1,100 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+
+from dist_utils import run_ranks
+from comm_hooks import CommStats, make_comm_hook
+
+def _recording(hook, records):
+    """Wraps a comm hook to keep each bucket's local input and reduced output."""
+    def wrapper(state, bucket):
+        record = {"input": bucket.buffer().clone()}
+        records.append(record)
+
+        def done(fut):
+            record["output"] = fut.value().clone()
+            return fut.value()
+
+        return hook(state, bucket).then(done)
+    return wrapper
+
+def _hook_rank(rank, world_size, name, steps, options):
+    # One bucket: the model is far below DDP's first-bucket cap
+    torch.manual_seed(0)
+    model = DistributedDataParallel(nn.Sequential(nn.Linear(16, 32), nn.Tanh(), nn.Linear(32, 8)))
+    state, hook = make_comm_hook(name, CommStats(), **options)
+    records = []
+    model.register_comm_hook(state, _recording(hook, records))
+
+    torch.manual_seed(1 + rank)
+    for _ in range(steps):
+        model(torch.randn(4, 16)).pow(2).mean().backward()
+        model.zero_grad()
+    result = {"records": records}
+    if name == "topk":
+        result["residual"] = state[1].residuals[0].clone()
+    if name == "powersgd":
+        result["error"] = state[1].error_dict[0].clone()
+    return result
+
+def _run(tmp_path, name, steps=1, **options):
+    return run_ranks(_hook_rank, 2, tmp_path / name, name, steps, options)
+
+def _mean_input(results, step=0):
+    # What a plain fp32 all-reduce (averaged) produces
+    return torch.stack([r["records"][step]["input"] for r in results]).mean(0)
+
+def test_allreduce_averages_gradients(tmp_path):
+    results = _run(tmp_path, "allreduce")
+    for r in results:
+        torch.testing.assert_close(r["records"][0]["output"], _mean_input(results))
+
+@pytest.mark.parametrize("name, rtol", [("fp16", 2e-3), ("bf16", 2e-2)])
+def test_cast_hooks_close_to_allreduce(tmp_path, name, rtol):
+    results = _run(tmp_path, name)
+    expected = _mean_input(results)
+    # Rounding error scales with the inputs, not the (possibly cancelled) average
+    scale = max(r["records"][0]["input"].abs().max().item() for r in results)
+    for r in results:
+        torch.testing.assert_close(r["records"][0]["output"], expected, rtol=rtol, atol=rtol * scale)
+    assert torch.equal(results[0]["records"][0]["output"], results[1]["records"][0]["output"])
+
+def test_topk_full_ratio_equals_allreduce(tmp_path):
+    results = _run(tmp_path, "topk", topk_ratio=1.0)
+    for r in results:
+        torch.testing.assert_close(r["records"][0]["output"], _mean_input(results))
+        assert not r["residual"].any()
+
+def test_topk_residual_holds_unsent_entries(tmp_path):
+    ratio = 0.25
+    results = _run(tmp_path, "topk", topk_ratio=ratio)
+    for r in results:
+        grad, residual = r["records"][0]["input"], r["residual"]
+        sent = residual == 0
+        assert sent.sum().item() == int(grad.numel() * ratio)
+        # Error feedback: exactly the entries left out, unchanged; the sent ones are the largest
+        torch.testing.assert_close(residual[~sent], grad[~sent], rtol=0, atol=0)
+        assert grad[sent].abs().min() >= grad[~sent].abs().max()
+
+    # The reduced result is the average of what was sent
+    expected = torch.stack([r["records"][0]["input"] - r["residual"] for r in results]).mean(0)
+    for r in results:
+        torch.testing.assert_close(r["records"][0]["output"], expected)
+
+def test_powersgd_warmup_then_error_feedback(tmp_path):
+    results = _run(tmp_path, "powersgd", steps=3, powersgd_start_iter=2, powersgd_rank=1)
+    # Plain all-reduce for the first start_iter steps
+    for step in (0, 1):
+        for r in results:
+            torch.testing.assert_close(r["records"][step]["output"], _mean_input(results, step))
+
+    # Then lossy, but what each rank did not get through is kept as its local error
+    expected = _mean_input(results, 2)
+    mean_error = torch.stack([r["error"] for r in results]).mean(0)
+    for r in results:
+        output = r["records"][2]["output"]
+        assert not torch.allclose(output, expected)
+        torch.testing.assert_close(output + mean_error, expected)
@@ -0,0 +1,65 @@
+import json
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+
+from dist_utils import run_ranks
+from comm_hooks import CommStats, make_comm_hook
+from train_utils import DDP_DEFAULTS, resolve_ddp_config
+from training_metrics import StepTimer, timed_comm_hook
+
+def _write_json(path, obj):
+    path.write_text(json.dumps(obj))
+    return str(path)
+
+def test_resolve_ddp_config_precedence(tmp_path):
+    assert resolve_ddp_config() == DDP_DEFAULTS
+
+    # A "ddp" section or a bare object; the file overrides the defaults
+    for obj in ({"ddp": {"bucket_cap_mb": 50, "static_graph": True}}, {"bucket_cap_mb": 50, "static_graph": True}):
+        config = resolve_ddp_config(_write_json(tmp_path / "ddp.json", obj))
+        assert config == {**DDP_DEFAULTS, "bucket_cap_mb": 50, "static_graph": True}
+
+    # Flags override the file; None means "not given"
+    config = resolve_ddp_config(_write_json(tmp_path / "ddp.json", {"bucket_cap_mb": 50, "static_graph": True}),
+                                bucket_cap_mb=10, static_graph=None, gradient_as_bucket_view=True)
+    assert config == {**DDP_DEFAULTS, "bucket_cap_mb": 10, "static_graph": True, "gradient_as_bucket_view": True}
+
+def test_resolve_ddp_config_rejects_unknown_keys(tmp_path):
+    with pytest.raises(ValueError, match="bucket_size"):
+        resolve_ddp_config(_write_json(tmp_path / "ddp.json", {"ddp": {"bucket_size": 25}}))
+
+def _timed_rank(rank, world_size, bucket_cap_mb, steps):
+    """StepTimer metrics over `steps` DDP steps, with the comm hook set up as in ddp_main."""
+    torch.manual_seed(0)
+    # ~260 KB of fp32 gradients: one bucket at DDP's default cap, several at a small one
+    model = nn.Sequential(*[nn.Linear(128, 128) for _ in range(4)])
+    model = DistributedDataParallel(model, **resolve_ddp_config(bucket_cap_mb=bucket_cap_mb))
+    timer = StepTimer(torch.device("cpu"))
+    hook_state, hook = make_comm_hook("allreduce", CommStats())
+    model.register_comm_hook((timer, hook_state), timed_comm_hook(hook))
+
+    torch.manual_seed(1 + rank)
+    for step in range(steps + 1):
+        with timer.phase("forward"):
+            loss = model(torch.randn(8, 128)).pow(2).mean()
+        with timer.phase("backward"):
+            loss.backward()
+        model.zero_grad()
+        timer.end_step(8)
+        if step == 0:
+            timer.summary()  # DDP rebuilds its buckets after the first step
+    return timer.summary()
+
+def test_bucket_cap_changes_buckets_and_exposed_comm_is_bounded(tmp_path):
+    default = run_ranks(_timed_rank, 2, tmp_path / "default", None, 3)
+    small = run_ranks(_timed_rank, 2, tmp_path / "small", 0.05, 3)
+
+    for metrics in default + small:
+        assert metrics["time/comm_ms"] > 0
+        assert metrics["time/comm_exposed_ms"] <= metrics["time/comm_ms"]
+        assert 0.0 <= metrics["perf/comm_overlap"] <= 1.0
+    assert small[0]["comm/buckets_per_step"] > default[0]["comm/buckets_per_step"]
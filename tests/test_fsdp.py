@@ -0,0 +1,71 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from torch.distributed.checkpoint.state_dict import StateDictOptions, get_state_dict
+from torch.distributed.fsdp import FullyShardedDataParallel as FSDP
+
+from dist_utils import run_ranks
+from checkpointing import save_sharded_checkpoint, load_sharded_checkpoint
+from ddp_simulation_train import TinyTransformer, TinyBlock
+from fsdp_utils import shared_parameter_names, wrap_fsdp
+from train_utils import make_optimizer
+
+CONFIG = {
+    "vocab_size": 97,
+    "hidden_size": 32,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 4,
+    "intermediate_size": 64,
+    "max_position_embeddings": 32,
+    "attn_implementation": "manual",
+}
+
+def _full_state(model, optimizer):
+    # Collective under FSDP: every rank gets the unsharded, FQN-keyed state
+    model_state, optim_state = get_state_dict(model, optimizer, options=StateDictOptions(full_state_dict=True))
+    return {"model": model_state, "optim": optim_state}
+
+def _tied(model):
+    inner = model.module if isinstance(model, FSDP) else model
+    return inner.head.weight is inner.embeddings.weight
+
+def _save_rank(rank, world_size, directory):
+    torch.manual_seed(0)
+    model = TinyTransformer(CONFIG)
+    assert shared_parameter_names(model) == [["embeddings.weight", "head.weight"]]
+    model = wrap_fsdp(model, TinyBlock, sharding="full")
+    assert all(isinstance(block, FSDP) for block in model.module.blocks)
+    optimizer = make_optimizer(model, lr=1e-2)
+
+    torch.manual_seed(1 + rank)
+    input_ids = torch.randint(0, CONFIG["vocab_size"], (2, 16))
+    _, loss = model(input_ids, labels=input_ids)
+    loss.backward()
+    optimizer.step()
+    optimizer.zero_grad(set_to_none=True)
+    save_sharded_checkpoint(directory, model, optimizer, extra={"global_step": 1})
+    return {**_full_state(model, optimizer), "tied": _tied(model)}
+
+def _load_rank(rank, world_size, directory, fsdp):
+    # A different init: everything compared below must come from the checkpoint
+    torch.manual_seed(100 + rank)
+    model = TinyTransformer(CONFIG)
+    if fsdp:
+        model = wrap_fsdp(model, TinyBlock, sharding="full")
+    optimizer = make_optimizer(model, lr=1e-2)
+    extra = load_sharded_checkpoint(directory, model, optimizer)
+    return {**_full_state(model, optimizer), "tied": _tied(model), "extra": extra}
+
+@pytest.mark.parametrize("world_size, fsdp", [(2, True), (1, True), (1, False)],
+                         ids=["fsdp-2-ranks", "fsdp-1-rank", "unwrapped-1-rank"])
+def test_tied_fsdp_checkpoint_round_trip(tmp_path, world_size, fsdp):
+    directory = str(tmp_path / "ckpt")
+    saved = run_ranks(_save_rank, 2, tmp_path / "save", directory)[0]
+    assert saved["tied"]
+
+    for loaded in run_ranks(_load_rank, world_size, tmp_path / "load", directory, fsdp):
+        assert loaded["tied"]
+        assert loaded["extra"] == {"global_step": 1}
+        torch.testing.assert_close(loaded["model"], saved["model"], rtol=0, atol=0)
+        torch.testing.assert_close(loaded["optim"]["state"], saved["optim"]["state"], rtol=0, atol=0)
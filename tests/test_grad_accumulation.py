@@ -0,0 +1,58 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import torch.nn as nn
+
+from train_utils import accumulation_window, resolve_grad_accum_steps
+
+def test_accumulation_window_trailing_partial_window():
+    # 10 micro-batches, 4 per step: windows of 4, 4 and a trailing 2
+    windows = [accumulation_window(step, 10, 4) for step in range(10)]
+    assert [size for _, size in windows] == [4] * 8 + [2] * 2
+    assert [step for step, (boundary, _) in enumerate(windows) if boundary] == [3, 7, 9]
+
+    # Resumed mid-epoch: the same windows, counted from the epoch start
+    assert [accumulation_window(step, 10, 4) for step in range(6, 10)] == windows[6:]
+    assert all(accumulation_window(step, 5, 1) == (True, 1) for step in range(5))
+
+def test_window_scaled_accumulation_matches_one_large_batch():
+    torch.manual_seed(0)
+    model = nn.Linear(8, 3)
+    micro_batches = [(torch.randn(2, 8), torch.randn(2, 3)) for _ in range(10)]
+    loss_fn = nn.MSELoss()
+
+    window = []
+    for step, (x, y) in enumerate(micro_batches):
+        is_boundary, window_size = accumulation_window(step, len(micro_batches), 4)
+        (loss_fn(model(x), y) / window_size).backward()
+        window.append((x, y))
+        if not is_boundary:
+            continue
+        accumulated = [p.grad.clone() for p in model.parameters()]
+        model.zero_grad()
+
+        # The same window as one batch: mean loss over all of its samples
+        x_all = torch.cat([x for x, _ in window])
+        y_all = torch.cat([y for _, y in window])
+        loss_fn(model(x_all), y_all).backward()
+        for grad, param in zip(accumulated, model.parameters()):
+            torch.testing.assert_close(grad, param.grad)
+        model.zero_grad()
+        window = []
+    assert window == []
+
+def test_resolve_grad_accum_steps():
+    assert resolve_grad_accum_steps(4, world_size=2, grad_accum_steps=3) == 3
+    # global_batch_size wins: 32 = 4 (micro) x 2 (ranks) x 4 (accumulation)
+    assert resolve_grad_accum_steps(4, world_size=2, grad_accum_steps=3, global_batch_size=32) == 4
+
+@pytest.mark.parametrize("global_batch_size", [4, 12, 30])
+def test_resolve_grad_accum_steps_rejects_invalid_global_batch(global_batch_size):
+    # 8 samples per micro-step: smaller or non-multiple global batches are errors
+    with pytest.raises(ValueError, match="not a multiple"):
+        resolve_grad_accum_steps(4, world_size=2, global_batch_size=global_batch_size)
+
+def test_resolve_grad_accum_steps_rejects_zero_steps():
+    with pytest.raises(ValueError, match="grad_accum_steps"):
+        resolve_grad_accum_steps(4, grad_accum_steps=0)
@@ -0,0 +1,87 @@
+import json
+import argparse
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import train_tiny_transformer
+from packing import PackedTokenDataset, DocumentDataset, collate_documents, document_attention_mask
+from token_dataset import TokenBinWriter
+
+EOS = 49
+
+@pytest.fixture
+def corpus(tmp_path):
+    # Documents of 4, 7 and 3 tokens (EOS included): offsets 0, 4, 11, 14
+    prefix = str(tmp_path / "corpus")
+    writer = TokenBinWriter(prefix, vocab_size=50, eos_id=EOS, tokenizer_name="test")
+    for doc in ([1, 2, 3], [10, 11, 12, 13, 14, 15], [20, 21]):
+        writer.add_document(doc)
+    writer.close()
+    return prefix
+
+def _expected_mask(segment_ids):
+    T = len(segment_ids)
+    return torch.tensor([[j <= i and segment_ids[i] == segment_ids[j] for j in range(T)] for i in range(T)])
+
+def test_packed_rows_reset_positions_at_document_starts(corpus):
+    dataset = PackedTokenDataset(corpus, seq_len=6)
+    assert len(dataset) == 2
+    row0, row1 = dataset[0], dataset[1]
+    assert row0["input_ids"].tolist() == [1, 2, 3, EOS, 10, 11]
+    assert row0["position_ids"].tolist() == [0, 1, 2, 3, 0, 1]
+    assert row0["segment_ids"].tolist() == [0, 0, 0, 0, 1, 1]
+    # A document split across rows continues at position 0 in the next row
+    assert row1["input_ids"].tolist() == [12, 13, 14, 15, EOS, 20]
+    assert row1["position_ids"].tolist() == [0, 1, 2, 3, 4, 0]
+    assert row1["segment_ids"].tolist() == [0, 0, 0, 0, 0, 1]
+
+def test_collate_packed_block_diagonal_mask_and_labels(corpus):
+    dataset = PackedTokenDataset(corpus, seq_len=6)
+    batch = collate_documents([dataset[0], dataset[1]], seq_len=6, pad_id=EOS)
+
+    assert batch["attention_mask"].shape == (2, 1, 6, 6)
+    assert torch.equal(batch["attention_mask"][0, 0], _expected_mask([0, 0, 0, 0, 1, 1]))
+    assert torch.equal(batch["attention_mask"][1, 0], _expected_mask([0, 0, 0, 0, 0, 1]))
+    assert torch.equal(batch["position_ids"], torch.stack([dataset[0]["position_ids"], dataset[1]["position_ids"]]))
+    # No loss on the first token of each document (its predecessor is another document)
+    assert batch["labels"].tolist() == [
+        [-100, 2, 3, EOS, -100, 11],
+        [-100, 13, 14, 15, EOS, -100],
+    ]
+    assert batch["num_tokens"].item() == 12
+
+def test_collate_padded_documents(corpus):
+    dataset = DocumentDataset(corpus, seq_len=6)
+    assert len(dataset) == 3
+    batch = collate_documents([dataset[i] for i in range(3)], seq_len=6, pad_id=EOS)
+
+    assert batch["input_ids"].tolist() == [
+        [1, 2, 3, EOS, EOS, EOS],
+        [10, 11, 12, 13, 14, 15],  # truncated to seq_len
+        [20, 21, EOS, EOS, EOS, EOS],
+    ]
+    assert batch["position_ids"].tolist() == [[0, 1, 2, 3, 0, 0], [0, 1, 2, 3, 4, 5], [0, 1, 2, 0, 0, 0]]
+    # -100 at the document start and on every padding position
+    assert batch["labels"].tolist() == [
+        [-100, 2, 3, EOS, -100, -100],
+        [-100, 11, 12, 13, 14, 15],
+        [-100, 21, EOS, -100, -100, -100],
+    ]
+    # Padding is its own segment: causal among itself, invisible to real tokens
+    assert torch.equal(batch["attention_mask"][0, 0], _expected_mask([0, 0, 0, 0, -1, -1]))
+    assert batch["num_tokens"].item() == 4 + 6 + 3
+
+def test_document_mask_never_masks_a_whole_row():
+    segment_ids = torch.tensor([[0, 0, 1, 1, -1, -1], [0, 1, 2, -1, -1, -1]])
+    mask = document_attention_mask(segment_ids)
+    assert mask.diagonal(dim1=-2, dim2=-1).all()
+
+@pytest.mark.parametrize("document_mode", ["stream", "packed", "padded"])
+def test_train_rejects_corpus_vocab_larger_than_model(tmp_path, corpus, document_mode):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({"vocab_size": 32}))  # corpus has 50
+    args = argparse.Namespace(model_config=str(config_path), attn_implementation=None,
+                              document_mode=document_mode, data_path=corpus, seq_len=6)
+    with pytest.raises(ValueError, match="vocab_size=50"):
+        train_tiny_transformer.train(args)
@@ -0,0 +1,118 @@
+import os
+import json
+import random
+import argparse
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from torch.utils.data.distributed import DistributedSampler
+
+import train_tiny_transformer
+from checkpointing import ResumableSampler, capture_rng_state, restore_rng_state
+
+CONFIG = {
+    "vocab_size": 97,
+    "hidden_size": 32,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 4,
+    "intermediate_size": 64,
+    "max_position_embeddings": 32,
+    "layer_norm_eps": 1e-12,
+    # Dropout on: the resumed run only matches if the RNG state is restored too
+    "hidden_dropout_prob": 0.1,
+    "attention_probs_dropout_prob": 0.1,
+    "attn_implementation": "manual",
+}
+
+def test_resumable_sampler_skip_len_and_set_epoch():
+    sampler = ResumableSampler(DistributedSampler(list(range(10)), num_replicas=1, rank=0, shuffle=True, seed=0))
+    sampler.set_epoch(1)
+    epoch1 = list(sampler)
+    sampler.set_epoch(2)
+    epoch2 = list(sampler)
+    assert sorted(epoch1) == list(range(10)) and epoch1 != epoch2
+
+    sampler.skip(4)
+    assert len(sampler) == 6
+    # set_epoch after skip(): the new epoch's order, still starting at the offset
+    sampler.set_epoch(1)
+    assert len(sampler) == 6
+    assert list(sampler) == epoch1[4:]
+    # The offset applies to one pass only
+    assert len(sampler) == 10
+    assert list(sampler) == epoch1
+
+    sampler.skip(12)
+    assert len(sampler) == 0
+    assert list(sampler) == []
+
+def test_rng_state_round_trip():
+    state = capture_rng_state()
+    expected = (random.random(), np.random.rand(), torch.rand(3))
+    restore_rng_state(state)
+    assert random.random() == expected[0]
+    assert np.random.rand() == expected[1]
+    assert torch.equal(torch.rand(3), expected[2])
+
+class RecordingDataset(torch.utils.data.Dataset):
+    """Index-deterministic rows that log which sample indices each batch used."""
+    batches = []
+
+    def __init__(self, vocab_size, seq_len, num_samples):
+        self.vocab_size = vocab_size
+        self.seq_len = seq_len
+
+    def __len__(self):
+        return 40
+
+    def __getitems__(self, indices):
+        RecordingDataset.batches.append(list(indices))
+        idx = torch.tensor(indices)[:, None]
+        data = (idx * 7 + torch.arange(self.seq_len)) % self.vocab_size
+        return {"input_ids": data, "labels": data}
+
+def _args(tmp_path, name, **overrides):
+    args = {
+        "model_config": str(tmp_path / "config.json"), "attn_implementation": None, "document_mode": "stream",
+        "data_path": None, "seq_len": 16, "batch_size": 4, "epochs": 2, "seed": 0,
+        "num_workers": 0, "prefetch_factor": 2, "auto_tune_loader": False, "loader_target_samples_per_sec": None,
+        "compile": "none", "compile_scope": "model", "compile_cache_dir": None, "compile_fallback_eager": False,
+        "optimizer_impl": "foreach", "learning_rate": 1e-2, "weight_decay": 0.01,
+        "lr_schedule": "cosine", "warmup_steps": 2, "min_lr_ratio": 0.1,
+        "grad_accum_steps": 1, "global_batch_size": None, "precision": "fp32",
+        "log_dir": str(tmp_path / name / "logs"), "metrics_backends": "jsonl", "log_interval": 1,
+        "peak_flops_from": None, "peak_tflops": 1.0, "sync_timing": False,
+        "checkpoint_dir": str(tmp_path / name / "checkpoints"), "save_every_steps": 3, "resume_from": None,
+        "max_inflight_checkpoints": 1, "keep_last_checkpoints": None, "keep_every_checkpoints": None,
+    }
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+def _run(args):
+    """(batches of sample indices, {step: loss}, final model state) for one train() call."""
+    RecordingDataset.batches = []
+    train_tiny_transformer.train(args)
+    with open(os.path.join(args.log_dir, "metrics.jsonl")) as f:
+        losses = {r["step"]: r["train/loss"] for r in map(json.loads, f) if "train/loss" in r}
+    final = torch.load(os.path.join(args.checkpoint_dir, f"epoch_{args.epochs - 1}.pt"), weights_only=False)
+    return RecordingDataset.batches, losses, final["model_state_dict"]
+
+@pytest.mark.parametrize("resume_step", [6, 12], ids=["mid-epoch-0", "mid-epoch-1"])
+def test_mid_epoch_resume_matches_uninterrupted_run(tmp_path, monkeypatch, resume_step):
+    (tmp_path / "config.json").write_text(json.dumps(CONFIG))
+    monkeypatch.setattr(train_tiny_transformer, "SyntheticTextDataset", RecordingDataset)
+    torch.manual_seed(0)
+    full_batches, full_losses, full_state = _run(_args(tmp_path, "full"))
+    assert len(full_batches) == 20  # 2 epochs x 10 batches
+
+    # Resume the same run from its step checkpoint (10 batches per epoch, so mid-epoch)
+    checkpoint = os.path.join(tmp_path, "full", "checkpoints", f"step_{resume_step:08d}.pt")
+    torch.manual_seed(1)  # whatever the model init draws, the resumed run must not depend on it
+    resumed_batches, resumed_losses, resumed_state = _run(_args(tmp_path, "resumed", resume_from=checkpoint))
+
+    assert resumed_batches == full_batches[resume_step:]
+    assert resumed_losses == {step: loss for step, loss in full_losses.items() if step >= resume_step}
+    for key, value in full_state.items():
+        torch.testing.assert_close(resumed_state[key], value, rtol=0, atol=0, msg=key)
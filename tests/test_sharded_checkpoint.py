@@ -0,0 +1,82 @@
+import os
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import torch.distributed as dist
+from torch.distributed.optim import ZeroRedundancyOptimizer
+
+from dist_utils import run_ranks
+from checkpointing import save_sharded_checkpoint, load_sharded_checkpoint
+from ddp_simulation_train import TinyTransformer
+from train_utils import param_groups
+from zero import make_zero_optimizer
+
+CONFIG = {
+    "vocab_size": 97,
+    "hidden_size": 32,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 4,
+    "intermediate_size": 64,
+    "max_position_embeddings": 32,
+    "attn_implementation": "manual",
+}
+
+def _model_and_optimizer(seed, zero):
+    torch.manual_seed(seed)
+    model = TinyTransformer(CONFIG)
+    # Two param groups (decay / no decay), as the training script builds them
+    groups = param_groups(model, weight_decay=0.01)
+    if zero:
+        return model, make_zero_optimizer(groups, torch.optim.AdamW, lr=1e-3)
+    return model, torch.optim.AdamW(groups, lr=1e-3)
+
+def _full_optimizer_state(optimizer):
+    # ZeRO: consolidating every partition on rank 0 is collective; other ranks get None
+    if isinstance(optimizer, ZeroRedundancyOptimizer):
+        optimizer.consolidate_state_dict(to=0)
+        return optimizer.state_dict() if dist.get_rank() == 0 else None
+    return optimizer.state_dict()
+
+def _save_rank(rank, world_size, directory, zero):
+    model, optimizer = _model_and_optimizer(0, zero)
+    # Same batch and dropout on every rank, so the replicas stay identical without DDP
+    torch.manual_seed(1)
+    input_ids = torch.randint(0, CONFIG["vocab_size"], (2, 16))
+    for _ in range(2):
+        _, loss = model(input_ids, labels=input_ids)
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+    save_sharded_checkpoint(directory, model, optimizer, extra={"global_step": 2})
+    return {"model": model.state_dict(), "optim": _full_optimizer_state(optimizer)}
+
+def _load_rank(rank, world_size, directory, zero):
+    # A different init per rank: everything compared below must come from the checkpoint
+    model, optimizer = _model_and_optimizer(100 + rank, zero)
+    extra = load_sharded_checkpoint(directory, model, optimizer)
+    return {"model": model.state_dict(), "optim": _full_optimizer_state(optimizer), "extra": extra}
+
+def _assert_optimizer_state_equal(actual, expected):
+    assert actual["param_groups"] == expected["param_groups"]
+    assert actual["state"].keys() == expected["state"].keys()
+    for index, param_state in expected["state"].items():
+        assert actual["state"][index].keys() == param_state.keys()
+        for name, value in param_state.items():
+            torch.testing.assert_close(actual["state"][index][name], value, rtol=0, atol=0,
+                                       msg=f"optimizer state {index}/{name}")
+
+@pytest.mark.parametrize("zero", [False, True], ids=["zero-stage-0", "zero-stage-1"])
+def test_sharded_checkpoint_reshards_on_load(tmp_path, zero):
+    directory = str(tmp_path / "ckpt")
+    saved = run_ranks(_save_rank, 2, tmp_path / "save", directory, zero)[0]
+    assert {"manifest.json", "shard_00000.pt", "shard_00001.pt"} <= set(os.listdir(directory))
+
+    for world_size in (1, 3):
+        loaded = run_ranks(_load_rank, world_size, tmp_path / f"load_{world_size}", directory, zero)
+        for result in loaded:
+            assert result["extra"] == {"global_step": 2}
+            assert result["model"].keys() == saved["model"].keys()
+            for key, value in saved["model"].items():
+                torch.testing.assert_close(result["model"][key], value, rtol=0, atol=0, msg=key)
+        _assert_optimizer_state_equal(loaded[0]["optim"], saved["optim"])
@@ -0,0 +1,51 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from torch.nn.parallel import DistributedDataParallel
+
+from dist_utils import run_ranks
+from comm_hooks import CommStats
+from ddp_simulation_train import TinyTransformer
+from train_utils import param_groups
+from zero import make_zero_optimizer, zero_param_owners, zero_reduce_hook
+
+CONFIG = {
+    "vocab_size": 97,
+    "hidden_size": 32,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 4,
+    "intermediate_size": 64,
+    "max_position_embeddings": 32,
+    "attn_implementation": "manual",
+}
+
+def _train_rank(rank, world_size, zero_stage, steps):
+    """Parameters after `steps` AdamW steps, set up as ddp_main does for --zero-stage."""
+    torch.manual_seed(0)
+    model = DistributedDataParallel(TinyTransformer(CONFIG))
+    groups = param_groups(model, weight_decay=0.01)
+    if zero_stage >= 1:
+        optimizer = make_zero_optimizer(groups, torch.optim.AdamW, lr=1e-2)
+    else:
+        optimizer = torch.optim.AdamW(groups, lr=1e-2)
+    if zero_stage == 2:
+        model.register_comm_hook((CommStats(), zero_param_owners(optimizer)), zero_reduce_hook)
+
+    # Different data (and dropout) per rank, identical across stages
+    torch.manual_seed(1 + rank)
+    for _ in range(steps):
+        input_ids = torch.randint(0, CONFIG["vocab_size"], (2, 16))
+        _, loss = model(input_ids, labels=input_ids)
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+    return {name: param.detach() for name, param in model.module.named_parameters()}
+
+@pytest.mark.parametrize("zero_stage", [1, 2])
+def test_zero_stage_matches_replicated_optimizer(tmp_path, zero_stage):
+    expected = run_ranks(_train_rank, 2, tmp_path / "stage0", 0, 2)[0]
+    for params in run_ranks(_train_rank, 2, tmp_path / f"stage{zero_stage}", zero_stage, 2):
+        # Every rank ends with the full updated model, owned partitions or not
+        for name, value in expected.items():
+            torch.testing.assert_close(params[name], value, msg=name)
@@ -2,6 +2,11 @@
 source venv/bin/activate
 set -e
 
+echo "----------------------------------------------------------------"
+echo "UNIT TESTS"
+echo "----------------------------------------------------------------"
+python -m pytest -q tests
+
 echo "----------------------------------------------------------------"
 echo "VERIFYING LAB 1: Tiny Transformer Training"
 echo "----------------------------------------------------------------"
@@ -25,13 +30,10 @@ else
 fi
 
 echo "----------------------------------------------------------------"
-echo "VERIFYING LAB 3: Fake Multi-Node Launcher"
+echo "VERIFYING LAB 3: Local Multi-Node Launcher"
 echo "----------------------------------------------------------------"
-export NODE_RANK=0
-export LOCAL_RANK=1
-export WORLD_SIZE_NODES=2
-export NPROC_PER_NODE=4
-python scripts/fake_multi_node_launcher.py
+python scripts/fake_multi_node_launcher.py --nnodes 2 --nproc-per-node 4
+python scripts/fake_multi_node_launcher.py --nnodes 2 --nproc-per-node 2 --fail-rank 3 --max-restarts 1
 if [ $? -eq 0 ]; then
     echo "Lab 3 Passed."
 else